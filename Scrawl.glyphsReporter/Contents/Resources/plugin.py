@@ -5,23 +5,44 @@ from GlyphsApp import Glyphs
 from GlyphsApp.plugins import ReporterPlugin
 
 from AppKit import NSClassFromString, NSCompositeSourceOver, \
-    NSGraphicsContext, NSImage, NSImageInterpolationNone, NSMakeRect, \
-    NSZeroRect
+    NSGraphicsContext, NSImageInterpolationNone, NSMakeRect, NSZeroRect
+
+try:
+    from scrawl.appkit import bufferFromData, currentScale, drawAtlasSlot, \
+        drawOnionSkin, drawSmoothScrawl, drawTiles, imageForBuffer, visibleRect
+    from scrawl.atlas import tab_atlases
+    from scrawl.cache import decoded_images, layer_key
+    from scrawl.mipmap import build_levels, choose_level, level_rect
+    from scrawl.model import live_scrawls, scrawl_data, scrawl_digest, \
+        scrawl_patches, scrawl_rect
+    from scrawl.onion import ONION_SKIN_DEFAULTS_KEY
+    from scrawl.sdf import SMOOTH_DEFAULTS_KEY, smooth_factor, smooth_scrawl, \
+        visible_tiles
+    from scrawl.timing import REPORTER_DECODE, REPORTER_DRAW, timings
+except ModuleNotFoundError as e:
+    if e.name != "scrawl":
+        raise
+
+    # The scrawl package is linked from the Scrawl tool
+    raise ImportError(
+        "The Scrawl reporter needs the Scrawl tool, install Scrawl.glyphsTool "
+        "next to Scrawl.glyphsReporter."
+    ) from e
+
+# Render smooth edges this many seconds after a redraw needed them
+smooth_delay: float = 0.1
 
 # For debugging
 # from AppKit import NSColor, NSBezierPath, NSPoint
 
 
-plugin_id = "de.kutilek.scrawl"
-SCRAWL_DATA_KEY = f"{plugin_id}.data"
-SCRAWL_RECT_KEY = f"{plugin_id}.rect"
-
-
 class ScrawlReporter(ReporterPlugin):
 
     @objc.python_method
     def settings(self) -> None:
         self.menuName = Glyphs.localize({"en": "Scrawl"})
+        # The smooth renderings to build after drawing, by layer key
+        self.smooth_pending = {}
 
     @objc.python_method
     def background(self, layer) -> None:
@@ -35,6 +56,9 @@ class ScrawlReporter(ReporterPlugin):
             if tool.isKindOfClass_(NSClassFromString("ScrawlTool")):
                 return
 
+        if Glyphs.defaults[ONION_SKIN_DEFAULTS_KEY]:
+            # The scrawls of the other masters, toggled with O in the tool
+            drawOnionSkin(layer)
         self.draw_layer(layer)
         # NSColor.controlTextColor().set()
         # self.drawTextAtPoint("background", NSPoint(0, 0))
@@ -71,55 +95,145 @@ class ScrawlReporter(ReporterPlugin):
 
     @objc.python_method
     def draw_layer(self, layer) -> None:
+        start = timings.start()
+        self.draw_scrawl(layer)
+        timings.stop(REPORTER_DRAW, start)
+
+    @objc.python_method
+    def draw_scrawl(self, layer) -> None:
         # draw pixels
 
-        data = layer.userData[SCRAWL_DATA_KEY]
-        if data is None:
-            return
-        try:
-            data = NSImage.alloc().initWithData_(data)
-        except:  # noqa: 722
-            print(f"Error in image data of layer {layer}")
+        # Draw full black when the glyph is empty, with reduced opacity when
+        # the glyph has shapes
+        fraction = 0.2 if layer.shapes else 1.0
+        key = layer_key(layer)
+        live = live_scrawls.get(key)
+        if live is not None:
+            # The tool is editing this layer, draw its canvas
+            NSGraphicsContext.saveGraphicsState()
+            NSGraphicsContext.currentContext().setImageInterpolation_(
+                NSImageInterpolationNone
+            )
+            drawTiles(
+                live.canvas,
+                live.origin,
+                live.pixel_size,
+                live.pixel_ratio,
+                live.tile_cache,
+                fraction
+            )
+            NSGraphicsContext.restoreGraphicsState()
             return
 
-        rect = layer.userData[SCRAWL_RECT_KEY]
-        if rect is None:
-            # The drawing rect was not stored in user data.
-            # Deduce it from the layer/font metrics.
-            font = layer.font()
-            upm = font.upm
-            pad_v = round(upm * 0.2)
-            pad_h = round(upm * 0.5)
-
-            # find master for image positioning (descender)
+        # Data in the sidecar folder is only read if it's not in the cache
+        digest = scrawl_digest(layer)
+        if digest is None:
+            return
 
+        # The scrawls of a tab share one bitmap, see scrawl.atlas. Scrawls
+        # that are too large for it are cached as images of their own.
+        atlas = tab_atlases.get(
+            None if self.controller is None else self.controller.hash()
+        )
+        entry = atlas.get(key, digest)
+        cached = None if entry is not None else decoded_images.get(key, digest)
+        if entry is None and cached is None:
+            start = timings.start()
             try:
-                descender = font.masters[layer.layerId].descender
-            except KeyError:
-                descender = round(-upm * 0.2)
-
-            self.rect = NSMakeRect(
-                -pad_h,
-                descender - pad_v,
-                2 * pad_h + layer.width,
-                2 * pad_v + upm
-            )
-        else:
-            # Use the rect from user data
-            rect = NSMakeRect(*rect)
+                data = scrawl_data(layer)
+                buffer = bufferFromData(data, scrawl_patches(layer))
+            except:  # noqa: 722
+                print(f"Error in image data of layer {layer}")
+                return
+            # Downsampled levels for drawing the scrawl small
+            levels = build_levels(buffer)
+            entry = atlas.put(key, digest, levels)
+            if entry is None:
+                images = [imageForBuffer(level) for level in levels]
+                # The images use the buffers' memory, keep them together
+                cached = (images, levels)
+                decoded_images.put(
+                    key,
+                    digest,
+                    cached,
+                    sum(level.pixels.nbytes for level in levels)
+                )
+            timings.stop(REPORTER_DECODE, start, len(data))
+
+        # If the drawing rect was not stored in user data, it is deduced from
+        # the layer/font metrics
+        rect = scrawl_rect(layer)
+        base = entry if entry is not None else cached[1][0]
+        count = len(entry.slots) if entry is not None else len(cached[0])
+        screen_pixels = currentScale() * rect[2] / base.width
+        if Glyphs.defaults[SMOOTH_DEFAULTS_KEY]:
+            # Zoomed in, draw smooth edges instead of large pixels, see
+            # scrawl.sdf. They are rendered after drawing, until then the
+            # pixels are drawn.
+            factor = smooth_factor(screen_pixels)
+            if factor > 1:
+                tiles = visible_tiles(
+                    rect, base.width, base.height, visibleRect()
+                )
+                smooth = smooth_scrawl(
+                    key, digest, factor, tiles, None, build=False
+                )
+                if smooth is not None:
+                    drawSmoothScrawl(
+                        smooth, rect, base.width, base.height, fraction
+                    )
+                    return
+
+                self.schedule_smooth(
+                    key,
+                    digest,
+                    factor,
+                    tiles,
+                    lambda: atlas.slot_buffer(entry.slots[0])
+                    if entry is not None else cached[1][0]
+                )
+
+        index = choose_level(screen_pixels, count)
+        rect = level_rect(rect, base, index)
         NSGraphicsContext.saveGraphicsState()
         NSGraphicsContext.currentContext().setImageInterpolation_(
             NSImageInterpolationNone
         )
-        if not layer.shapes:
-            # Draw full black when the glyph is empty
-            data.drawInRect_(rect)
+        if entry is not None:
+            drawAtlasSlot(atlas, entry.slots[index], rect, fraction)
+        elif fraction == 1:
+            cached[0][index].drawInRect_(NSMakeRect(*rect))
         else:
-            # Draw with reduced opacity when the glyph has shapes
-            data.drawInRect_fromRect_operation_fraction_(
-                rect,
+            cached[0][index].drawInRect_fromRect_operation_fraction_(
+                NSMakeRect(*rect),
                 NSZeroRect,
                 NSCompositeSourceOver,
-                0.2
+                fraction
             )
         NSGraphicsContext.restoreGraphicsState()
+
+    @objc.python_method
+    def schedule_smooth(self, key, digest, factor, tiles, source) -> None:
+        # The scrawl's pixels are copied now, the atlas may be packed again
+        # before the rendering is built
+        pending = self.smooth_pending.get(key)
+        if pending is not None and pending[0] == digest:
+            buffer = pending[3]
+            if pending[1] == factor:
+                tiles = pending[2] + [t for t in tiles if t not in pending[2]]
+        else:
+            buffer = source()
+        if not self.smooth_pending:
+            self.performSelector_withObject_afterDelay_(
+                "buildSmoothEdges:", None, smooth_delay
+            )
+        self.smooth_pending[key] = (digest, factor, tiles, buffer)
+
+    def buildSmoothEdges_(self, sender=None) -> None:
+        pending = self.smooth_pending
+        self.smooth_pending = {}
+        for key, (digest, factor, tiles, buffer) in pending.items():
+            smooth_scrawl(
+                key, digest, factor, tiles, lambda: buffer, imageForBuffer
+            )
+        Glyphs.redraw()
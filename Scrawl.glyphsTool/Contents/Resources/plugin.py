@@ -1,70 +1,64 @@
 from __future__ import annotations
 
 import objc
+from time import perf_counter, strftime
 from typing import TYPE_CHECKING
-from os.path import dirname, join
+from os.path import dirname, expanduser, join
 from GlyphsApp import Glyphs, GSBackgroundImage, MOUSEMOVED, UPDATEINTERFACE
 from GlyphsApp.plugins import SelectTool
 
-from AppKit import NSBezierPath, NSBitmapImageRep, NSColor, \
-    NSDeviceWhiteColorSpace, NSGraphicsContext, \
-    NSImageColorSyncProfileData, NSImageInterpolationNone, NSMakeRect, \
-    NSPNGFileType, NSPoint, NSRoundLineCapStyle
+from AppKit import NSBezierPath, NSColor, \
+    NSEventModifierFlagOption, NSGraphicsContext, NSImageInterpolationNone, \
+    NSMakeRect, NSObject, NSPNGFileType, NSPoint, NSScreen
+
+from scrawl.appkit import bufferFromData, currentScale, drawOnionSkin, \
+    drawSmoothScrawl, drawTiles, imageForBuffer, imageRepForBuffer, \
+    tilesFromData, visibleRect
+from scrawl.blobstore import BlobReference
+from scrawl.cache import decoded_images, layer_key
+from scrawl.codec import encode
+from scrawl.geometry import bounds_to_rect, inset_rect, union_rect
+from scrawl.glyphsfile import iter_scrawls
+from scrawl.index import ScrawlIndex
+from scrawl.journal import Stroke, StrokeJournal, quantize
+from scrawl.model import DEFAULT_PEN_SIZE, DEFAULT_PIXEL_RATIO, \
+    DEFAULT_PIXEL_SIZE, SCRAWL_JOURNAL_KEY, SCRAWL_SMOOTH_DEFAULTS_KEY, \
+    SCRAWL_UNIT_KEY, EncodedScrawl, LiveScrawl, append_patch, blob_store, \
+    data_digest, data_reader, delete_scrawl, encode_legacy, encode_snapshot, \
+    live_scrawls, load_scrawl, patch_base, pixel_ratio, save_scrawl, \
+    save_settings, scrawl_data, scrawl_digest, scrawl_patches, scrawl_rect, \
+    snapshot_scrawl, uses_sidecar
+from scrawl.onion import ONION_SKIN_DEFAULTS_KEY
+from scrawl.patches import extend_digest, tile_versions
+from scrawl.points import POINTS_FORMAT
+from scrawl.prefetch import PrefetchJob, Prefetcher
+from scrawl.raster import pen_radii, pen_value, union_bounds
+from scrawl.report import USERDATA_LIMIT, format_limit_report, \
+    format_size_report
+from scrawl.saver import BackgroundSaver, EncodeError
+from scrawl.sdf import SMOOTH_DEFAULTS_KEY, canvas_digest, invalidate_smooth, \
+    smooth_factor, smooth_scrawl, visible_tiles
+from scrawl.session import DOWN, DRAG, FILL, UP, SessionRecorder
+from scrawl.stroke import StrokeInput
+from scrawl.throttle import DEFAULT_FPS, FrameThrottle
+from scrawl.tiles import TiledBuffer
+from scrawl.timing import DRAW, ENCODE, FLOOD_FILL, LOAD, WRITE, timings
 
 if TYPE_CHECKING:
     from GlyphsApp import GSLayer
 
-plugin_id = "de.kutilek.scrawl"
-SCRAWL_DATA_KEY = f"{plugin_id}.data"
-SCRAWL_RECT_KEY = f"{plugin_id}.rect"
-SCRAWL_SIZE_KEY = f"{plugin_id}.size"
-SCRAWL_UNIT_KEY = f"{plugin_id}.unit"
-
-default_pen_size: int = 2
-default_pixel_size: int = 2
-default_pixel_ratio: float = 1
-
-
-def initImage(
-        width: int,
-        height: int,
-        pixel_size: int = default_pixel_size,
-        ratio: float = 1
-) -> NSBitmapImageRep:
-    # See https://developer.apple.com/documentation/appkit/nsbitmapimagerep/1395538-init
-    img = NSBitmapImageRep.alloc().initWithBitmapDataPlanes_pixelsWide_pixelsHigh_bitsPerSample_samplesPerPixel_hasAlpha_isPlanar_colorSpaceName_bitmapFormat_bytesPerRow_bitsPerPixel_(  # noqa: E501
-        None,    # BitmapDataPlanes
-        round(width / pixel_size),   # pixelsWide
-        round(height / pixel_size / ratio),  # pixelsHigh
-        8,       # bitsPerSample: 1, 2, 4, 8, 12, or 16
-        2,       # samplesPerPixel: 1 - 5
-        True,   # hasAlpha
-        False,   # isPlanar
-        NSDeviceWhiteColorSpace,  # colorSpaceName
-        # NSDeviceRGBColorSpace,
-        0,       # bitmapFormat
-        0,       # bytesPerRow
-        0,       # bitsPerPixel
-    )
-    """
-        NSCalibratedWhiteColorSpace
-        NSCalibratedBlackColorSpace
-        NSCalibratedRGBColorSpace
-        NSDeviceWhiteColorSpace
-        NSDeviceBlackColorSpace
-        NSDeviceRGBColorSpace
-        NSDeviceCMYKColorSpace
-        NSNamedColorSpace
-        NSCustomColorSpace
-    """
-    # Fill the image data by drawing a transparent rectangle
-    current = NSGraphicsContext.currentContext()
-    context = NSGraphicsContext.graphicsContextWithBitmapImageRep_(img)
-    NSGraphicsContext.setCurrentContext_(context)
-    NSColor.clearColor().set()
-    NSBezierPath.fillRect_(NSMakeRect(0, 0, width, round(height / ratio)))
-    NSGraphicsContext.setCurrentContext_(current)
-    return img
+# Undo history that doesn't fit is not saved with the font
+journal_limit: int = USERDATA_LIMIT // 4
+# Decode the scrawls of this many layers on each side of the cursor ahead of
+# time
+prefetch_radius: int = 3
+# In sidecar mode, smaller scrawls are still stored in the userData
+sidecar_min_size: int = 4096
+# Fold the patches of a scrawl into its data after this many seconds without
+# a save
+compact_delay: float = 3.0
+# Render smooth edges after drawing has paused for this many seconds
+smooth_delay: float = 0.3
 
 
 class ScrawlTool(SelectTool):
@@ -74,9 +68,9 @@ class ScrawlTool(SelectTool):
         from vanilla import Group, Slider, TextBox, Window
         self.name = "Scrawl"
         self.toolbarPosition = 113
-        self.pen_size = default_pen_size
-        self.pixel_size = default_pixel_size
-        self.pixel_ratio = default_pixel_ratio
+        self.pen_size = DEFAULT_PEN_SIZE
+        self.pixel_size = DEFAULT_PIXEL_SIZE
+        self.pixel_ratio = DEFAULT_PIXEL_RATIO
 
         # Create Vanilla window and group with controls
         viewWidth = 266
@@ -100,7 +94,7 @@ class ScrawlTool(SelectTool):
         )
         self.w.pen_size_text = TextBox(
             (-50, y + 3, -20, 17),
-            "%s" % default_pen_size
+            "%s" % DEFAULT_PEN_SIZE
         )
 
         self.generalContextMenus = [
@@ -121,6 +115,48 @@ class ScrawlTool(SelectTool):
                 }),
                 "action": self.saveBackground
             },
+            {
+                "name": Glyphs.localize({
+                    "en": "Convert Old Scrawls In Font",
+                    "de": "Alte Gekritzel in der Schrift umwandeln"
+                }),
+                "action": self.recompressScrawls
+            },
+            {
+                "name": Glyphs.localize({
+                    "en": "Show Scrawl Size Report",
+                    "de": "Gekritzel-Größenbericht anzeigen"
+                }),
+                "action": self.sizeReport
+            },
+            {
+                "name": Glyphs.localize({
+                    "en": "Remove Unused Scrawl Files",
+                    "de": "Unbenutzte Gekritzel-Dateien entfernen"
+                }),
+                "action": self.collectScrawlFiles
+            },
+            {
+                "name": Glyphs.localize({
+                    "en": "Start/Stop Recording Drawing Session",
+                    "de": "Aufzeichnung der Zeichensitzung starten/beenden"
+                }),
+                "action": self.toggleRecording
+            },
+            {
+                "name": Glyphs.localize({
+                    "en": "Start/Stop Measuring Scrawl Performance",
+                    "de": "Messung der Gekritzel-Leistung starten/beenden"
+                }),
+                "action": self.toggleTimings
+            },
+            {
+                "name": Glyphs.localize({
+                    "en": "Turn Smooth Scrawl Edges On/Off",
+                    "de": "Glatte Gekritzel-Kanten ein-/ausschalten"
+                }),
+                "action": self.toggleSmoothEdges
+            },
             # {
             #     "name": Glyphs.localize({
             #         "en": "Save current size as master default",
@@ -132,11 +168,39 @@ class ScrawlTool(SelectTool):
         self.keyboardShortcut = "c"
         self.rect = NSMakeRect(0, 0, 1000, 1000)
         self.data = None
-        self.prev_location = None
+        self.journal = None
+        self.index = None
+        self.index_font = None
+        self.tile_reps = {}
+        self.dirty_rect = None
         self.erase = False
+        self.filling = False
+        self.onion_skin = bool(Glyphs.defaults[ONION_SKIN_DEFAULTS_KEY])
+        self.smooth_edges = bool(Glyphs.defaults[SMOOTH_DEFAULTS_KEY])
+        # The factor and tiles of the smooth rendering waiting to be built
+        self.smooth_pending = None
         self.mouse_position = None
+        # Where the mouse was last moved to, in font units
+        self.cursor_location = None
+        self.preview_rect = None
+        self.preview_pending = False
+        self.preview_throttle = FrameThrottle()
+        self.stroke_input = StrokeInput(
+            smooth=bool(Glyphs.defaults[SCRAWL_SMOOTH_DEFAULTS_KEY])
+        )
+        self.stroke_pending = False
+        self.stroke_throttle = FrameThrottle()
         self.layer = None
         self.needs_save = False
+        # What the next save can be a patch of, see scrawl.patches
+        self.patch_base = None
+        # The tile versions of the last full save that is not written yet
+        self.full_save_pending = None
+        self.recorder = None
+        self.saver = BackgroundSaver(
+            self.encodeScrawl, self.writeScrawl, self.scrawlEncoded
+        )
+        self.prefetcher = Prefetcher()
         self.current_layer = self.get_current_layer()
 
     @objc.python_method
@@ -158,7 +222,15 @@ class ScrawlTool(SelectTool):
             self.loadScrawl()
             self.w.pen_size.set(self.pen_size)
             self.w.pen_size_text.set(self.pen_size)
-            self.prev_location = None
+            self.stroke_input.reset()
+            self.prefetchNeighbours()
+        try:
+            fps = NSScreen.mainScreen().maximumFramesPerSecond()
+        except:  # noqa: E722
+            # Before macOS 12
+            fps = DEFAULT_FPS
+        self.preview_throttle.set_fps(fps)
+        self.stroke_throttle.set_fps(fps)
         Glyphs.addCallback(self.update, UPDATEINTERFACE)
         Glyphs.addCallback(self.mouseDidMove_, MOUSEMOVED)
 
@@ -166,6 +238,26 @@ class ScrawlTool(SelectTool):
     def deactivate(self) -> None:
         Glyphs.removeCallback(self.mouseDidMove_)
         Glyphs.removeCallback(self.update)
+        if self.needs_save or self.needsCompaction():
+            self.saveScrawl(compact=self.needsCompaction())
+        self.saver.flush()
+        self.withdrawScrawl()
+        self.prefetcher.cancel()
+        NSObject.cancelPreviousPerformRequestsWithTarget_(self)
+        self.preview_pending = False
+        self.stroke_pending = False
+        # What moving the mouse over the edit view and prefetching have done
+        # in this session, only while measuring (see toggleTimings)
+        cache = self.prefetcher.cache
+        if timings.enabled:
+            self.logToConsole(
+                f"Cursor preview: {self.preview_throttle.summary()}"
+            )
+            self.logToConsole(
+                f"Prefetch: {cache.hits} hits, {cache.misses} misses"
+            )
+        self.preview_throttle.reset_stats()
+        cache.hits = cache.misses = 0
 
     @objc.python_method
     def foreground(self, layer) -> None:
@@ -175,18 +267,17 @@ class ScrawlTool(SelectTool):
         except:  # noqa: E722
             # self.logToConsole("foreground: mouse_position: %s" % str(e))
             self.mouse_position = None
+            self.preview_rect = None
             return
 
-        if self.mouse_position is not None:
+        if self.mouse_position is None:
+            self.preview_rect = None
+        else:
             # Draw a preview circle at the mouse position
-            x, y = self.mouse_position
-            rect = NSMakeRect(
-                x - self.pen_size / 2,
-                y - self.pen_size * self.pixel_ratio / 2,
-                self.pen_size,
-                self.pen_size * self.pixel_ratio
+            self.preview_rect = self.previewRect(self.mouse_position)
+            path = NSBezierPath.bezierPathWithOvalInRect_(
+                NSMakeRect(*self.preview_rect)
             )
-            path = NSBezierPath.bezierPathWithOvalInRect_(rect)
             path.setLineWidth_(1)
             if self.erase:
                 NSColor.redColor().set()
@@ -194,20 +285,103 @@ class ScrawlTool(SelectTool):
                 NSColor.lightGrayColor().set()
             path.stroke()
 
+    @objc.python_method
+    def previewRect(self, location) -> tuple[float, float, float, float]:
+        # The rect of the pen preview oval at a location in font units
+        x, y = location
+        return (
+            x - self.pen_size / 2,
+            y - self.pen_size * self.pixel_ratio / 2,
+            self.pen_size,
+            self.pen_size * self.pixel_ratio
+        )
+
     @objc.python_method
     def background(self, layer) -> None:
         self.layer = layer
+        # Changes from now on go into the next frame
+        self.dirty_rect = None
+        if self.onion_skin:
+            drawOnionSkin(layer)
         # draw pixels
-        if self.data is None:
+        if self.data is None or self.drawSmoothEdges():
             return
 
         NSGraphicsContext.saveGraphicsState()
         NSGraphicsContext.currentContext().setImageInterpolation_(
             NSImageInterpolationNone
         )
-        self.data.drawInRect_(self.rect)
+        drawTiles(
+            self.data,
+            (self.rect.origin.x, self.rect.origin.y),
+            self.pixel_size,
+            self.pixel_ratio,
+            self.tile_reps
+        )
         NSGraphicsContext.restoreGraphicsState()
 
+    @objc.python_method
+    def drawSmoothEdges(self) -> bool:
+        # When zoomed in, draw the canvas with smooth edges, see scrawl.sdf.
+        # They are rendered once drawing pauses; until then, and when zoomed
+        # out, the pixels are drawn. Returns whether anything was drawn.
+        if not self.smooth_edges or self.current_layer is None:
+            return False
+
+        factor = smooth_factor(currentScale() * self.pixel_size)
+        if factor == 1:
+            return False
+
+        rect = (
+            self.rect.origin.x,
+            self.rect.origin.y,
+            self.rect.size.width,
+            self.rect.size.height
+        )
+        width, height = self.data.width, self.data.height
+        tiles = visible_tiles(rect, width, height, visibleRect())
+        smooth = smooth_scrawl(
+            layer_key(self.current_layer),
+            canvas_digest(self.data),
+            factor,
+            tiles,
+            self.data.to_buffer,
+            build=False
+        )
+        if smooth is None:
+            # Collect the tiles of all areas drawn until the rendering
+            pending = self.smooth_pending
+            if pending is not None and pending[0] == factor:
+                tiles = pending[1] + [t for t in tiles if t not in pending[1]]
+            self.smooth_pending = (factor, tiles)
+            NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(
+                self, "buildSmoothEdges:", None
+            )
+            self.performSelector_withObject_afterDelay_(
+                "buildSmoothEdges:", None, smooth_delay
+            )
+            return False
+
+        drawSmoothScrawl(smooth, rect, width, height)
+        return True
+
+    def buildSmoothEdges_(self, sender=None) -> None:
+        pending = self.smooth_pending
+        self.smooth_pending = None
+        if self.data is None or self.current_layer is None or pending is None:
+            return
+
+        factor, tiles = pending
+        smooth_scrawl(
+            layer_key(self.current_layer),
+            canvas_digest(self.data),
+            factor,
+            tiles,
+            self.data.to_buffer,
+            imageForBuffer
+        )
+        self.updateView()
+
     def keyDown_(self, event) -> None:
         if event.characters() == "d":
             # Delete the scrawl
@@ -215,8 +389,20 @@ class ScrawlTool(SelectTool):
         elif event.characters() == "e":
             # Toggle between draw and eraser mode
             self.erase = not (self.erase)
-            self.prev_location = None
+            self.stroke_input.reset()
             self.updateView()
+        elif event.characters() == "s":
+            # Toggle stroke smoothing
+            self.stroke_input.smooth = not self.stroke_input.smooth
+            Glyphs.defaults[SCRAWL_SMOOTH_DEFAULTS_KEY] = self.stroke_input.smooth
+        elif event.characters() == "o":
+            # Toggle the onion skin of the other masters
+            self.onion_skin = not self.onion_skin
+            Glyphs.defaults[ONION_SKIN_DEFAULTS_KEY] = self.onion_skin
+            self.updateView()
+        elif event.characters() in ("z", "Z"):
+            # Undo the last stroke, or redo it with Shift
+            self.undoStroke(redo=event.characters() == "Z")
         elif event.characters() in (
             "1", "2", "3", "4", "5",
             "6", "7", "8", "9"
@@ -229,83 +415,134 @@ class ScrawlTool(SelectTool):
             objc.super(ScrawlTool, self).keyDown_(event)
 
     @objc.python_method
-    def setPixel(self, event, dragging=False) -> bool:
+    def pixelLocation(self, event) -> tuple[float, float] | None:
+        # Get the location of a mouse event in scrawl pixels
         if self.data is None:
-            return False
+            return None
 
         try:
             editView = self.editViewController().graphicView()
         except:  # noqa: E722
-            return False
+            return None
 
         layer = editView.activeLayer()
         try:
             master = layer.font().masters[layer.layerId]
         except:  # noqa: 722
-            return False
+            return None
 
         if master is None:
-            return False
+            return None
 
-        # Get location of click in font coordinates
+        # Get location of click in font coordinates. Round it like the
+        # journal does, so that undo can replay the stroke exactly.
         Loc = editView.getActiveLocation_(event)
-        loc_pixel = (
+        return quantize(
             (Loc.x - self.rect.origin.x) / self.pixel_size,
             (Loc.y - self.rect.origin.y) / self.pixel_size / self.pixel_ratio
         )
-        if self.prev_location != loc_pixel:
-            x, y = loc_pixel
-            current = NSGraphicsContext.currentContext()
-            context = NSGraphicsContext.graphicsContextWithBitmapImageRep_(
-                self.data
-            )
-            if context is None:
-                self.prev_location = loc_pixel
-                print("Could not get context in setPixel")
-                return False
 
-            NSGraphicsContext.saveGraphicsState()
-            NSGraphicsContext.setCurrentContext_(context)
-            if self.erase:
-                NSColor.whiteColor().set()
-                # FIXME: How to erase properly?
-                # NSColor.clearColor().set()
-            else:
-                NSColor.blackColor().set()
-            effective_size = self.pen_size / self.pixel_size
-            if dragging and self.prev_location is not None:
-                px, py = self.prev_location
-                path = NSBezierPath.alloc().init()
-                path.setLineCapStyle_(NSRoundLineCapStyle)
-                path.setLineWidth_(effective_size)
-                # path.strokeLineFromPoint_toPoint_(
-                #     x, y,
-                #     x + self.pen_size, y + self.pen_size
-                # )
-                path.moveToPoint_((px, py))
-                path.lineToPoint_((x, y))
-                path.stroke()
-                self.needs_save = True
-            else:
-                half = effective_size / 2
-                rect = NSMakeRect(
-                    x - half,
-                    y - half,
-                    effective_size,
-                    effective_size
-                )
-                path = NSBezierPath.bezierPathWithOvalInRect_(rect)
-                path.fill()
-                self.needs_save = True
-            # For rectangular pens:
-            # NSBezierPath.fillRect_(rect)
-            NSGraphicsContext.setCurrentContext_(current)
-            NSGraphicsContext.restoreGraphicsState()
-            self.prev_location = loc_pixel
-        return True
+    @objc.python_method
+    def setPixel(self, points) -> None:
+        # Draw a polyline, or a dot if there is only one point, in scrawl
+        # pixels with the current pen
+        start = timings.start()
+        value = pen_value(self.erase)
+        rx, ry = pen_radii(
+            self.pen_size,
+            self.pixel_size,
+            self.pixel_ratio,
+            self.pixel_ratio
+        )
+        bounds = self.data.polyline(points, rx, ry, value)
+        # The pen preview moves along, so its area needs a redraw even if no
+        # pixels have changed
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        footprint = (min(xs) - rx, min(ys) - ry, max(xs) + rx, max(ys) + ry)
+        if bounds is not None:
+            footprint = union_bounds(footprint, bounds)
+        self.dirty_rect = union_rect(self.dirty_rect, bounds_to_rect(
+            footprint,
+            (self.rect.origin.x, self.rect.origin.y),
+            self.pixel_size,
+            self.pixel_ratio
+        ))
+        self.needs_save = True
+        timings.stop(DRAW, start)
+
+    @objc.python_method
+    def fillArea(self, location) -> None:
+        # Flood fill with ink, or clear a blob of ink in eraser mode. The fill
+        # stays inside the drawing rect.
+        start = timings.start()
+        box = (0, 0, self.data.width, self.data.height)
+        bounds = self.data.fill(*location, pen_value(self.erase), box)
+        timings.stop(FLOOD_FILL, start)
+        if bounds is None:
+            return
+
+        if self.journal is not None:
+            self.journal.append(Stroke(
+                (location, box[:2], box[2:]),
+                self.pen_size,
+                self.pixel_ratio,
+                self.erase,
+                fill=True,
+            ), self.data)
+        self.dirty_rect = union_rect(self.dirty_rect, bounds_to_rect(
+            bounds,
+            (self.rect.origin.x, self.rect.origin.y),
+            self.pixel_size,
+            self.pixel_ratio
+        ))
+        self.saveScrawl()
+        self.updateDirtyRect()
+
+    @objc.python_method
+    def drawPendingStroke(self, final: bool = False) -> None:
+        points = self.stroke_input.take(final)
+        if points:
+            self.setPixel(points)
+            self.updateDirtyRect()
 
     def mouseDidMove_(self, event) -> None:
-        Glyphs.redraw()
+        # Move the pen preview at most once per display frame. When an update
+        # is skipped, schedule one for the next frame so the preview always
+        # ends up at the last mouse position.
+        start = perf_counter()
+        # By the time of a scheduled update, the current event may be another
+        # one, so keep where the mouse is now
+        try:
+            self.cursor_location = self.editViewController().graphicView(
+            ).getActiveLocation_(Glyphs.currentEvent())
+        except:  # noqa: E722
+            self.cursor_location = None
+        delay = self.preview_throttle.poll()
+        if delay == 0:
+            self.updateCursorPreview()
+        elif not self.preview_pending:
+            self.preview_pending = True
+            self.performSelector_withObject_afterDelay_(
+                "flushCursorPreview:", None, delay
+            )
+        self.preview_throttle.record(perf_counter() - start)
+
+    def flushCursorPreview_(self, sender=None) -> None:
+        start = perf_counter()
+        self.preview_pending = False
+        self.preview_throttle.trigger()
+        self.updateCursorPreview()
+        self.preview_throttle.record(perf_counter() - start)
+
+    @objc.python_method
+    def updateCursorPreview(self) -> None:
+        # Redraw the pen preview oval at its old and at its new position
+        rect = self.preview_rect
+        if self.cursor_location is not None:
+            rect = union_rect(rect, self.previewRect(self.cursor_location))
+        if rect is not None:
+            self.invalidateFontRect(rect)
 
     def mouseDown_(self, event) -> None:
         if event.clickCount() == 3:
@@ -316,18 +553,157 @@ class ScrawlTool(SelectTool):
             self.mouseDoubleDown_(event)
             return
 
-        if self.setPixel(event):
-            self.updateView()
+        location = self.pixelLocation(event)
+        if location is None:
+            return
+
+        if event.modifierFlags() & NSEventModifierFlagOption:
+            # Option-click fills the area under the pen
+            self.recordEvent(FILL, event, location)
+            self.filling = True
+            self.fillArea(location)
+            return
+
+        self.recordEvent(DOWN, event, location)
+        self.stroke_input.begin(*location, event.timestamp())
+        self.setPixel([location])
+        self.updateDirtyRect()
 
     def mouseDragged_(self, event) -> None:
-        if self.setPixel(event, True):
-            self.updateView()
+        if self.filling:
+            return
+
+        location = self.pixelLocation(event)
+        if location is None:
+            return
+
+        self.recordEvent(DRAG, event, location)
+        # Collect the drag events and draw them once per display frame
+        self.stroke_input.add(*location, event.timestamp())
+        delay = self.stroke_throttle.poll()
+        if delay == 0:
+            self.drawPendingStroke()
+        elif not self.stroke_pending:
+            self.stroke_pending = True
+            self.performSelector_withObject_afterDelay_(
+                "flushStroke:", None, delay
+            )
+
+    def flushStroke_(self, sender=None) -> None:
+        self.stroke_pending = False
+        self.stroke_throttle.trigger()
+        self.drawPendingStroke()
 
     def mouseUp_(self, event) -> None:
-        if self.setPixel(event):
-            if self.needs_save:
-                self.saveScrawl()
-                self.updateView()
+        location = self.pixelLocation(event)
+        self.recordEvent(UP, event, location)
+        if self.filling:
+            self.filling = False
+            return
+
+        if location is not None:
+            self.stroke_input.add(*location, event.timestamp())
+        if self.stroke_pending:
+            NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(
+                self, "flushStroke:", None
+            )
+            self.stroke_pending = False
+        self.drawPendingStroke(final=True)
+        if self.needs_save and self.journal is not None:
+            self.journal.append(Stroke(
+                tuple(self.stroke_input.path),
+                self.pen_size,
+                self.pixel_ratio,
+                self.erase,
+                self.stroke_input.smooth,
+            ), self.data)
+        self.stroke_input.reset()
+        if self.needs_save:
+            self.saveScrawl()
+            self.updateDirtyRect()
+
+    @objc.python_method
+    def recordEvent(self, kind, event, location) -> None:
+        if self.recorder is not None:
+            self.recorder.record(
+                kind,
+                event.timestamp(),
+                location,
+                self.pen_size,
+                self.erase,
+                self.stroke_input.smooth
+            )
+
+    def toggleRecording(self) -> None:
+        # Record the pointer events for replaying them with scrawl.replay
+        Glyphs.showMacroWindow()
+        if self.recorder is None:
+            self.recorder = SessionRecorder()
+            if self.data is not None:
+                self.recorder.canvas(
+                    self.data.width,
+                    self.data.height,
+                    self.pixel_size,
+                    self.pixel_ratio
+                )
+            print("Recording the drawing session.")
+            return
+
+        recorder = self.recorder
+        self.recorder = None
+        if not len(recorder):
+            print("Nothing was drawn, the session was not saved.")
+            return
+
+        font = Glyphs.font
+        if font is not None and font.filepath is not None:
+            folder = dirname(font.filepath)
+        else:
+            folder = expanduser("~")
+        path = join(folder, strftime("Scrawl session %Y-%m-%d %H.%M.%S.json"))
+        try:
+            recorder.save(path)
+        except OSError as e:
+            print(f"Error saving the drawing session: {e}")
+            return
+
+        print(f"Saved the drawing session with {len(recorder)} events to {path}")
+
+    def toggleSmoothEdges(self) -> None:
+        # Smooth edges when zoomed in, in the tool and in the reporter
+        self.smooth_edges = not self.smooth_edges
+        Glyphs.defaults[SMOOTH_DEFAULTS_KEY] = self.smooth_edges
+        self.updateView()
+
+    def toggleTimings(self) -> None:
+        # Time drawing, loading and saving in the tool and drawing in the
+        # reporter, see scrawl.timing
+        Glyphs.showMacroWindow()
+        if not timings.enabled:
+            timings.reset()
+            timings.enabled = True
+            print("Measuring Scrawl performance.")
+            return
+
+        timings.enabled = False
+        if not len(timings):
+            print("Nothing was measured.")
+            return
+
+        print(timings.report())
+        font = Glyphs.font
+        if font is not None and font.filepath is not None:
+            folder = dirname(font.filepath)
+        else:
+            folder = expanduser("~")
+        path = join(folder, strftime("Scrawl timings %Y-%m-%d %H.%M.%S.json"))
+        try:
+            timings.save(path)
+        except OSError as e:
+            print(f"Error saving the timings: {e}")
+            return
+
+        print(f"Saved the timings to {path}")
 
     @objc.python_method
     def __file__(self) -> str:
@@ -338,13 +714,17 @@ class ScrawlTool(SelectTool):
     def update(self, sender=None) -> None:
         cl = self.get_current_layer()
         if cl != self.current_layer:
-            if self.needs_save:
-                self.saveScrawl()
+            if self.needs_save or self.needsCompaction():
+                self.saveScrawl(compact=self.needsCompaction())
+            # Make sure the userData is up to date before leaving the layer
+            self.saver.flush()
+            self.withdrawScrawl()
             self.current_layer = cl
             self.loadScrawl()
             self.w.pen_size.set(self.pen_size)
             self.w.pen_size_text.set(self.pen_size)
-            self.prev_location = None
+            self.stroke_input.reset()
+            self.prefetchNeighbours()
         self.updateView()
 
     def updateView(self) -> None:
@@ -352,136 +732,470 @@ class ScrawlTool(SelectTool):
         if currentTabView:
             currentTabView.graphicView().setNeedsDisplay_(True)
 
+    def updateDirtyRect(self) -> None:
+        # Redraw only the area that was drawn on since the last frame
+        if self.dirty_rect is not None:
+            self.invalidateFontRect(self.dirty_rect)
+
+    @objc.python_method
+    def invalidateFontRect(self, rect) -> None:
+        # Mark a rect in font units of the active layer for redrawing
+        try:
+            graphicView = self.editViewController().graphicView()
+            scale = graphicView.scale()
+            origin = graphicView.activePosition()
+        except:  # noqa: E722
+            self.updateView()
+            return
+
+        # Add two view pixels for anti-aliasing and the pen preview's outline
+        x, y, w, h = inset_rect(rect, -2 / scale)
+        graphicView.setNeedsDisplayInRect_(NSMakeRect(
+            origin.x + x * scale,
+            origin.y + y * scale,
+            w * scale,
+            h * scale
+        ))
+
+    @objc.python_method
+    def scrawlIndex(self, rebuild: bool = False) -> ScrawlIndex:
+        # The index is built on first use and kept up to date when scrawls
+        # are saved or deleted. Layers that got a scrawl some other way are
+        # only found when it is built again.
+        font = Glyphs.font
+        if rebuild or self.index is None or self.index_font != font:
+            self.saver.flush()
+            self.index = ScrawlIndex.for_font(font)
+            self.index_font = font
+        return self.index
+
     def deleteData(self) -> None:
-        for layer in Glyphs.font.selectedLayers:
-            self.deleteScrawl(layer)
+        for entry in self.scrawlIndex().refresh(Glyphs.font.selectedLayers):
+            self.deleteScrawl(entry.layer)
         self.updateView()
 
     def saveBackground(self) -> None:
-        for layer in Glyphs.font.selectedLayers:
-            self.saveScrawlToBackground(layer)
+        self.saver.flush()
+        for entry in self.scrawlIndex().refresh(Glyphs.font.selectedLayers):
+            self.saveScrawlToBackground(entry.layer)
+
+    def recompressScrawls(self) -> None:
+        # Convert all scrawls of the font that are still in a legacy format
+        self.saver.flush()
+        font = Glyphs.font
+        store = blob_store(font) if uses_sidecar(font) else None
+        converted, errors = self.scrawlIndex().recompress(
+            tilesFromData, lambda canvas: self.storeData(encode(canvas), store)
+        )
+        # The patches of the current layer may have been folded
+        self.patch_base = None
+        for entry, _ in converted:
+            decoded_images.invalidate(layer_key(entry.layer))
+        Glyphs.showMacroWindow()
+        for error in errors:
+            print(f"Error in image data of layer {error}")
+        print(format_size_report([
+            (entry.name, entry.format or "?", entry.size, new_size)
+            for entry, new_size in converted
+        ]))
+
+    def sizeReport(self) -> None:
+        # Show how much the scrawls of the font shrink in the current format
+        self.saver.flush()
+        index = self.scrawlIndex()
+        rows = []
+        for entry in index:
+            try:
+                if entry.format == POINTS_FORMAT:
+                    new_size = len(encode_legacy(entry.layer)[0])
+                else:
+                    new_size = len(encode(tilesFromData(
+                        scrawl_data(entry.layer), scrawl_patches(entry.layer)
+                    )))
+            except:  # noqa: E722
+                print(f"Error in image data of layer {entry.layer}")
+                continue
+            rows.append((entry.name, entry.format or "?", entry.size, new_size))
+        Glyphs.showMacroWindow()
+        print(format_size_report(rows))
+        near_limit = index.near_limit()
+        if near_limit:
+            print("\nScrawls near the userData limit, with undo history:")
+            print(format_limit_report(
+                (entry.name, entry.total_size) for entry in near_limit
+            ))
+
+    def collectScrawlFiles(self) -> None:
+        # Remove the files in the sidecar folder that no layer refers to,
+        # neither in the open font nor in the font file on disk
+        self.saver.flush()
+        font = Glyphs.font
+        store = blob_store(font)
+        if store is None:
+            print("The font has not been saved, it has no scrawl files.")
+            return
+
+        # Don't miss a file that a pasted or duplicated layer refers to
+        referenced = self.scrawlIndex(rebuild=True).sidecar_digests()
+        try:
+            referenced.update(
+                record.blob
+                for record in iter_scrawls(font.filepath)
+                if record.blob is not None
+            )
+        except:  # noqa: E722
+            print("Error reading the font file, no scrawl files were removed.")
+            return
+
+        count, size = store.collect_garbage(referenced)
+        Glyphs.showMacroWindow()
+        print(f"Removed {count} unused scrawl files ({size} bytes).")
 
     def sliderCallback_(self, sender=None) -> None:
         if sender is not None:
             self.pen_size = int("%i" % sender.get())
             self.w.pen_size_text.set(self.pen_size)
-            self.prev_location = None
+            self.stroke_input.reset()
             self.updateView()
 
     @objc.python_method
-    def loadDefaultRect(self) -> None:
-        # Make the default drawing rect based on master and layer dimensions
+    def loadScrawl(self) -> None:
         if self.current_layer is None:
             return
 
-        font = self.current_layer.font()
-        upm = font.upm
-        pad_v = round(upm * 0.2)
-        pad_h = round(upm * 0.5)
+        start = timings.start()
+        scrawl = load_scrawl(self.current_layer, self.decodeScrawl)
+        if scrawl.pen_size is not None:
+            self.pen_size = scrawl.pen_size  # scrawl pixels
+            # Otherwise, keep the previous size
+        self.pixel_size = scrawl.pixel_size  # font units
+        self.pixel_ratio = scrawl.pixel_ratio
+        self.rect = NSMakeRect(*scrawl.rect)
+        self.data = scrawl.canvas
+        self.journal = self.loadJournal(scrawl.data, scrawl.shift)
+        self.tile_reps.clear()
+        invalidate_smooth(layer_key(self.current_layer))
+        if self.index is not None:
+            # The scrawl may have been pasted or undone since it was indexed
+            self.index.update(self.current_layer)
+        self.needs_save = False
+        self.resetPatchBase(scrawl.data is not None)
+        self.publishScrawl()
+        timings.stop(LOAD, start, len(scrawl.data or b""))
+        if self.recorder is not None:
+            self.recorder.canvas(
+                self.data.width,
+                self.data.height,
+                self.pixel_size,
+                self.pixel_ratio
+            )
+
+    @objc.python_method
+    def decodeScrawl(self, data) -> TiledBuffer:
+        # Use the canvas that was decoded ahead of time, if there is one
+        canvas = self.prefetcher.take(
+            layer_key(self.current_layer), data_digest(self.current_layer)
+        )
+        if canvas is None:
+            canvas = tilesFromData(data)
+        return canvas
 
+    @objc.python_method
+    def prefetchNeighbours(self) -> None:
+        # Decode the scrawls of the layers next to the cursor in the current
+        # tab on a worker thread, nearest first
         try:
-            descender = font.masters[self.current_layer.layerId].descender
-        except (AttributeError, KeyError):
-            descender = round(-upm * 0.2)
+            tab = Glyphs.font.currentTab
+            layers = tab.layers
+            cursor = tab.layersCursor
+        except:  # noqa: E722
+            return
 
-        self.rect = NSMakeRect(
-            -pad_h,
-            descender - pad_v,
-            2 * pad_h + self.current_layer.width,
-            2 * pad_v + upm
-        )
+        jobs = []
+        seen = {layer_key(self.current_layer)}
+        for distance in range(1, prefetch_radius + 1):
+            for index in (cursor + distance, cursor - distance):
+                if not 0 <= index < len(layers):
+                    continue
+
+                layer = layers[index]
+                try:
+                    key = layer_key(layer)
+                    if key in seen:
+                        continue
+
+                    # The hash is cached, or the name of the sidecar file;
+                    # the data is read on the worker thread
+                    digest = data_digest(layer)
+                    read = data_reader(layer)
+                except:  # noqa: E722
+                    # e.g. a line break
+                    continue
+
+                if digest is not None and read is not None:
+                    seen.add(key)
+                    jobs.append(PrefetchJob(key, digest, read))
+        self.prefetcher.prefetch(jobs)
 
     @objc.python_method
-    def loadScrawl(self) -> None:
-        if self.current_layer is None:
+    def publishScrawl(self) -> None:
+        # Let the reporter draw the canvas being edited, instead of decoding
+        # the data that was saved from it
+        if self.current_layer is None or self.data is None:
             return
 
-        pen_size = self.current_layer.userData[SCRAWL_SIZE_KEY]
-        if pen_size is not None:
-            self.pen_size = pen_size  # scrawl pixels
-            # Otherwise, keep the previous size
+        live_scrawls.publish(layer_key(self.current_layer), LiveScrawl(
+            self.data,
+            (self.rect.origin.x, self.rect.origin.y),
+            self.pixel_size,
+            self.pixel_ratio,
+            self.tile_reps
+        ))
 
-        self.pixel_size = self.current_layer.userData[SCRAWL_UNIT_KEY]
-        if self.pixel_size is None:
-            self.pixel_size = default_pixel_size  # font units
+    @objc.python_method
+    def withdrawScrawl(self) -> None:
+        if self.current_layer is not None:
+            live_scrawls.withdraw(layer_key(self.current_layer))
 
-        self.pixel_ratio = self.current_layer.master.customParameters[
-            "ScrawlPenRatio"
-        ]
-        if self.pixel_ratio is None:
-            self.pixel_ratio = default_pixel_ratio
-        else:
-            self.pixel_ratio = float(self.pixel_ratio)
+    @objc.python_method
+    def loadJournal(self, data, shift=(0, 0)) -> StrokeJournal:
+        # The saved undo history is only used if it ends in the saved scrawl
+        journal = self.current_layer.userData[SCRAWL_JOURNAL_KEY]
+        if journal is not None and data is not None:
+            try:
+                journal, digest = StrokeJournal.frombytes(journal)
+                if digest == scrawl_digest(self.current_layer) and \
+                        journal.pixel_size == self.pixel_size:
+                    # Follow the canvas, which is larger than the saved one
+                    journal.move(*shift, self.data.width, self.data.height)
+                    return journal
+            except:  # noqa: E722
+                print(f"Error in undo history of layer {self.current_layer}")
+        return StrokeJournal(self.data, self.pixel_size)
 
-        # Drawing rect
-        rect = self.current_layer.userData[SCRAWL_RECT_KEY]
-        if rect is None:
-            self.loadDefaultRect()
+    @objc.python_method
+    def resetPatchBase(self, loaded: bool = True) -> None:
+        # After loading the current layer, the next saves are patches of its
+        # stored data
+        self.full_save_pending = None
+        self.patch_base = None
+        if self.current_layer is None or self.data is None or not loaded:
+            return
+
+        self.patch_base = patch_base(
+            self.current_layer,
+            tile_versions(self.data),
+            (self.rect.origin.x, self.rect.origin.y),
+            self.pixel_size
+        )
+
+    @objc.python_method
+    def needsCompaction(self) -> bool:
+        return self.patch_base is not None and \
+            self.patch_base.needs_compaction and \
+            self.full_save_pending is None
+
+    @objc.python_method
+    def saveScrawl(self, compact: bool = False) -> None:
+        if self.current_layer is None:
+            return
+        save_settings(self.current_layer, self.pen_size, self.pixel_size)
+        key = layer_key(self.current_layer)
+        font = self.current_layer.font()
+        if self.data is None:
+            self.saver.discard(key)
+            delete_scrawl(self.current_layer)
+            decoded_images.invalidate(key)
+            self.patch_base = None
         else:
-            self.rect = NSMakeRect(*rect)
-
-        # Image data
-        data = self.current_layer.userData[SCRAWL_DATA_KEY]
-        if data is None:
-            self.data = initImage(
-                self.rect.size.width,
-                self.rect.size.height,
+            self.growRect()
+            origin = (self.rect.origin.x, self.rect.origin.y)
+            # Save only the tiles that changed since the last save, unless the
+            # whole scrawl is waiting to be written or should be saved
+            snapshot, versions = snapshot_scrawl(
+                self.data,
+                self.journal.snapshot() if self.journal is not None else None,
+                origin,
                 self.pixel_size,
-                self.pixel_ratio
+                self.pixel_ratio,
+                None if compact or self.full_save_pending is not None
+                else self.patch_base
             )
-        else:
-            try:
-                self.data = NSBitmapImageRep.alloc().initWithData_(data)
-                self.data.setProperty_withValue_(
-                    NSImageColorSyncProfileData,
-                    None
-                )
-            except:  # noqa: E722
-                print(f"Error in image data of layer {self.current_layer}")
-                self.data = initImage(
-                    self.rect.size.width,
-                    self.rect.size.height,
-                    self.pixel_size,
-                    self.pixel_ratio
-                )
+            if snapshot is None:
+                self.needs_save = False
+                return
+
+            if snapshot.plan is None:
+                self.full_save_pending = versions
+            # Encode the snapshot on the background thread. Legacy PNG data
+            # is upgraded to the compact format there. Only tiles with ink
+            # are saved.
+            self.saver.submit(key, (
+                snapshot,
+                blob_store(font) if uses_sidecar(font) else None
+            ), (self.current_layer, versions, origin, snapshot.plan))
         self.needs_save = False
 
     @objc.python_method
-    def saveScrawl(self) -> None:
-        if self.current_layer is None:
+    def encodeScrawl(self, job) -> EncodedScrawl:
+        # Called on the encoder thread. The scrawl is stored cropped to its
+        # ink, the undo history follows the cropped canvas. A patch has no
+        # rect, it is stored with the canvas of the data.
+        snapshot, store = job
+        start = timings.start()
+        result = encode_snapshot(snapshot, journal_limit)
+        timings.stop(ENCODE, start, len(result.data))
+        if result.rect is None:
+            return result
+
+        return result._replace(data=self.storeData(result.data, store))
+
+    @objc.python_method
+    def storeData(self, data: bytes, store) -> bytes | BlobReference:
+        # Move larger data to the sidecar folder, if the font has one
+        if store is not None and len(data) >= sidecar_min_size:
+            try:
+                return BlobReference(store.put(data))
+            except OSError as e:
+                # Keep the data in the userData instead
+                print(f"Error writing to the scrawl sidecar folder: {e}")
+        return data
+
+    @objc.python_method
+    def writeScrawl(
+        self, key, context, result: EncodedScrawl | EncodeError
+    ) -> None:
+        # Called on the main thread with the encoded data
+        layer, versions, origin, plan = context
+        current = layer == self.current_layer
+        if isinstance(result, EncodeError):
+            self.logToConsole(f"Error encoding scrawl of {layer}: {result.error}")
+            print(f"Error saving the scrawl of layer {layer}: {result.error}")
+            if current:
+                # Save the whole scrawl with the next change, or when the
+                # tool is deactivated
+                if versions is self.full_save_pending:
+                    self.full_save_pending = None
+                self.patch_base = None
+                self.needs_save = True
             return
-        self.current_layer.userData[SCRAWL_SIZE_KEY] = round(self.pen_size)
-        self.current_layer.userData[SCRAWL_UNIT_KEY] = round(self.pixel_size)
-        if self.data is None:
-            del self.current_layer.userData[SCRAWL_DATA_KEY]
-            del self.current_layer.userData[SCRAWL_RECT_KEY]
+
+        start = timings.start()
+        resave = False
+        # print("Saving scrawl with %i bytes ..." % len(result.data))
+        # if len(result.data) > 2**16:
+        #     print("Glyphs Bug: Image is too big to save")
+        if result.rect is None:
+            base = self.patch_base if current else None
+            stored = scrawl_digest(layer) if base is None else base.digest
+            journal = result.journal
+            digest = result.digest
+            if stored != plan.digest:
+                # Another patch was stored after this one was planned, so its
+                # history would not match the data. Save the whole scrawl
+                # again to keep the history.
+                journal = None
+                resave = current
+                if stored is not None:
+                    digest = extend_digest(stored, result.data)
+            append_patch(layer, result.data, journal)
+            if base is not None:
+                self.patch_base = base.patched(
+                    len(result.data), versions, digest
+                )
         else:
-            self.current_layer.userData[SCRAWL_RECT_KEY] = (
-                self.rect.origin.x,
-                self.rect.origin.y,
-                self.rect.size.width,
-                self.rect.size.height
+            save_scrawl(layer, result.rect, result.data, result.journal)
+            if current and versions is self.full_save_pending:
+                # Later saves are patches of this one
+                self.full_save_pending = None
+                self.patch_base = patch_base(
+                    layer, versions, origin, self.pixel_size
+                )
+        if self.index is not None:
+            self.index.update(layer)
+        decoded_images.invalidate(key)
+        timings.stop(WRITE, start)
+        if resave:
+            self.saveScrawl(compact=True)
+        elif current and self.needsCompaction():
+            # Wait for a pause in drawing
+            NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(
+                self, "compactScrawl:", None
             )
-            imgdata = self.data.representationUsingType_properties_(
-                NSPNGFileType, None
+            self.performSelector_withObject_afterDelay_(
+                "compactScrawl:", None, compact_delay
             )
-            # print("Saving PNG with %i bytes ..." % len(imgdata))
-            # if len(imgdata) > 2**16:
-            #     print("Glyphs Bug: Image is too big to save")
-            #     # imgdata.writeToFile_atomically_(join(
-            #     #     dirname(__file__), "test.png"
-            #     # ), False)
-            self.current_layer.userData[SCRAWL_DATA_KEY] = imgdata
-        self.needs_save = False
+
+    def compactScrawl_(self, sender=None) -> None:
+        # Fold the patches into the data by saving the whole scrawl
+        if self.needsCompaction():
+            self.saveScrawl(compact=True)
+
+    @objc.python_method
+    def scrawlEncoded(self) -> None:
+        # Called on the encoder thread
+        self.performSelectorOnMainThread_withObject_waitUntilDone_(
+            "deliverScrawls:", None, False
+        )
+
+    def deliverScrawls_(self, sender=None) -> None:
+        self.saver.drain()
+
+    @objc.python_method
+    def undoStroke(self, redo: bool = False) -> None:
+        if self.journal is None:
+            return
+
+        canvas = self.journal.redo() if redo else self.journal.undo()
+        if canvas is None:
+            return
+
+        self.data = canvas
+        self.stroke_input.reset()
+        self.tile_reps.clear()
+        invalidate_smooth(layer_key(self.current_layer))
+        self.publishScrawl()
+        self.saveScrawl()
+        self.updateView()
+
+    @objc.python_method
+    def growRect(self) -> None:
+        # Extend the drawing rect to include everything that was drawn outside
+        # of it. The canvas grows by whole tiles, the pixels stay in place.
+        width, height = self.data.width, self.data.height
+        shift_x, shift_y = self.data.grow_to_fit()
+        if (shift_x, shift_y) == (0, 0) and (width, height) == (
+            self.data.width, self.data.height
+        ):
+            return
+
+        self.stroke_input.reset()
+        self.tile_reps.clear()
+        if self.journal is not None:
+            self.journal.move(
+                shift_x, shift_y, self.data.width, self.data.height
+            )
+        self.rect = NSMakeRect(
+            self.rect.origin.x - shift_x * self.pixel_size,
+            self.rect.origin.y - shift_y * self.pixel_size * self.pixel_ratio,
+            self.data.width * self.pixel_size,
+            self.data.height * self.pixel_size * self.pixel_ratio
+        )
+        self.publishScrawl()
 
     @objc.python_method
     def deleteScrawl(self, layer) -> None:
         if layer is None:
             return
-        for key in (SCRAWL_DATA_KEY, SCRAWL_RECT_KEY, SCRAWL_SIZE_KEY, SCRAWL_UNIT_KEY):
-            if layer.userData[key] is not None:
-                del layer.userData[key]
+        self.saver.discard(layer_key(layer))
+        delete_scrawl(layer)
+        if self.index is not None:
+            self.index.update(layer)
+        decoded_images.invalidate(layer_key(layer))
         self.needs_save = False
+        if layer == self.current_layer:
+            # Start over with an empty canvas
+            self.loadScrawl()
 
     @objc.python_method
     def saveScrawlToBackground(self, layer) -> None:
@@ -493,25 +1207,27 @@ class ScrawlTool(SelectTool):
             )
             return
 
-        data = layer.userData[SCRAWL_DATA_KEY]
+        try:
+            data = scrawl_data(layer)
+        except OSError as e:
+            print(f"Error in image data of layer {layer}: {e}")
+            return
+
         pixel_size = layer.userData[SCRAWL_UNIT_KEY]
-        pixel_ratio = layer.master.customParameters["ScrawlPenRatio"]
-        if pixel_ratio is None:
-            pixel_ratio = default_pixel_ratio
-        else:
-            pixel_ratio = float(pixel_ratio)
-        rect = NSMakeRect(*layer.userData[SCRAWL_RECT_KEY])
+        ratio = pixel_ratio(layer)
+        rect = NSMakeRect(*scrawl_rect(layer))
         if data is not None:
             image_path = join(dirname(font.filepath), "%s-%s.png" % (
                 layer.layerId,
                 layer.parent.name
             ))
             try:
-                imgdata = NSBitmapImageRep.alloc().initWithData_(data)
+                buffer = bufferFromData(data, scrawl_patches(layer))
             except:  # noqa: E722
                 print("Error saving the image file.")
                 return
 
+            imgdata = imageRepForBuffer(buffer)
             pngdata = imgdata.representationUsingType_properties_(
                 NSPNGFileType, None
             )
@@ -523,5 +1239,5 @@ class ScrawlTool(SelectTool):
             )
             layer.backgroundImage.scale = (
                 float(pixel_size),
-                float(pixel_size * pixel_ratio)
+                float(pixel_size * ratio)
             )
@@ -0,0 +1,7 @@
+"""
+Headless core of the Scrawl plugins.
+
+Apart from `scrawl.appkit`, nothing in this package may import AppKit or
+GlyphsApp, so that it can be used outside of Glyphs (scripts, command line
+tools) and on other platforms.
+"""
@@ -0,0 +1,225 @@
+"""
+Conversion between scrawl buffers and AppKit images.
+
+This is the only module of the package that imports AppKit.
+"""
+
+from __future__ import annotations
+
+from math import hypot
+
+from AppKit import NSBitmapImageRep, NSCompositeSourceOver, \
+    NSDeviceWhiteColorSpace, NSGraphicsContext, NSImage, \
+    NSImageColorSyncProfileData, NSImageInterpolationHigh, \
+    NSImageInterpolationNone, NSMakeRect, NSZeroRect
+from Quartz import CGContextGetClipBoundingBox, CGContextGetCTM
+
+from scrawl.atlas import AtlasSlot, ScrawlAtlas
+from scrawl.codec import ScrawlFormatError, decode, decode_tiles, \
+    is_scrawl_data
+from scrawl.geometry import Rect
+from scrawl.onion import ONION_SKIN_FRACTION, onion_skin
+from scrawl.patches import apply_patches
+from scrawl.raster import ScrawlBuffer
+from scrawl.sdf import SmoothTile
+from scrawl.tiles import TiledBuffer
+
+
+def imageRepForBuffer(buffer: ScrawlBuffer) -> NSBitmapImageRep:
+    # Wrap the buffer's memory in an image rep, without copying it. The caller
+    # must keep the buffer alive as long as the image rep is used.
+    # See https://developer.apple.com/documentation/appkit/nsbitmapimagerep/1395538-init
+    return NSBitmapImageRep.alloc().initWithBitmapDataPlanes_pixelsWide_pixelsHigh_bitsPerSample_samplesPerPixel_hasAlpha_isPlanar_colorSpaceName_bitmapFormat_bytesPerRow_bitsPerPixel_(  # noqa: E501
+        (buffer.pixels, None, None, None, None),  # BitmapDataPlanes
+        buffer.width,   # pixelsWide
+        buffer.height,  # pixelsHigh
+        8,       # bitsPerSample
+        2,       # samplesPerPixel: gray, alpha
+        True,    # hasAlpha
+        False,   # isPlanar
+        NSDeviceWhiteColorSpace,  # colorSpaceName
+        0,       # bitmapFormat
+        buffer.bytes_per_row,  # bytesPerRow
+        16,      # bitsPerPixel
+    )
+
+
+def imageForBuffer(buffer: ScrawlBuffer) -> NSImage:
+    # Like imageRepForBuffer, the buffer must be kept alive with the image
+    image = NSImage.alloc().initWithSize_((buffer.width, buffer.height))
+    image.addRepresentation_(imageRepForBuffer(buffer))
+    return image
+
+
+def currentScale() -> float:
+    # Device pixels per unit of the current graphics context, e.g. per font
+    # unit while a reporter draws, including the screen's backing scale
+    context = NSGraphicsContext.currentContext()
+    if context is None:
+        return 1.0
+
+    transform = CGContextGetCTM(context.CGContext())
+    return hypot(transform.a, transform.b)
+
+
+def visibleRect() -> Rect | None:
+    # The area that is being drawn, in the units of the current graphics
+    # context, e.g. font units while a reporter draws
+    context = NSGraphicsContext.currentContext()
+    if context is None:
+        return None
+
+    box = CGContextGetClipBoundingBox(context.CGContext())
+    return (box.origin.x, box.origin.y, box.size.width, box.size.height)
+
+
+def tileImageRep(cache: dict, key, tile: ScrawlBuffer) -> NSBitmapImageRep:
+    # The image rep shares the tile's memory, but AppKit may cache what it has
+    # drawn, so make a new one after the tile was changed
+    cached = cache.get(key)
+    if cached is None or cached[0] is not tile or cached[1] != tile.version:
+        cached = (tile, tile.version, imageRepForBuffer(tile))
+        cache[key] = cached
+    return cached[2]
+
+
+def drawTiles(
+    canvas: TiledBuffer,
+    origin: tuple[float, float],
+    pixel_size: float,
+    pixel_ratio: float,
+    cache: dict,
+    fraction: float = 1.0,
+) -> None:
+    # Draw only the allocated tiles of a canvas whose origin is at `origin`
+    # in font units
+    x, y = origin
+    tile_width = canvas.tile_size * pixel_size
+    tile_height = tile_width * pixel_ratio
+    for key, tile in canvas:
+        tx, ty = key
+        rect = NSMakeRect(
+            x + tx * tile_width,
+            y + ty * tile_height,
+            tile_width,
+            tile_height
+        )
+        rep = tileImageRep(cache, key, tile)
+        if fraction == 1:
+            rep.drawInRect_(rect)
+        else:
+            rep.drawInRect_fromRect_operation_fraction_respectFlipped_hints_(
+                rect, NSZeroRect, NSCompositeSourceOver, fraction, True, None
+            )
+
+
+def drawAtlasSlot(
+    atlas: ScrawlAtlas, slot: AtlasSlot, rect: Rect, fraction: float = 1.0
+) -> None:
+    # Draw a part of the shared bitmap of an atlas in a rect in font units.
+    # Image coordinates count from the bottom, atlas slots from the top.
+    rep = tileImageRep(atlas.image_cache, None, atlas.buffer)
+    rep.drawInRect_fromRect_operation_fraction_respectFlipped_hints_(
+        NSMakeRect(*rect),
+        NSMakeRect(
+            slot.x, atlas.height - slot.y - slot.height, slot.width, slot.height
+        ),
+        NSCompositeSourceOver,
+        fraction,
+        True,
+        None,
+    )
+
+
+def drawSmoothScrawl(
+    tiles: list[SmoothTile],
+    rect: Rect,
+    width: int,
+    height: int,
+    fraction: float = 1.0,
+) -> None:
+    # Draw the smooth rendering of tiles of a scrawl of `width` by `height`
+    # pixels, see scrawl.sdf, whose rect is in font units. It is interpolated,
+    # so it stays smooth when zoomed in further.
+    x, y, w, h = rect
+    pixel_width = w / width
+    pixel_height = h / height
+    NSGraphicsContext.saveGraphicsState()
+    NSGraphicsContext.currentContext().setImageInterpolation_(
+        NSImageInterpolationHigh
+    )
+    for tile in tiles:
+        tx, ty, tw, th = tile.rect
+        tile.image.drawInRect_fromRect_operation_fraction_(
+            NSMakeRect(
+                x + tx * pixel_width,
+                y + ty * pixel_height,
+                tw * pixel_width,
+                th * pixel_height
+            ),
+            NSZeroRect,
+            NSCompositeSourceOver,
+            fraction
+        )
+    NSGraphicsContext.restoreGraphicsState()
+
+
+def bufferFromImageRep(img: NSBitmapImageRep) -> ScrawlBuffer:
+    # Copy a decoded image of any pixel format into a new buffer by drawing it
+    buffer = ScrawlBuffer(img.pixelsWide(), img.pixelsHigh())
+    img.setProperty_withValue_(NSImageColorSyncProfileData, None)
+    current = NSGraphicsContext.currentContext()
+    context = NSGraphicsContext.graphicsContextWithBitmapImageRep_(
+        imageRepForBuffer(buffer)
+    )
+    NSGraphicsContext.saveGraphicsState()
+    NSGraphicsContext.setCurrentContext_(context)
+    img.drawInRect_(NSMakeRect(0, 0, buffer.width, buffer.height))
+    context.flushGraphics()
+    NSGraphicsContext.setCurrentContext_(current)
+    NSGraphicsContext.restoreGraphicsState()
+    return buffer
+
+
+def bufferFromData(data, patches=None) -> ScrawlBuffer:
+    # Decode the stored data of a layer, in the current or in a legacy format,
+    # and apply its stored patches, if any
+    if patches is not None:
+        return tilesFromData(data, patches).to_buffer()
+
+    if is_scrawl_data(data):
+        return decode(data)
+
+    img = NSBitmapImageRep.alloc().initWithData_(data)
+    if img is None:
+        raise ScrawlFormatError("Unknown image data format")
+
+    return bufferFromImageRep(img)
+
+
+def tilesFromData(data, patches=None) -> TiledBuffer:
+    # Like bufferFromData, but return a sparse canvas for editing
+    if is_scrawl_data(data):
+        canvas = decode_tiles(data)
+    else:
+        canvas = TiledBuffer.from_buffer(bufferFromData(data))
+    if patches is not None:
+        apply_patches(canvas, patches)
+    return canvas
+
+
+def drawOnionSkin(layer, fraction: float = ONION_SKIN_FRACTION) -> None:
+    # Draw the scrawls of the other masters of the layer's glyph, see
+    # scrawl.onion
+    skin = onion_skin(layer, bufferFromData, imageForBuffer)
+    if skin is None:
+        return
+
+    NSGraphicsContext.saveGraphicsState()
+    NSGraphicsContext.currentContext().setImageInterpolation_(
+        NSImageInterpolationNone
+    )
+    skin.image.drawInRect_fromRect_operation_fraction_(
+        NSMakeRect(*skin.rect), NSZeroRect, NSCompositeSourceOver, fraction
+    )
+    NSGraphicsContext.restoreGraphicsState()
@@ -0,0 +1,299 @@
+"""
+Atlas of the scrawls shown in an edit tab.
+
+In a long line of text, the reporter draws the scrawl of every layer on each
+redraw. Instead of one image per layer, the downsampled levels of all scrawls
+of a tab are packed into one shared bitmap, and each layer draws its part of
+it. A layer's slots are only written again when its stored data changes.
+
+Slots are packed on shelves: rows of slots of about the same height. Space
+of slots that were replaced is reclaimed by packing the remaining slots
+again when the atlas is full; if that doesn't make enough room, the least
+recently drawn scrawls are dropped.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Hashable, List, NamedTuple, Sequence, Tuple
+
+from scrawl.raster import ScrawlBuffer
+
+DEFAULT_ATLAS_WIDTH = 2048
+INITIAL_ATLAS_HEIGHT = 512
+MAX_ATLAS_HEIGHT = 8192
+# Clear pixels between slots, so they don't bleed into each other when drawn
+# scaled
+GUTTER = 1
+# Shelf heights are rounded up to this, so similar slots share a shelf
+SHELF_STEP = 8
+# Keep this many atlases, one per tab
+MAX_ATLASES = 4
+
+
+class AtlasSlot(NamedTuple):
+    # Position of the top left pixel in the atlas buffer, rows top down
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class AtlasEntry(NamedTuple):
+    digest: bytes
+    # Size of the full size level, like a buffer
+    width: int
+    height: int
+    # One slot per level, full size first
+    slots: List[AtlasSlot]
+
+
+class Shelf:
+    def __init__(self, y: int, height: int) -> None:
+        self.y = y
+        self.height = height
+        # Next free column
+        self.x = 0
+
+
+class ScrawlAtlas:
+    """
+    Packs the levels of scrawls, by layer key, into one buffer. The buffer
+    grows up to `max_height`; its `version` changes whenever pixels are
+    written.
+    """
+
+    def __init__(
+        self,
+        width: int = DEFAULT_ATLAS_WIDTH,
+        max_height: int = MAX_ATLAS_HEIGHT,
+    ) -> None:
+        self.max_height = max_height
+        self.buffer = ScrawlBuffer(width, min(INITIAL_ATLAS_HEIGHT, max_height))
+        # Cache for whatever the plugins need to display the buffer
+        self.image_cache: dict = {}
+        self._entries: OrderedDict[Hashable, AtlasEntry] = OrderedDict()
+        self._shelves: List[Shelf] = []
+        # Slots written, and how often the atlas was packed again
+        self.writes = 0
+        self.compactions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    @property
+    def width(self) -> int:
+        return self.buffer.width
+
+    @property
+    def height(self) -> int:
+        return self.buffer.height
+
+    def get(self, key: Hashable, digest: bytes) -> AtlasEntry | None:
+        """
+        Return the entry of `key` if it holds the levels decoded from data
+        with the hash `digest`.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.digest != digest:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self, key: Hashable, digest: bytes, levels: Sequence[ScrawlBuffer]
+    ) -> AtlasEntry | None:
+        """
+        Copy the levels of a scrawl into the atlas, replacing the previous
+        ones of `key`. Returns None if the scrawl is too large for the atlas.
+        """
+        self.invalidate(key)
+        sizes = [(level.width, level.height) for level in levels]
+        if not self._fits_empty(sizes):
+            return None
+
+        slots = self._place(sizes)
+        if slots is None:
+            self._make_room(sizes)
+            slots = self._place(sizes)
+            if slots is None:
+                return None
+
+        for slot, level in zip(slots, levels):
+            self.buffer.pixels[
+                slot.y:slot.y + slot.height, slot.x:slot.x + slot.width
+            ] = level.pixels
+        self.buffer.version += 1
+        self.writes += len(slots)
+        entry = AtlasEntry(digest, levels[0].width, levels[0].height, slots)
+        self._entries[key] = entry
+        return entry
+
+    def slot_buffer(self, slot: AtlasSlot) -> ScrawlBuffer:
+        # A copy of the pixels of a slot
+        return ScrawlBuffer(slot.width, slot.height, self.buffer.pixels[
+            slot.y:slot.y + slot.height, slot.x:slot.x + slot.width
+        ].copy())
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """
+        Drop the entry of `key`, or all entries if `key` is None. The space
+        is reclaimed when the atlas is packed again.
+        """
+        if key is None:
+            self._entries.clear()
+            self._shelves.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _fits_empty(self, sizes: Sequence[Tuple[int, int]]) -> bool:
+        width = max(w for w, _ in sizes) + GUTTER
+        height = sum(_shelf_height(h) for _, h in sizes)
+        return width <= self.width and height <= self.max_height
+
+    def _place(self, sizes: Sequence[Tuple[int, int]]) -> List[AtlasSlot] | None:
+        # Space taken by a failed placement is reclaimed on compaction
+        slots = []
+        for width, height in sizes:
+            slot = self._allocate(width, height)
+            if slot is None:
+                return None
+
+            slots.append(slot)
+        return slots
+
+    def _allocate(self, width: int, height: int) -> AtlasSlot | None:
+        shelf_height = _shelf_height(height)
+        for shelf in self._shelves:
+            if (
+                height + GUTTER <= shelf.height <= 2 * shelf_height
+                and shelf.x + width + GUTTER <= self.width
+            ):
+                break
+        else:
+            top = self._shelves[-1].y + self._shelves[-1].height \
+                if self._shelves else 0
+            if width + GUTTER > self.width or not self._reserve(
+                top + shelf_height
+            ):
+                return None
+
+            shelf = Shelf(top, shelf_height)
+            self._shelves.append(shelf)
+        slot = AtlasSlot(shelf.x, shelf.y, width, height)
+        shelf.x += width + GUTTER
+        return slot
+
+    def _reserve(self, height: int) -> bool:
+        # Grow the buffer to at least `height` rows, doubling its height
+        if height <= self.height:
+            return True
+
+        if height > self.max_height:
+            return False
+
+        new_height = self.height
+        while new_height < height:
+            new_height *= 2
+        new_height = min(new_height, self.max_height)
+        buffer = ScrawlBuffer(self.width, new_height)
+        # Slots are counted from the top, they stay in place
+        buffer.pixels[:self.height] = self.buffer.pixels
+        buffer.version = self.buffer.version + 1
+        self.buffer = buffer
+        return True
+
+    def _make_room(self, sizes: Sequence[Tuple[int, int]]) -> None:
+        # Drop the least recently drawn entries until the remaining ones and
+        # the new slots take at most half of the largest atlas, then pack
+        # what is left again
+        needed = sum(w * h for w, h in sizes)
+        used = sum(
+            slot.width * slot.height
+            for entry in self._entries.values()
+            for slot in entry.slots
+        )
+        budget = self.width * self.max_height // 2
+        while self._entries and used + needed > budget:
+            _, entry = self._entries.popitem(last=False)
+            used -= sum(slot.width * slot.height for slot in entry.slots)
+        self._compact()
+
+    def _compact(self) -> None:
+        self.compactions += 1
+        old = self.buffer
+        self.buffer = ScrawlBuffer(old.width, old.height)
+        self.buffer.version = old.version + 1
+        self._shelves = []
+        # Tall slots first pack best; the order of the entries is kept
+        placements = sorted(
+            (
+                (slot.height, key, i)
+                for key, entry in self._entries.items()
+                for i, slot in enumerate(entry.slots)
+            ),
+            key=lambda placement: -placement[0],
+        )
+        new_slots = {key: list(entry.slots) for key, entry in self._entries.items()}
+        for _, key, i in placements:
+            slot = new_slots[key][i]
+            new_slot = self._allocate(slot.width, slot.height)
+            if new_slot is None:
+                # Can't happen unless the atlas was nearly full
+                del self._entries[key]
+                continue
+
+            self.buffer.pixels[
+                new_slot.y:new_slot.y + slot.height,
+                new_slot.x:new_slot.x + slot.width,
+            ] = old.pixels[
+                slot.y:slot.y + slot.height, slot.x:slot.x + slot.width
+            ]
+            new_slots[key][i] = new_slot
+        for key, entry in self._entries.items():
+            self._entries[key] = entry._replace(slots=new_slots[key])
+
+
+def _shelf_height(height: int) -> int:
+    height += GUTTER
+    return -(-height // SHELF_STEP) * SHELF_STEP
+
+
+class AtlasRegistry:
+    """
+    The atlases of the most recently drawn tabs.
+    """
+
+    def __init__(self, max_atlases: int = MAX_ATLASES) -> None:
+        self.max_atlases = max_atlases
+        self._atlases: OrderedDict[Hashable, ScrawlAtlas] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._atlases)
+
+    def get(self, key: Hashable) -> ScrawlAtlas:
+        atlas = self._atlases.get(key)
+        if atlas is None:
+            atlas = ScrawlAtlas()
+            self._atlases[key] = atlas
+            while len(self._atlases) > self.max_atlases:
+                self._atlases.popitem(last=False)
+        else:
+            self._atlases.move_to_end(key)
+        return atlas
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        # Drop the entry of a layer key in all atlases, or all atlases
+        if key is None:
+            self._atlases.clear()
+            return
+
+        for atlas in self._atlases.values():
+            atlas.invalidate(key)
+
+
+tab_atlases = AtlasRegistry()
@@ -0,0 +1,287 @@
+"""
+Benchmark the storage formats with synthetic scrawls, without Glyphs.
+
+    python3 -m scrawl.benchmark --json results.json
+
+Like the "Make Random Data" script, scrawls are generated at random, but with
+a fixed seed, in several densities, for several layer widths, pixel sizes and
+pen ratios. Each scrawl is encoded and decoded in every format the plugin can
+store or read, and the best time of a few runs, the size of the data and the
+peak memory used are reported. With --json, the results are also written in a
+form that can be compared between versions.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tracemalloc
+
+from itertools import product
+from random import Random
+from shutil import rmtree
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+from scrawl.blobstore import BlobStore
+from scrawl.codec import ENCODING_RAW, decode, decode_tiles, encode
+from scrawl.model import DEFAULT_PEN_SIZE, new_canvas
+from scrawl.png import read_png, write_png
+from scrawl.raster import pen_radii
+from scrawl.tiles import TiledBuffer
+
+UPM = 1000
+LAYER_WIDTHS = (500, 1200)
+PIXEL_SIZES = (1, 2, 4)
+PEN_RATIOS = (1.0, 1.5)
+# Number of dots or strokes, and pen size in font units
+DENSITIES = {
+    "dots": (2000, None),
+    "sketch": (40, 4 * DEFAULT_PEN_SIZE),
+    "dense": (400, 10 * DEFAULT_PEN_SIZE),
+}
+DEFAULT_REPEAT = 3
+
+
+class BenchmarkCase(NamedTuple):
+    density: str
+    layer_width: int
+    pixel_size: int
+    pen_ratio: float
+
+    @property
+    def name(self) -> str:
+        return (
+            f"{self.density}-w{self.layer_width}-px{self.pixel_size}"
+            f"-r{self.pen_ratio:g}"
+        )
+
+
+def make_scrawl(case: BenchmarkCase, seed: int = 0) -> TiledBuffer:
+    """
+    Draw a random scrawl on a canvas the size the tool would use for a layer
+    of the case's width.
+    """
+    rnd = Random(f"{case.name}-{seed}")
+    # The default rect, see model.default_rect
+    canvas = new_canvas(
+        (0, 0, UPM + case.layer_width, round(UPM * 1.4)),
+        case.pixel_size,
+        case.pen_ratio,
+    )
+    count, pen_size = DENSITIES[case.density]
+    if pen_size is None:
+        # Single pixels, like the points of "Make Random Data"
+        for _ in range(count):
+            canvas.stamp(
+                rnd.randrange(canvas.width) + 0.5,
+                rnd.randrange(canvas.height) + 0.5,
+                0.5,
+            )
+        return canvas
+
+    rx, ry = pen_radii(pen_size, case.pixel_size, case.pen_ratio, case.pen_ratio)
+    for _ in range(count):
+        # A random walk that changes direction gradually
+        x = rnd.uniform(0, canvas.width)
+        y = rnd.uniform(0, canvas.height)
+        dx, dy = rnd.uniform(-1, 1), rnd.uniform(-1, 1)
+        # Steps of 40 font units
+        step = 40 / case.pixel_size
+        points = [(x, y)]
+        for _ in range(rnd.randint(10, 60)):
+            dx += rnd.uniform(-0.3, 0.3)
+            dy += rnd.uniform(-0.3, 0.3)
+            x = min(max(x + dx * step, 0), canvas.width - 1)
+            y = min(max(y + dy * step, 0), canvas.height - 1)
+            points.append((x, y))
+        canvas.polyline(points, rx, ry)
+    return canvas
+
+
+class StorageFormat(NamedTuple):
+    name: str
+    # Turns the tiled canvas into what `encode` takes; not measured
+    prepare: Callable[[TiledBuffer], Any]
+    encode: Callable[[Any], Any]
+    decode: Callable[[Any], Any]
+    # The size of what `encode` returns
+    size: Callable[[Any], int] = len
+    # Called before each call of `encode`; not measured
+    reset: Callable[[], None] | None = None
+
+
+def storage_formats(store: BlobStore) -> List[StorageFormat]:
+    def dense(canvas: TiledBuffer):
+        return canvas.to_buffer()
+
+    def tiled(canvas: TiledBuffer):
+        return canvas
+
+    def read_sidecar(digest: bytes) -> TiledBuffer:
+        with store.get(digest) as data:
+            return decode_tiles(data)
+
+    def clear_sidecar() -> None:
+        # The store doesn't write data it has already
+        rmtree(store.root, ignore_errors=True)
+
+    return [
+        # The current format
+        StorageFormat("scrawl-tiled", tiled, encode, decode_tiles),
+        StorageFormat(
+            "scrawl-tiled-raw",
+            tiled,
+            lambda canvas: encode(canvas, ENCODING_RAW),
+            decode_tiles,
+        ),
+        StorageFormat("scrawl-dense", dense, encode, decode),
+        # What older versions stored
+        StorageFormat("png", dense, write_png, read_png),
+        # The current format in the sidecar folder, read through a memory map
+        StorageFormat(
+            "scrawl-sidecar",
+            tiled,
+            lambda canvas: store.put(encode(canvas)),
+            read_sidecar,
+            store.size,
+            clear_sidecar,
+        ),
+    ]
+
+
+def measure(
+    function: Callable[[Any], Any],
+    arg,
+    repeat: int,
+    reset: Callable[[], None] | None = None,
+) -> Tuple[Any, float, int]:
+    """
+    Call `function(arg)` `repeat` times, each time after `reset()` if given.
+    Returns the last result, the best time in seconds and the peak memory
+    allocated during a call in bytes.
+    """
+    best = None
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        start = perf_counter()
+        result = function(arg)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # Memory is measured separately, tracing slows the calls down
+    if reset is not None:
+        reset()
+    tracemalloc.start()
+    try:
+        function(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def run_benchmark(
+    cases: Sequence[BenchmarkCase],
+    repeat: int = DEFAULT_REPEAT,
+    formats: Sequence[str] | None = None,
+) -> List[Dict[str, Any]]:
+    results = []
+    with TemporaryDirectory() as folder:
+        store = BlobStore(folder)
+        for case in cases:
+            canvas = make_scrawl(case)
+            for fmt in storage_formats(store):
+                if formats is not None and fmt.name not in formats:
+                    continue
+
+                prepared = fmt.prepare(canvas)
+                data, encode_time, encode_peak = measure(
+                    fmt.encode, prepared, repeat, fmt.reset
+                )
+                _, decode_time, decode_peak = measure(fmt.decode, data, repeat)
+                results.append({
+                    "case": case.name,
+                    "density": case.density,
+                    "layerWidth": case.layer_width,
+                    "pixelSize": case.pixel_size,
+                    "penRatio": case.pen_ratio,
+                    "width": canvas.width,
+                    "height": canvas.height,
+                    "format": fmt.name,
+                    "size": fmt.size(data),
+                    "encodeTime": encode_time,
+                    "decodeTime": decode_time,
+                    "encodePeak": encode_peak,
+                    "decodePeak": decode_peak,
+                })
+    return results
+
+
+def format_benchmark_report(results: Sequence[Dict[str, Any]]) -> str:
+    lines = [
+        f"{'Case':<24} {'Format':<16} {'Size':>9} {'Enc ms':>8} {'Dec ms':>8} "
+        f"{'Enc peak':>9} {'Dec peak':>9}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result['case']:<24} {result['format']:<16} {result['size']:>9} "
+            f"{result['encodeTime'] * 1000:>8.2f} "
+            f"{result['decodeTime'] * 1000:>8.2f} "
+            f"{result['encodePeak'] // 1024:>7} k {result['decodePeak'] // 1024:>7} k"
+        )
+    return "\n".join(lines)
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Scrawl storage formats with synthetic "
+        "scrawls."
+    )
+    parser.add_argument(
+        "--density", nargs="+", choices=list(DENSITIES), default=list(DENSITIES)
+    )
+    parser.add_argument(
+        "--layer-width", nargs="+", type=int, default=list(LAYER_WIDTHS)
+    )
+    parser.add_argument(
+        "--pixel-size", nargs="+", type=int, default=list(PIXEL_SIZES)
+    )
+    parser.add_argument(
+        "--pen-ratio", nargs="+", type=float, default=list(PEN_RATIOS)
+    )
+    parser.add_argument(
+        "--format",
+        nargs="+",
+        help="Only benchmark these formats (default: all)",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help=f"Best of this many runs (default: {DEFAULT_REPEAT})",
+    )
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    options = parser.parse_args(args)
+    cases = [
+        BenchmarkCase(*values)
+        for values in product(
+            options.density,
+            options.layer_width,
+            options.pixel_size,
+            options.pen_ratio,
+        )
+    ]
+    results = run_benchmark(cases, options.repeat, options.format)
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(format_benchmark_report(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Content-addressed storage of scrawl data in a folder next to the font.
+
+Complex scrawls make the .glyphs file large and may not fit into the userData
+of a layer. In sidecar mode, the data of a scrawl is written to a file named
+after its hash, and the layer only keeps the hash. Identical data is stored
+once. Files are never changed after they were written, so they can be read
+through memory maps, and files no layer refers to any more can be collected.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+
+from os.path import dirname, exists, getsize, isdir, join, splitext
+from tempfile import mkstemp
+from typing import Iterable, NamedTuple, Tuple
+
+from scrawl.cache import blob_hash
+
+SIDECAR_SUFFIX = ".scrawldata"
+
+
+class BlobReference(NamedTuple):
+    # Stands in for the data of a scrawl that was written to a sidecar folder
+    digest: bytes
+
+
+def sidecar_path(font_path: str) -> str:
+    # Font.glyphs -> Font.scrawldata
+    return splitext(font_path.rstrip("/"))[0] + SIDECAR_SUFFIX
+
+
+class BlobStore:
+    """
+    Files in the folder `root`, named after the hash of their contents. The
+    first two hex digits of the hash are used as a subfolder.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    @classmethod
+    def for_font_path(cls, font_path: str) -> BlobStore:
+        return cls(sidecar_path(font_path))
+
+    def path(self, digest: bytes) -> str:
+        name = digest.hex()
+        return join(self.root, name[:2], name[2:])
+
+    def __contains__(self, digest: bytes) -> bool:
+        return exists(self.path(digest))
+
+    def put(self, data) -> bytes:
+        """
+        Store data, unless the same data is stored already. Returns its hash.
+        May be called from any thread.
+        """
+        digest = blob_hash(data)
+        path = self.path(digest)
+        if exists(path):
+            return digest
+
+        folder = dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        # Write to a temporary file first, so that a file with the name of the
+        # hash is always complete
+        fd, tmp_path = mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest: bytes) -> mmap.mmap:
+        """
+        Return a read-only memory map of the stored data. Raises OSError if
+        there is no file for `digest`.
+        """
+        with open(self.path(digest), "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def size(self, digest: bytes) -> int:
+        return getsize(self.path(digest))
+
+    def collect_garbage(self, referenced: Iterable[bytes]) -> Tuple[int, int]:
+        """
+        Remove the files whose hash is not in `referenced`, and temporary files
+        left over by interrupted writes. Must not run while data is being
+        stored. Returns the number of files removed and their total size.
+        """
+        keep = set(referenced)
+        count = size = 0
+        if not isdir(self.root):
+            return count, size
+
+        for prefix in os.listdir(self.root):
+            folder = join(self.root, prefix)
+            if not isdir(folder):
+                continue
+
+            for name in os.listdir(folder):
+                try:
+                    orphaned = bytes.fromhex(prefix + name) not in keep
+                except ValueError:
+                    orphaned = name.endswith(".tmp")
+                if orphaned:
+                    path = join(folder, name)
+                    size += getsize(path)
+                    os.remove(path)
+                    count += 1
+            if not os.listdir(folder):
+                os.rmdir(folder)
+        return count, size
@@ -0,0 +1,169 @@
+"""
+Process-wide cache of decoded scrawl images.
+
+The reporter draws the scrawl of every visible layer on each redraw. Decoding
+the stored image data each time is wasteful, so decoded images are kept here,
+keyed by layer and by a hash of the data they were decoded from. The hashes
+of immutable data are cached by the identity of the data. The cache is
+shared by the tool and the reporter, so the tool can drop the entry of a layer
+after it has saved a new scrawl.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Callable, Hashable, List, NamedTuple, Tuple
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Remember the hashes of this much data, see DigestCache
+DIGEST_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def blob_hash(data) -> bytes:
+    # data may be bytes or anything else supporting the buffer protocol, e.g.
+    # the NSData from a layer's userData
+    return blake2b(data, digest_size=16).digest()
+
+
+def is_immutable(data) -> bool:
+    # Only such data can be recognised again by its identity. A mutable
+    # NSData may be an instance of a class cluster that NSData and
+    # NSMutableData share, but copying immutable NSData returns itself.
+    if type(data) is bytes:
+        return True
+    return hasattr(data, "isKindOfClass_") and data.copy() is data
+
+
+def layer_key(layer) -> Hashable:
+    # layerId alone is not unique, layers of all glyphs in a master share it
+    glyph = layer.parent
+    return (None if glyph is None else glyph.id, layer.layerId)
+
+
+class CacheEntry(NamedTuple):
+    digest: bytes
+    value: Any
+    size: int
+
+
+class DecodedImageCache:
+    """
+    LRU cache holding at most one decoded image per layer, limited to a total
+    of `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def keys(self) -> List[Hashable]:
+        return list(self._entries)
+
+    def has(self, key: Hashable, digest: bytes) -> bool:
+        # Like get, but without counting or changing the order
+        entry = self._entries.get(key)
+        return entry is not None and entry.digest == digest
+
+    def get(self, key: Hashable, digest: bytes) -> Any | None:
+        """
+        Return the image decoded for `key` from data with the hash `digest`,
+        or None if there is none.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.digest != digest:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def put(self, key: Hashable, digest: bytes, value: Any, size: int) -> None:
+        """
+        Store the image `value` with an approximate memory use of `size` bytes,
+        replacing any previous image of the layer.
+        """
+        self.invalidate(key)
+        if size > self.max_bytes:
+            # Would evict everything else and still not fit
+            return
+
+        self._entries[key] = CacheEntry(digest, value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """
+        Drop the image of the layer `key`, or all images if `key` is None.
+        """
+        if key is None:
+            self._entries.clear()
+            self.size = 0
+            return
+
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+
+class DigestCache:
+    """
+    Hashes of immutable data objects by their identity, so that data that is
+    read from the userData on every redraw is only hashed once. The objects
+    are kept, so that their ids are not reused while they are cached.
+    Mutable data, e.g. a bytearray or NSMutableData, is hashed every time.
+    """
+
+    def __init__(self, max_bytes: int = DIGEST_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[Hashable, Tuple[Any, int, bytes]] = \
+            OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        data,
+        digest: Callable[[Any], bytes] = blob_hash,
+        salt: bytes = b"",
+    ) -> bytes:
+        """
+        Return `digest(data)`, which depends only on `data` and `salt`.
+        """
+        if not is_immutable(data):
+            return digest(data)
+
+        key = (id(data), salt)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is data:
+            self._entries.move_to_end(key)
+            return entry[2]
+
+        size = len(data)
+        value = digest(data)
+        if entry is not None:
+            self.size -= entry[1]
+        self._entries[key] = (data, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted[1]
+        return value
+
+
+decoded_images = DecodedImageCache()
+data_digests = DigestCache()
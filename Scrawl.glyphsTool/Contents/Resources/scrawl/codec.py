@@ -0,0 +1,218 @@
+"""
+Compact binary storage format for scrawls.
+
+A scrawl is a black and white drawing, so it is stored with one bit per pixel
+instead of as an 8-bit gray+alpha PNG. Layout of the data (big endian):
+
+    4 bytes  magic "SCRW"
+    1 byte   format version, see VERSION_*
+    1 byte   encoding of the pixel data, see ENCODING_*
+    4 bytes  width of the canvas in pixels
+    4 bytes  height of the canvas in pixels
+    ...      pixel data
+
+Pixels are packed into rows, top row first, with 8 pixels in each byte (most
+significant bit first, rows padded to full bytes). A set bit is ink, a cleared
+bit is transparent. Long runs of empty bytes are cheap to compress, so the
+pixel data are usually stored deflated.
+
+In version 1, the pixel data are the packed rows of the whole canvas.
+
+In version 2, the canvas is split into square tiles, and only tiles that
+contain ink are stored:
+
+    2 bytes  tile size in pixels
+    4 bytes  number of tiles
+    then for each tile:
+    2 bytes  horizontal tile index (signed)
+    2 bytes  vertical tile index (signed), counted from the bottom
+    ...      packed rows of the tile
+
+Older versions of the plugin stored PNG (or TIFF) data; use `blob_format` to
+find out which kind of data a layer holds.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import zlib
+
+from struct import Struct, error as StructError
+
+from scrawl.raster import INK, ScrawlBuffer
+from scrawl.tiles import TiledBuffer
+
+MAGIC = b"SCRW"
+VERSION_DENSE = 1
+VERSION_TILED = 2
+VERSION = VERSION_TILED
+
+ENCODING_RAW = 0
+ENCODING_ZLIB = 1
+
+HEADER = Struct(">4sBBII")
+TILES_HEADER = Struct(">HI")
+TILE_HEADER = Struct(">hh")
+
+
+class ScrawlFormatError(ValueError):
+    pass
+
+
+def blob_format(data) -> str | None:
+    """
+    Return "scrawl", "png" or "tiff" for the stored data of a layer, or None if
+    the format is unknown.
+    """
+    head = memoryview(data)[:4].tobytes()
+    if head == MAGIC:
+        return "scrawl"
+    if head == b"\x89PNG":
+        return "png"
+    if head in (b"MM\x00*", b"II*\x00"):
+        return "tiff"
+    return None
+
+
+def is_scrawl_data(data) -> bool:
+    return blob_format(data) == "scrawl"
+
+
+def pack(buffer: ScrawlBuffer) -> bytes:
+    return np.packbits(buffer.ink_mask(), axis=1).tobytes()
+
+
+def unpack(packed, width: int, height: int) -> ScrawlBuffer:
+    row_bytes = (width + 7) // 8
+    mask = np.unpackbits(
+        np.frombuffer(packed, dtype=np.uint8).reshape((height, row_bytes)),
+        axis=1,
+        count=width,
+    ).astype(bool)
+    buffer = ScrawlBuffer(width, height)
+    buffer.pixels[mask] = INK
+    return buffer
+
+
+def encode(
+    canvas: ScrawlBuffer | TiledBuffer,
+    encoding: int = ENCODING_ZLIB,
+    keep_empty: bool = False,
+) -> bytes:
+    """
+    Encode a dense buffer in the version 1 layout, or a tiled buffer in the
+    version 2 layout. Tiles without ink are left out, unless `keep_empty` is
+    set.
+    """
+    if isinstance(canvas, TiledBuffer):
+        version = VERSION_TILED
+        tiles = [
+            TILE_HEADER.pack(tx, ty) + pack(tile)
+            for (tx, ty), tile in sorted(canvas)
+            if keep_empty or tile.has_ink()
+        ]
+        payload = TILES_HEADER.pack(canvas.tile_size, len(tiles)) + b"".join(
+            tiles
+        )
+    else:
+        version = VERSION_DENSE
+        payload = pack(canvas)
+
+    if encoding == ENCODING_ZLIB:
+        payload = zlib.compress(payload, 9)
+    elif encoding != ENCODING_RAW:
+        raise ScrawlFormatError(f"Unknown encoding: {encoding}")
+
+    return HEADER.pack(
+        MAGIC, version, encoding, canvas.width, canvas.height
+    ) + payload
+
+
+def decode_header(data) -> tuple[int, int, int, int]:
+    """
+    Return the version, encoding, width and height from the header of scrawl
+    data.
+    """
+    data = memoryview(data)
+    if len(data) < HEADER.size:
+        raise ScrawlFormatError("Scrawl data is truncated")
+
+    magic, version, encoding, width, height = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ScrawlFormatError("Not scrawl data")
+
+    if version > VERSION:
+        raise ScrawlFormatError(
+            f"Scrawl data version {version} is not supported, please update "
+            "the Scrawl plugins"
+        )
+    return version, encoding, width, height
+
+
+def _payload(data) -> tuple[int, int, int, bytes]:
+    data = memoryview(data)
+    version, encoding, width, height = decode_header(data)
+    payload = data[HEADER.size:]
+    if encoding == ENCODING_ZLIB:
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as e:
+            raise ScrawlFormatError(f"Scrawl data is corrupt: {e}")
+
+    elif encoding != ENCODING_RAW:
+        raise ScrawlFormatError(f"Unknown encoding: {encoding}")
+
+    return version, width, height, bytes(payload)
+
+
+def _unpack_dense(payload: bytes, width: int, height: int) -> ScrawlBuffer:
+    if len(payload) != (width + 7) // 8 * height:
+        raise ScrawlFormatError("Scrawl data does not match the image size")
+
+    return unpack(payload, width, height)
+
+
+def _unpack_tiles(payload: bytes, width: int, height: int) -> TiledBuffer:
+    try:
+        tile_size, count = TILES_HEADER.unpack_from(payload)
+    except StructError:
+        raise ScrawlFormatError("Scrawl data is truncated")
+
+    canvas = TiledBuffer(width, height, tile_size)
+    tile_bytes = (tile_size + 7) // 8 * tile_size
+    if len(payload) != TILES_HEADER.size + count * (
+        TILE_HEADER.size + tile_bytes
+    ):
+        raise ScrawlFormatError("Scrawl data does not match the tile count")
+
+    offset = TILES_HEADER.size
+    for _ in range(count):
+        tx, ty = TILE_HEADER.unpack_from(payload, offset)
+        offset += TILE_HEADER.size
+        canvas.tiles[tx, ty] = unpack(
+            payload[offset:offset + tile_bytes], tile_size, tile_size
+        )
+        offset += tile_bytes
+    return canvas
+
+
+def decode(data) -> ScrawlBuffer:
+    """
+    Decode scrawl data of any version into a dense buffer.
+    """
+    version, width, height, payload = _payload(data)
+    if version == VERSION_DENSE:
+        return _unpack_dense(payload, width, height)
+
+    return _unpack_tiles(payload, width, height).to_buffer()
+
+
+def decode_tiles(data) -> TiledBuffer:
+    """
+    Decode scrawl data of any version into a tiled buffer.
+    """
+    version, width, height, payload = _payload(data)
+    if version == VERSION_DENSE:
+        return TiledBuffer.from_buffer(_unpack_dense(payload, width, height))
+
+    return _unpack_tiles(payload, width, height)
@@ -0,0 +1,215 @@
+"""
+Export the scrawls of a .glyphs file to PNG images, without Glyphs.
+
+    python3 -m scrawl.export Font.glyphs -o Font-scrawls
+
+Each image is named after its glyph, layer and a hash of the scrawl data. An
+image that already exists is not written again, so re-running the export after
+a change only converts the scrawls that have changed. A file "scrawls.json"
+lists the placement of each image in font units, and the font it belongs to.
+Images of scrawls that no longer exist are removed from the output folder, but
+only those the previous export of the same font listed there. Several fonts
+can be exported to the same folder.
+
+Scrawls stored in the sidecar folder of the font are read from there.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from os.path import basename, exists, join, splitext
+from typing import List, Tuple
+
+from scrawl.blobstore import BlobStore
+from scrawl.cache import blob_hash
+from scrawl.glyphsfile import ScrawlRecord, iter_scrawls
+from scrawl.legacy import buffer_from_data
+from scrawl.patches import patched_digest
+from scrawl.png import write_png
+
+MANIFEST = "scrawls.json"
+# Names of the images written by image_name
+IMAGE_NAME = re.compile(r"[\w.-]+\.[0-9a-f]{16}\.png")
+
+
+def image_name(record: ScrawlRecord, digest: str) -> str:
+    name = f"{record.glyph}-{record.layer_id}"
+    return re.sub(r"[^\w.-]", "_", name) + f".{digest[:16]}.png"
+
+
+def font_name(font_path: str) -> str:
+    return basename(font_path.rstrip("/"))
+
+
+def read_manifest(output_dir: str) -> List[dict]:
+    # The entries of the previous export, if any
+    try:
+        with open(join(output_dir, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    if not isinstance(manifest, list):
+        return []
+
+    return [entry for entry in manifest if isinstance(entry, dict)]
+
+
+def split_manifest(
+    previous: List[dict], font: str, manifest: List[dict]
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Split the entries of the previous export into those of the font that was
+    exported now, and those of other fonts. Entries written before the font
+    was recorded belong to the font if one of its layers has the same image
+    or glyph and layer.
+    """
+    images = {entry["image"] for entry in manifest}
+    layers = {(entry["glyph"], entry["layerId"]) for entry in manifest}
+    own, others = [], []
+    for entry in previous:
+        if "font" in entry:
+            mine = entry["font"] == font
+        else:
+            mine = entry.get("image") in images or (
+                entry.get("glyph"), entry.get("layerId")
+            ) in layers
+        (own if mine else others).append(entry)
+    return own, others
+
+
+def export_image(data: bytes, path: str, patches: bytes | None = None) -> int:
+    # Runs in a worker process. Write to a temporary file first, so that an
+    # interrupted export doesn't leave a broken image that would be skipped
+    png = write_png(buffer_from_data(data, patches))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    return len(png)
+
+
+def export_scrawls(
+    font_path: str, output_dir: str, jobs: int | None = None
+) -> Tuple[int, int, List[str]]:
+    """
+    Export all scrawls of the font. Returns the number of images written, the
+    number of unchanged images skipped, and a list of errors.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    font = font_name(font_path)
+    previous = read_manifest(output_dir)
+    manifest = []
+    pending: List[Tuple[ScrawlRecord, Future]] = []
+    skipped = 0
+    errors = []
+    store = BlobStore.for_font_path(font_path)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for record in iter_scrawls(font_path):
+            data = record.data
+            if data is not None:
+                digest = blob_hash(data)
+            elif record.blob is not None:
+                digest = record.blob
+            else:
+                continue
+
+            if record.patches is not None:
+                digest = patched_digest(digest, record.patches)
+            name = image_name(record, digest.hex())
+            manifest.append({
+                "font": font,
+                "glyph": record.glyph,
+                "layerId": record.layer_id,
+                "image": name,
+                "rect": record.rect,
+                "unit": record.unit,
+            })
+            path = join(output_dir, name)
+            if exists(path):
+                skipped += 1
+                continue
+
+            if data is None:
+                try:
+                    data = bytes(store.get(record.blob))
+                except OSError as e:
+                    errors.append(f"{record.glyph} {record.layer_id}: {e}")
+                    continue
+
+            pending.append((record, executor.submit(
+                export_image, data, path, record.patches
+            )))
+
+        written = 0
+        for record, future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(f"{record.glyph} {record.layer_id}: {e}")
+            else:
+                written += 1
+
+    # Remove the images of this font's scrawls that have changed or were
+    # deleted. Anything else in the folder is left alone.
+    own, others = split_manifest(previous, font, manifest)
+    keep = {entry["image"] for entry in manifest + others}
+    for entry in own:
+        name = entry.get("image")
+        if not isinstance(name, str) or name in keep \
+                or not IMAGE_NAME.fullmatch(name):
+            continue
+
+        try:
+            os.remove(join(output_dir, name))
+        except FileNotFoundError:
+            pass
+
+    with open(join(output_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(others + manifest, f, indent=2)
+
+    return written, skipped, errors
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Export the scrawls of a Glyphs file to PNG images."
+    )
+    parser.add_argument("font", help="A .glyphs file or .glyphspackage")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Output folder (default: next to the font, named after it)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    options = parser.parse_args(args)
+    output_dir = options.output
+    if output_dir is None:
+        output_dir = splitext(options.font.rstrip("/"))[0] + "-scrawls"
+
+    written, skipped, errors = export_scrawls(
+        options.font, output_dir, options.jobs
+    )
+    for error in errors:
+        print(f"Error: {error}", file=sys.stderr)
+    print(
+        f"{basename(options.font)}: {written} written, {skipped} unchanged, "
+        f"{len(errors)} failed"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
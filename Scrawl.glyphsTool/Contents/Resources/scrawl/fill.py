@@ -0,0 +1,49 @@
+"""
+Scanline flood fill on boolean masks.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def flood_fill(fillable: np.ndarray, x: int, y: int) -> np.ndarray:
+    """
+    Return a boolean mask of the pixels of `fillable` that are connected to
+    (x, y), horizontally or vertically, and True in `fillable`. Both masks are
+    indexed [y, x].
+
+    Each span of a row is filled in one go. Only one seed per run of fillable
+    pixels is pushed for the rows above and below a span, so the number of
+    Python operations grows with the number of spans, not of pixels.
+    """
+    height, width = fillable.shape
+    filled = np.zeros_like(fillable, dtype=bool)
+    if not (0 <= x < width and 0 <= y < height) or not fillable[y, x]:
+        return filled
+
+    seeds = [(x, y)]
+    while seeds:
+        x, y = seeds.pop()
+        if filled[y, x]:
+            continue
+
+        # Extend the span to the nearest barrier on each side
+        row = fillable[y]
+        blocked = np.flatnonzero(~row[:x])
+        left = blocked[-1] + 1 if len(blocked) else 0
+        blocked = np.flatnonzero(~row[x:])
+        right = x + blocked[0] if len(blocked) else width
+        filled[y, left:right] = True
+
+        for ny in (y - 1, y + 1):
+            if not 0 <= ny < height:
+                continue
+
+            open_ = fillable[ny, left:right] & ~filled[ny, left:right]
+            # The first pixel of each run
+            starts = np.flatnonzero(open_[1:] & ~open_[:-1]) + 1
+            if open_[0]:
+                seeds.append((left, ny))
+            seeds.extend((left + int(s), ny) for s in starts)
+    return filled
@@ -0,0 +1,56 @@
+"""
+Rectangle helpers for mapping between scrawl pixels and font units.
+
+Rects are (x, y, width, height) tuples, like the rect stored in the userData.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+from scrawl.raster import Bounds
+
+Rect = Tuple[float, float, float, float]
+
+
+def bounds_to_rect(
+    bounds: Bounds,
+    origin: tuple[float, float],
+    pixel_size: float,
+    pixel_ratio: float = 1,
+) -> Rect:
+    """
+    Convert pixel bounds (xmin, ymin, xmax, ymax) of a scrawl canvas whose
+    lower left corner is at `origin` to a rect in font units.
+    """
+    xmin, ymin, xmax, ymax = bounds
+    pixel_height = pixel_size * pixel_ratio
+    return (
+        origin[0] + xmin * pixel_size,
+        origin[1] + ymin * pixel_height,
+        (xmax - xmin) * pixel_size,
+        (ymax - ymin) * pixel_height,
+    )
+
+
+def union_rect(a: Rect | None, b: Rect | None) -> Rect | None:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    x = min(a[0], b[0])
+    y = min(a[1], b[1])
+    return (
+        x,
+        y,
+        max(a[0] + a[2], b[0] + b[2]) - x,
+        max(a[1] + a[3], b[1] + b[3]) - y,
+    )
+
+
+def inset_rect(rect: Rect, dx: float, dy: float | None = None) -> Rect:
+    # Negative values make the rect larger
+    if dy is None:
+        dy = dx
+    x, y, w, h = rect
+    return x + dx, y + dy, w - 2 * dx, h - 2 * dy
@@ -0,0 +1,149 @@
+"""
+Streaming extraction of scrawl data from .glyphs files.
+
+The font is read line by line, and only the values of the scrawl userData keys
+are parsed. Everything else is skipped, so this is much faster and needs much
+less memory than loading the whole font with a plist parser.
+
+This relies on the way Glyphs writes its files: one key per line, and the keys
+of a dict in alphabetical order, so that the `layerId` of a layer comes before
+its `userData`.
+"""
+
+from __future__ import annotations
+
+from glob import glob
+from os.path import isdir, join
+from typing import Any, Dict, Iterable, Iterator, NamedTuple
+
+from scrawl.model import PLUGIN_ID
+
+SCRAWL_PREFIX = f"{PLUGIN_ID}."
+
+
+class ScrawlRecord(NamedTuple):
+    glyph: str | None
+    layer_id: str | None
+    # The scrawl userData of the layer, without the key prefix
+    entries: Dict[str, Any]
+
+    @property
+    def data(self) -> bytes | None:
+        return self.entries.get("data")
+
+    @property
+    def blob(self) -> bytes | None:
+        # Hash of the data in the sidecar folder
+        return self.entries.get("blob")
+
+    @property
+    def patches(self) -> bytes | None:
+        # Tiles changed since the data was saved, see scrawl.patches
+        return self.entries.get("patches")
+
+    @property
+    def rect(self) -> tuple | None:
+        return self.entries.get("rect")
+
+    @property
+    def size(self) -> int | None:
+        return self.entries.get("size")
+
+    @property
+    def unit(self) -> int | None:
+        return self.entries.get("unit")
+
+
+def iter_scrawls(path: str) -> Iterator[ScrawlRecord]:
+    """
+    Yield a record for each layer with scrawl data in the .glyphs file or
+    .glyphspackage at `path`.
+    """
+    if isdir(path):
+        for glyph_path in sorted(glob(join(path, "glyphs", "*.glyph"))):
+            with open(glyph_path, encoding="utf-8") as f:
+                yield from scan(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from scan(f)
+
+
+def scan(lines: Iterable[str]) -> Iterator[ScrawlRecord]:
+    glyph = layer_id = None
+    entries: Dict[str, Any] = {}
+    pending_key = None
+    pending: list[str] = []
+    for line in lines:
+        if pending_key is not None:
+            # Continuation of a multi-line value
+            pending.append(line.strip())
+            if line.rstrip().endswith(";"):
+                entries[pending_key] = parse_value(" ".join(pending))
+                pending_key = None
+            continue
+
+        stripped = line.lstrip()
+        if stripped.startswith("glyphname ="):
+            if entries:
+                yield ScrawlRecord(glyph, layer_id, entries)
+                entries = {}
+            glyph = parse_value(stripped.split("=", 1)[1])
+            layer_id = None
+        elif stripped.startswith("layerId ="):
+            if entries:
+                yield ScrawlRecord(glyph, layer_id, entries)
+                entries = {}
+            layer_id = parse_value(stripped.split("=", 1)[1])
+        elif stripped.startswith(SCRAWL_PREFIX) or stripped.startswith(
+            '"' + SCRAWL_PREFIX
+        ):
+            key, value = stripped.split("=", 1)
+            key = key.strip().strip('"')[len(SCRAWL_PREFIX):]
+            if value.rstrip().endswith(";"):
+                entries[key] = parse_value(value)
+            else:
+                pending_key = key
+                pending = [value.strip()]
+    if entries:
+        yield ScrawlRecord(glyph, layer_id, entries)
+
+
+def parse_value(text: str) -> Any:
+    """
+    Parse a scalar, data or a flat array from the OpenStep plist notation that
+    .glyphs files use.
+    """
+    text = text.strip().rstrip(";").strip()
+    if text.startswith("<"):
+        return bytes.fromhex(text[1:-1].replace(" ", ""))
+
+    if text.startswith("("):
+        items = [item.strip() for item in text[1:-1].split(",")]
+        return tuple(parse_value(item) for item in items if item)
+
+    if text.startswith('"'):
+        return text[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+
+    for number in (int, float):
+        try:
+            return number(text)
+        except ValueError:
+            pass
+    return text
+
+
+def format_value(value: Any) -> str:
+    """
+    Format data, a number or a flat array like Glyphs writes it, the inverse
+    of `parse_value`.
+    """
+    if isinstance(value, bytes):
+        return f"<{value.hex()}>"
+
+    if isinstance(value, (tuple, list)):
+        return "(" + ",".join(format_value(item) for item in value) + ")"
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
@@ -0,0 +1,225 @@
+"""
+Index of the layers of a font that have a scrawl.
+
+Finding the scrawls of a font means looking at the userData of every layer.
+The index does that once and is then kept up to date by updating single layers
+when their scrawl is saved or deleted. Bulk operations go over the indexed
+layers only.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, \
+    NamedTuple, Set, Tuple
+
+from scrawl.cache import layer_key
+from scrawl.codec import blob_format
+from scrawl.geometry import Rect
+from scrawl.model import SCRAWL_BLOB_KEY, SCRAWL_JOURNAL_KEY, \
+    SCRAWL_RECT_KEY, SCRAWL_UNIT_KEY, delete_scrawl, migrate_legacy, \
+    save_scrawl, scrawl_data, scrawl_patches, scrawl_rect
+from scrawl.points import LEGACY_DATA_KEY, LEGACY_UNIT_KEY, POINTS_FORMAT, \
+    plist_size, points_array
+from scrawl.report import USERDATA_LIMIT
+
+# Report layers whose scrawl uses more than this part of the userData limit
+NEAR_LIMIT = 0.75
+
+
+class IndexEntry(NamedTuple):
+    layer: Any
+    name: str
+    format: str | None
+    # Size of the scrawl data and of the undo history in bytes
+    size: int
+    journal_size: int
+    unit: float | None
+    rect: Rect | None
+    # The data is in the sidecar folder, not in the userData
+    sidecar: bool = False
+    # Size of the stored patches, see scrawl.patches
+    patches_size: int = 0
+
+    @property
+    def total_size(self) -> int:
+        # What the scrawl takes up in the userData
+        return self.journal_size + self.patches_size + (
+            0 if self.sidecar else self.size
+        )
+
+
+def layer_name(layer) -> str:
+    glyph = layer.parent
+    return layer.name if glyph is None else f"{glyph.name} {layer.name}"
+
+
+def font_layers(font) -> Iterator:
+    for glyph in font.glyphs:
+        yield from glyph.layers
+
+
+class ScrawlIndex:
+    """
+    The scrawled layers of a font, by layer key.
+    """
+
+    def __init__(self, layers: Iterable = ()) -> None:
+        self.entries: Dict[Hashable, IndexEntry] = {}
+        for layer in layers:
+            self.update(layer)
+
+    @classmethod
+    def for_font(cls, font) -> ScrawlIndex:
+        return cls(font_layers(font))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[IndexEntry]:
+        return iter(self.entries.values())
+
+    def __contains__(self, layer) -> bool:
+        return layer_key(layer) in self.entries
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.total_size for entry in self)
+
+    def update(self, layer) -> IndexEntry | None:
+        """
+        Read the scrawl of a layer again, after it was saved or deleted.
+        """
+        key = layer_key(layer)
+        try:
+            data = scrawl_data(layer)
+        except OSError:
+            # The file in the sidecar folder is missing
+            data = b""
+        if data is None:
+            return self._update_legacy(layer)
+
+        journal = layer.userData[SCRAWL_JOURNAL_KEY]
+        patches = scrawl_patches(layer)
+        rect = layer.userData[SCRAWL_RECT_KEY]
+        entry = IndexEntry(
+            layer,
+            layer_name(layer),
+            blob_format(data),
+            len(data),
+            0 if journal is None else len(journal),
+            layer.userData[SCRAWL_UNIT_KEY],
+            None if rect is None else tuple(rect),
+            layer.userData[SCRAWL_BLOB_KEY] is not None,
+            0 if patches is None else len(patches),
+        )
+        self.entries[key] = entry
+        return entry
+
+    def _update_legacy(self, layer) -> IndexEntry | None:
+        key = layer_key(layer)
+        points = layer.userData[LEGACY_DATA_KEY]
+        if points is None:
+            self.entries.pop(key, None)
+            return None
+
+        entry = IndexEntry(
+            layer,
+            layer_name(layer),
+            POINTS_FORMAT,
+            plist_size(points_array(points)),
+            0,
+            layer.userData[LEGACY_UNIT_KEY],
+            None,
+        )
+        self.entries[key] = entry
+        return entry
+
+    def select(self, layers: Iterable) -> List[IndexEntry]:
+        # The entries of those layers that have a scrawl
+        entries = []
+        for layer in layers:
+            entry = self.entries.get(layer_key(layer))
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def refresh(self, layers: Iterable) -> List[IndexEntry]:
+        """
+        Read the scrawls of the layers again and return the entries of those
+        that have one. Their userData may have changed without the index
+        knowing, by pasting, duplicating, undo or scripts.
+        """
+        entries = []
+        for layer in layers:
+            entry = self.update(layer)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def sidecar_digests(self) -> Set[bytes]:
+        # The hashes of the data in the sidecar folder that layers refer to
+        return {
+            bytes(entry.layer.userData[SCRAWL_BLOB_KEY])
+            for entry in self
+            if entry.sidecar
+        }
+
+    def near_limit(
+        self, fraction: float = NEAR_LIMIT, limit: int = USERDATA_LIMIT
+    ) -> List[IndexEntry]:
+        # Largest first
+        return sorted(
+            (entry for entry in self if entry.total_size > fraction * limit),
+            key=lambda entry: entry.total_size,
+            reverse=True,
+        )
+
+    def delete(self, entries: Iterable[IndexEntry]) -> int:
+        count = 0
+        for entry in list(entries):
+            delete_scrawl(entry.layer)
+            self.update(entry.layer)
+            count += 1
+        return count
+
+    def recompress(
+        self,
+        decode: Callable[[Any, Any], Any],
+        encode: Callable[[Any], Any],
+        entries: Iterable[IndexEntry] | None = None,
+    ) -> Tuple[List[Tuple[IndexEntry, int]], List[str]]:
+        """
+        Convert the scrawls in legacy formats to the current format, and fold
+        stored patches into the data. Point lists are rasterized. `decode`
+        takes the data and the patches, `encode` may return a `BlobReference`.
+        Returns the converted entries, as they were before, with their new
+        size, and a list of errors.
+        """
+        converted = []
+        errors = []
+        for entry in self.refresh(
+            [entry.layer for entry in (self if entries is None else entries)]
+        ):
+            if entry.format == "scrawl" and not entry.patches_size:
+                continue
+
+            layer = entry.layer
+            try:
+                if entry.format == POINTS_FORMAT:
+                    new_data = migrate_legacy(layer)
+                else:
+                    new_data = encode(
+                        decode(scrawl_data(layer), scrawl_patches(layer))
+                    )
+                    save_scrawl(layer, scrawl_rect(layer), new_data)
+            except Exception as e:
+                errors.append(f"{entry.name}: {e}")
+                continue
+
+            self.update(layer)
+            if new_data is None:
+                # An empty point list
+                continue
+
+            converted.append((entry, self.entries[layer_key(layer)].size))
+        return converted, errors
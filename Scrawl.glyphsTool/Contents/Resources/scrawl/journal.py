@@ -0,0 +1,335 @@
+"""
+Keep a journal of the strokes drawn on a scrawl, for undo.
+
+Instead of a copy of the canvas for each undo step, the journal keeps the
+strokes drawn since a base canvas, and a checkpoint copy of the canvas every
+few strokes. Undoing a stroke replays the strokes after the nearest checkpoint.
+
+The journal is stored next to the scrawl. Stroke positions are rounded to a
+fraction of a pixel and delta-encoded, and the whole journal is compressed, so
+it is much smaller than a copy of the canvas.
+"""
+
+from __future__ import annotations
+
+import zlib
+
+from struct import Struct
+from struct import error as StructError
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from scrawl.codec import ScrawlFormatError, decode_tiles, encode
+from scrawl.raster import Bounds, pen_radii, pen_value
+from scrawl.stroke import Point, StrokeInput
+from scrawl.tiles import TiledBuffer
+
+JOURNAL_MAGIC = b"SCRJ"
+JOURNAL_VERSION = 1
+
+# Uncompressed: magic, version
+JOURNAL_HEADER = Struct(">4sB")
+# Compressed: digest of the scrawl data, pixel size, number of strokes, length
+# of the base canvas data
+BODY_HEADER = Struct(">16sdII")
+# Flags, pen size, pen ratio, number of points
+STROKE_HEADER = Struct(">BddI")
+
+FLAG_ERASE = 1
+FLAG_SMOOTH = 2
+FLAG_FILL = 4
+
+# Stroke positions are rounded to 1/GRID pixels
+GRID = 8
+# Keep a copy of the canvas after this many strokes
+CHECKPOINT_INTERVAL = 16
+# Strokes before this many are folded into the base canvas
+MAX_STROKES = 256
+
+
+class Stroke(NamedTuple):
+    # For a fill, the seed point followed by the lower left and upper right
+    # corner of the box the fill was limited to
+    points: Tuple[Point, ...]
+    pen_size: float
+    pen_ratio: float
+    erase: bool = False
+    smooth: bool = False
+    fill: bool = False
+
+
+def quantize(x: float, y: float) -> Point:
+    """
+    Round a position in scrawl pixels to the precision the journal stores, so
+    that a replayed stroke hits the same pixels as the original one.
+    """
+    return round(x * GRID) / GRID, round(y * GRID) / GRID
+
+
+def draw_stroke(
+    canvas: TiledBuffer, stroke: Stroke, pixel_size: float
+) -> Bounds | None:
+    """
+    Draw a stroke like the tool draws it while the pen is moving.
+    """
+    if stroke.fill:
+        (x, y), (xmin, ymin), (xmax, ymax) = stroke.points
+        box = (int(xmin), int(ymin), int(xmax), int(ymax))
+        return canvas.fill(x, y, pen_value(stroke.erase), box)
+
+    rx, ry = pen_radii(
+        stroke.pen_size, pixel_size, stroke.pen_ratio, stroke.pen_ratio
+    )
+    stroke_input = StrokeInput(stroke.smooth)
+    for x, y in stroke.points:
+        stroke_input.add(x, y, 0)
+    points = stroke_input.take(final=True) or list(stroke.points[:1])
+    if not points:
+        return None
+
+    return canvas.polyline(points, rx, ry, pen_value(stroke.erase))
+
+
+class JournalSnapshot(NamedTuple):
+    """
+    The part of a journal that is stored, detached from the journal so that it
+    can be encoded on another thread.
+    """
+
+    base: TiledBuffer
+    strokes: Tuple[Stroke, ...]
+    pixel_size: float
+
+    def moved(self, dx: int, dy: int, width: int, height: int) -> JournalSnapshot:
+        # Like StrokeJournal.move, but return a new snapshot
+        base = TiledBuffer(width, height, self.base.tile_size)
+        base.tiles = dict(self.base.tiles)
+        base.move_tiles(dx // base.tile_size, dy // base.tile_size)
+        return JournalSnapshot(
+            base, _move_strokes(self.strokes, dx, dy), self.pixel_size
+        )
+
+    def tobytes(self, digest: bytes) -> bytes:
+        """
+        Encode the journal. `digest` identifies the scrawl data the journal
+        ends in, a journal that doesn't match the data is ignored on loading.
+        """
+        base = encode(self.base)
+        body = [
+            BODY_HEADER.pack(digest, self.pixel_size, len(self.strokes), len(base)),
+            base,
+        ]
+        for stroke in self.strokes:
+            flags = (
+                (FLAG_ERASE if stroke.erase else 0)
+                | (FLAG_SMOOTH if stroke.smooth else 0)
+                | (FLAG_FILL if stroke.fill else 0)
+            )
+            body.append(STROKE_HEADER.pack(
+                flags, stroke.pen_size, stroke.pen_ratio, len(stroke.points)
+            ))
+            body.append(_pack_points(stroke.points))
+        return JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION) + zlib.compress(
+            b"".join(body), 9
+        )
+
+
+class StrokeJournal:
+    """
+    The strokes drawn on a canvas since `base`. Strokes after `position` have
+    been undone and can be redone until a new stroke is added.
+    """
+
+    def __init__(
+        self,
+        base: TiledBuffer,
+        pixel_size: float,
+        strokes: Sequence[Stroke] = (),
+    ) -> None:
+        self.pixel_size = pixel_size
+        self.strokes: List[Stroke] = list(strokes)
+        self.position = len(self.strokes)
+        # Copies of the canvas by the number of strokes drawn on it. The
+        # copies are never drawn on.
+        self.checkpoints: Dict[int, TiledBuffer] = {0: base.copy()}
+
+    @classmethod
+    def frombytes(cls, data) -> tuple[StrokeJournal, bytes]:
+        """
+        Decode a journal. Returns the journal and the digest of the scrawl
+        data it was saved with.
+        """
+        data = bytes(data)
+        try:
+            magic, version = JOURNAL_HEADER.unpack_from(data)
+            if magic != JOURNAL_MAGIC:
+                raise ScrawlFormatError("Not a scrawl journal")
+
+            if version != JOURNAL_VERSION:
+                raise ScrawlFormatError(
+                    f"Unsupported journal version: {version}"
+                )
+
+            body = zlib.decompress(data[JOURNAL_HEADER.size:])
+            digest, pixel_size, count, base_length = BODY_HEADER.unpack_from(
+                body
+            )
+            offset = BODY_HEADER.size
+            base = decode_tiles(body[offset:offset + base_length])
+            offset += base_length
+            strokes = []
+            for _ in range(count):
+                flags, pen_size, pen_ratio, length = STROKE_HEADER.unpack_from(
+                    body, offset
+                )
+                offset += STROKE_HEADER.size
+                points, offset = _unpack_points(body, offset, length)
+                strokes.append(Stroke(
+                    points,
+                    pen_size,
+                    pen_ratio,
+                    bool(flags & FLAG_ERASE),
+                    bool(flags & FLAG_SMOOTH),
+                    bool(flags & FLAG_FILL),
+                ))
+        except (IndexError, StructError, zlib.error) as e:
+            raise ScrawlFormatError(f"Truncated journal: {e}")
+
+        return cls(base, pixel_size, strokes), digest
+
+    @property
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.position < len(self.strokes)
+
+    def append(self, stroke: Stroke, canvas: TiledBuffer) -> None:
+        """
+        Add a stroke that has just been drawn on `canvas`. Strokes that were
+        undone are forgotten.
+        """
+        del self.strokes[self.position:]
+        for index in [i for i in self.checkpoints if i > self.position]:
+            del self.checkpoints[index]
+        self.strokes.append(stroke)
+        self.position += 1
+        if self.position % CHECKPOINT_INTERVAL == 0:
+            self.checkpoints[self.position] = canvas.copy()
+        if len(self.strokes) > MAX_STROKES:
+            self.rebase(len(self.strokes) - MAX_STROKES)
+
+    def rebase(self, index: int) -> None:
+        """
+        Make the canvas after `index` strokes the new base, dropping the
+        strokes before it.
+        """
+        base = self.canvas_at(index)
+        del self.strokes[:index]
+        self.position = max(0, self.position - index)
+        self.checkpoints = {
+            i - index: canvas
+            for i, canvas in self.checkpoints.items()
+            if i > index
+        }
+        self.checkpoints[0] = base
+
+    def canvas_at(self, index: int) -> TiledBuffer:
+        """
+        Return a new canvas with the first `index` strokes drawn on the base.
+        """
+        start = max(i for i in self.checkpoints if i <= index)
+        canvas = self.checkpoints[start].copy()
+        for i in range(start, index):
+            draw_stroke(canvas, self.strokes[i], self.pixel_size)
+            if (i + 1) % CHECKPOINT_INTERVAL == 0 and i + 1 not in self.checkpoints:
+                self.checkpoints[i + 1] = canvas.copy()
+        return canvas
+
+    def undo(self) -> TiledBuffer | None:
+        if not self.can_undo:
+            return None
+
+        self.position -= 1
+        return self.canvas_at(self.position)
+
+    def redo(self) -> TiledBuffer | None:
+        if not self.can_redo:
+            return None
+
+        self.position += 1
+        return self.canvas_at(self.position)
+
+    def move(self, dx: int, dy: int, width: int, height: int) -> None:
+        """
+        Follow the canvas when its origin was moved `dx`, `dy` pixels left and
+        down, e.g. by `TiledBuffer.grow_to_fit`, and its size has changed.
+        """
+        for canvas in self.checkpoints.values():
+            canvas.move_tiles(dx // canvas.tile_size, dy // canvas.tile_size)
+            canvas.width = width
+            canvas.height = height
+        self.strokes = list(_move_strokes(self.strokes, dx, dy))
+
+    def snapshot(self) -> JournalSnapshot:
+        # The strokes that are drawn, without those that were undone
+        base = self.checkpoints[0]
+        detached = TiledBuffer(base.width, base.height, base.tile_size)
+        detached.tiles = dict(base.tiles)
+        return JournalSnapshot(
+            detached, tuple(self.strokes[:self.position]), self.pixel_size
+        )
+
+
+def _move_strokes(
+    strokes: Sequence[Stroke], dx: int, dy: int
+) -> Tuple[Stroke, ...]:
+    if not (dx or dy):
+        return tuple(strokes)
+
+    return tuple(
+        stroke._replace(
+            points=tuple((x + dx, y + dy) for x, y in stroke.points)
+        )
+        for stroke in strokes
+    )
+
+
+def _pack_points(points: Sequence[Point]) -> bytes:
+    # Zigzag varints of the differences between the points, in grid units
+    out = bytearray()
+    last_x = last_y = 0
+    for x, y in points:
+        gx = round(x * GRID)
+        gy = round(y * GRID)
+        for delta in (gx - last_x, gy - last_y):
+            value = (delta << 1) ^ (delta >> 63)
+            while value > 0x7F:
+                out.append(value & 0x7F | 0x80)
+                value >>= 7
+            out.append(value)
+        last_x, last_y = gx, gy
+    return bytes(out)
+
+
+def _unpack_points(
+    data: bytes, offset: int, count: int
+) -> tuple[Tuple[Point, ...], int]:
+    values = []
+    for _ in range(2 * count):
+        value = shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        values.append((value >> 1) ^ -(value & 1))
+    points = []
+    x = y = 0
+    for i in range(0, len(values), 2):
+        x += values[i]
+        y += values[i + 1]
+        points.append((x / GRID, y / GRID))
+    return tuple(points), offset
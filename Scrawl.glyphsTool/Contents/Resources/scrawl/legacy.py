@@ -0,0 +1,127 @@
+"""
+Decoding of the image data stored by older versions of the plugin, without
+AppKit.
+
+Versions before the compact format stored PNG data; the earliest ones stored
+uncompressed TIFF data, as written by `NSBitmapImageRep.TIFFRepresentation`.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from struct import Struct
+
+from scrawl.codec import ScrawlFormatError, blob_format, decode, decode_tiles
+from scrawl.patches import apply_patches
+from scrawl.png import read_png, to_gray_alpha
+from scrawl.raster import ScrawlBuffer
+from scrawl.tiles import TiledBuffer
+
+# TIFF tags
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIGURATION = 284
+EXTRA_SAMPLES = 338
+
+# Sizes of TIFF field types in bytes
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8}
+
+
+def read_tiff(data) -> ScrawlBuffer:
+    data = memoryview(data).tobytes()
+    if data[:4] == b"MM\x00*":
+        order = ">"
+    elif data[:4] == b"II*\x00":
+        order = "<"
+    else:
+        raise ScrawlFormatError("Not TIFF data")
+
+    (ifd,) = Struct(order + "I").unpack_from(data, 4)
+    (count,) = Struct(order + "H").unpack_from(data, ifd)
+    entry = Struct(order + "HHI4s")
+    tags = {}
+    for i in range(count):
+        tag, kind, n, value = entry.unpack_from(data, ifd + 2 + i * entry.size)
+        if kind not in (3, 4):
+            continue
+
+        fmt = order + ("H" if kind == 3 else "I") * n
+        if n * TYPE_SIZES[kind] > 4:
+            (offset,) = Struct(order + "I").unpack(value)
+            tags[tag] = Struct(fmt).unpack_from(data, offset)
+        else:
+            tags[tag] = Struct(fmt).unpack_from(value)
+
+    def tag_value(tag, default=None):
+        value = tags.get(tag, (default,))
+        return value[0]
+
+    width = tag_value(IMAGE_WIDTH)
+    height = tag_value(IMAGE_LENGTH)
+    channels = tag_value(SAMPLES_PER_PIXEL, 1)
+    if (
+        width is None
+        or height is None
+        or tag_value(COMPRESSION, 1) != 1
+        or tag_value(PLANAR_CONFIGURATION, 1) != 1
+        or set(tags.get(BITS_PER_SAMPLE, (8,))) != {8}
+        or not 1 <= channels <= 4
+    ):
+        raise ScrawlFormatError("Unsupported TIFF data")
+
+    pixels = b"".join(
+        data[offset:offset + length]
+        for offset, length in zip(
+            tags.get(STRIP_OFFSETS, ()), tags.get(STRIP_BYTE_COUNTS, ())
+        )
+    )
+    if len(pixels) < width * height * channels:
+        raise ScrawlFormatError("TIFF data is truncated")
+
+    pixels = np.frombuffer(
+        pixels, dtype=np.uint8, count=width * height * channels
+    ).reshape((height, width, channels))
+    if tag_value(PHOTOMETRIC) == 0:
+        # White is zero
+        pixels = pixels.copy()
+        pixels[..., 0] = 255 - pixels[..., 0]
+
+    # Extra sample 1 is associated (premultiplied) alpha
+    premultiplied = tag_value(EXTRA_SAMPLES) == 1
+    return ScrawlBuffer(width, height, to_gray_alpha(pixels, premultiplied))
+
+
+def buffer_from_data(data, patches=None) -> ScrawlBuffer:
+    """
+    Decode the stored data of a layer, in the current or in a legacy format,
+    and apply its stored patches, if any.
+    """
+    if patches is not None:
+        return tiles_from_data(data, patches).to_buffer()
+
+    fmt = blob_format(data)
+    if fmt == "scrawl":
+        return decode(data)
+    if fmt == "png":
+        return read_png(data)
+    if fmt == "tiff":
+        return read_tiff(data)
+    raise ScrawlFormatError("Unknown image data format")
+
+
+def tiles_from_data(data, patches=None) -> TiledBuffer:
+    # Like buffer_from_data, but return a sparse canvas
+    if blob_format(data) == "scrawl":
+        canvas = decode_tiles(data)
+    else:
+        canvas = TiledBuffer.from_buffer(buffer_from_data(data))
+    if patches is not None:
+        apply_patches(canvas, patches)
+    return canvas
@@ -0,0 +1,237 @@
+"""
+Convert the point lists of the earliest plugin versions in .glyphs files to
+the current format, without Glyphs.
+
+    python3 -m scrawl.migrate Font.glyphs Fonts/ --dry-run
+
+Each point list is rasterized into a canvas with the pixel size it was drawn
+with, and replaced by data in the current format, its rect and the pixel
+size, see `scrawl.points`. Files and .glyphspackage folders are rewritten line
+by line; only the userData of layers with a point list is touched. Layers that
+already have a scrawl in a newer format are left alone.
+
+Inside Glyphs, "Convert Old Scrawls In Font" does the same for the open font,
+with the pen ratio of each master. Here, all fonts use the ratio given with
+--pen-ratio.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+
+from glob import glob
+from os.path import isdir, join
+from typing import Iterable, Iterator, List, Tuple
+
+from scrawl.glyphsfile import format_value, parse_value
+from scrawl.model import DEFAULT_PIXEL_RATIO, DEFAULT_PIXEL_SIZE, \
+    SCRAWL_BLOB_KEY, SCRAWL_DATA_KEY, SCRAWL_RECT_KEY, SCRAWL_UNIT_KEY, \
+    encode_scrawl
+from scrawl.points import LEGACY_DATA_KEY, LEGACY_PREFIX, LEGACY_UNIT_KEY, \
+    POINTS_FORMAT, points_array, rasterize_points
+from scrawl.report import SizeRow, format_size_report
+
+QUOTED = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+# Lines of one userData entry
+Entry = Tuple[str, List[str]]
+
+
+def entry_key(line: str) -> str:
+    return line.strip().split("=", 1)[0].strip().strip('"')
+
+
+def nesting(line: str) -> int:
+    # How many more brackets the line opens than it closes
+    line = QUOTED.sub("", line)
+    return line.count("{") + line.count("(") - line.count("}") - line.count(")")
+
+
+def split_entries(lines: List[str]) -> List[Entry]:
+    entries: List[Entry] = []
+    depth = 0
+    for line in lines:
+        if depth == 0:
+            entries.append((entry_key(line), []))
+        entries[-1][1].append(line)
+        depth += nesting(line)
+    return entries
+
+
+class Migration:
+    """
+    Rewrites the lines of a .glyphs file, collecting a size report row for
+    each point list that is converted.
+    """
+
+    def __init__(self, pen_ratio: float = DEFAULT_PIXEL_RATIO) -> None:
+        self.pen_ratio = pen_ratio
+        self.rows: List[SizeRow] = []
+        self.skipped: List[str] = []
+        self.errors: List[str] = []
+
+    def migrate_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        glyph = layer_id = None
+        lines = iter(lines)
+        for line in lines:
+            stripped = line.lstrip()
+            if stripped.startswith("glyphname ="):
+                glyph = parse_value(stripped.split("=", 1)[1])
+            elif stripped.startswith("layerId ="):
+                layer_id = parse_value(stripped.split("=", 1)[1])
+            elif entry_key(line).startswith(LEGACY_PREFIX):
+                # Take the rest of the userData dict, up to its closing brace
+                block = [line]
+                depth = nesting(line)
+                line = None
+                for next_line in lines:
+                    depth += nesting(next_line)
+                    if depth < 0:
+                        line = next_line
+                        break
+                    block.append(next_line)
+                yield from self.migrate_block(block, f"{glyph} {layer_id}")
+                if line is None:
+                    return
+            yield line
+
+    def migrate_block(self, block: List[str], name: str) -> List[str]:
+        entries = split_entries(block)
+        keys = {key for key, _ in entries}
+        if LEGACY_DATA_KEY not in keys:
+            return block
+
+        if SCRAWL_DATA_KEY in keys or SCRAWL_BLOB_KEY in keys:
+            self.skipped.append(name)
+            return block
+
+        values = {key: "".join(lines).split("=", 1)[1] for key, lines in entries}
+        old_text = "".join(dict(entries)[LEGACY_DATA_KEY])
+        try:
+            unit = DEFAULT_PIXEL_SIZE
+            if LEGACY_UNIT_KEY in values:
+                unit = parse_value(values[LEGACY_UNIT_KEY])
+            rasterized = rasterize_points(
+                points_array(values[LEGACY_DATA_KEY]),
+                unit,
+                self.pen_ratio,
+            )
+            if rasterized is None:
+                return block
+
+            canvas, origin = rasterized
+            data, _, rect = encode_scrawl(
+                canvas, None, origin, unit, self.pen_ratio
+            )
+        except Exception as e:
+            self.errors.append(f"{name}: {e}")
+            return block
+
+        self.rows.append((name, POINTS_FORMAT, len(old_text), len(data)))
+        new_values = {
+            SCRAWL_DATA_KEY: data,
+            SCRAWL_RECT_KEY: rect,
+            SCRAWL_UNIT_KEY: unit,
+        }
+        # Quote the keys like the file does
+        quote = '"' if block[0].lstrip().startswith('"') else ""
+        migrated = []
+        for key, lines in entries:
+            if key == LEGACY_DATA_KEY:
+                migrated.extend(
+                    f"{quote}{new_key}{quote} = {format_value(value)};\n"
+                    for new_key, value in new_values.items()
+                )
+            elif not key.startswith(LEGACY_PREFIX) and key not in new_values:
+                migrated.extend(lines)
+        return migrated
+
+
+def font_files(path: str) -> List[str]:
+    # The files of a font, or of all fonts in a folder
+    if path.rstrip("/").endswith(".glyphspackage"):
+        return sorted(glob(join(path, "glyphs", "*.glyph")))
+
+    if isdir(path):
+        files = []
+        for font in sorted(
+            glob(join(path, "**", "*.glyphs"), recursive=True)
+            + glob(join(path, "**", "*.glyphspackage"), recursive=True)
+        ):
+            files.extend(font_files(font))
+        return files
+
+    return [path]
+
+
+def migrate_file(path: str, migration: Migration, dry_run: bool = False) -> bool:
+    """
+    Rewrite a file with its point lists converted. Returns whether anything
+    was converted.
+    """
+    converted = len(migration.rows)
+    tmp_path = path + ".tmp"
+    with open(path, encoding="utf-8") as f, open(
+        os.devnull if dry_run else tmp_path, "w", encoding="utf-8"
+    ) as out:
+        for line in migration.migrate_lines(f):
+            out.write(line)
+    changed = len(migration.rows) > converted
+    if not dry_run:
+        if changed:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+    return changed
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Convert the point lists of the earliest Scrawl versions "
+        "in Glyphs files to the current format."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help=".glyphs files, .glyphspackages or folders with fonts",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Only report what would be converted",
+    )
+    parser.add_argument(
+        "--pen-ratio",
+        type=float,
+        default=DEFAULT_PIXEL_RATIO,
+        help="The ScrawlPenRatio of the masters (default: 1)",
+    )
+    options = parser.parse_args(args)
+    migration = Migration(options.pen_ratio)
+    changed = 0
+    for path in options.paths:
+        for file_path in font_files(path):
+            try:
+                changed += migrate_file(file_path, migration, options.dry_run)
+            except (OSError, UnicodeDecodeError) as e:
+                migration.errors.append(f"{file_path}: {e}")
+
+    print(format_size_report(migration.rows))
+    for name in migration.skipped:
+        print(f"Skipped {name}: the layer has a newer scrawl")
+    for error in migration.errors:
+        print(f"Error: {error}", file=sys.stderr)
+    verb = "would be" if options.dry_run else "were"
+    print(
+        f"{len(migration.rows)} point lists in {changed} files {verb} "
+        f"converted."
+    )
+    return 1 if migration.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Downsampled levels of a scrawl for drawing it small.
+
+When a glyph is only a few screen pixels high, e.g. in the preview pane or in
+a long text, drawing the full bitmap means scaling it down in every frame. The
+reporter builds a pyramid of levels once, each half the size of the previous
+one, and draws the smallest level that still has at least one pixel per
+screen pixel.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from math import ceil, floor, log2
+from typing import List
+
+from scrawl.geometry import Rect
+from scrawl.raster import ScrawlBuffer
+
+# Don't make levels smaller than this in either dimension
+MIN_LEVEL_SIZE = 8
+
+
+def downsample(buffer: ScrawlBuffer) -> ScrawlBuffer:
+    """
+    Return a buffer of half the size, rounded up, by averaging 2 x 2 pixels.
+    Odd sizes are padded with clear pixels on the right and on top, so the
+    lower left corner stays in place.
+    """
+    width = ceil(buffer.width / 2)
+    height = ceil(buffer.height / 2)
+    padded = np.zeros((height * 2, width * 2, 2), dtype=np.uint32)
+    # Rows are stored top down, so the padding goes on top
+    padded[height * 2 - buffer.height:, :buffer.width] = buffer.pixels
+    blocks = padded.reshape(height, 2, width, 2, 2)
+    gray = blocks[..., 0]
+    alpha = blocks[..., 1]
+    alpha_sum = alpha.sum(axis=(1, 3))
+    # Weight the gray by alpha, so clear pixels don't lighten the ink
+    gray_sum = (gray * alpha).sum(axis=(1, 3))
+    pixels = np.empty((height, width, 2), dtype=np.uint8)
+    pixels[..., 0] = np.where(
+        alpha_sum > 0, gray_sum // np.maximum(alpha_sum, 1), 0
+    )
+    pixels[..., 1] = (alpha_sum + 2) // 4
+    return ScrawlBuffer(width, height, pixels)
+
+
+def build_levels(
+    buffer: ScrawlBuffer, min_size: int = MIN_LEVEL_SIZE
+) -> List[ScrawlBuffer]:
+    """
+    Return the buffer followed by its downsampled levels.
+    """
+    levels = [buffer]
+    while min(levels[-1].width, levels[-1].height) >= 2 * min_size:
+        levels.append(downsample(levels[-1]))
+    return levels
+
+
+def choose_level(screen_pixels: float, count: int) -> int:
+    """
+    Return the index of the level to draw when one pixel of the full size
+    buffer covers `screen_pixels` screen pixels.
+    """
+    if screen_pixels <= 0 or count < 2:
+        return 0
+
+    return max(0, min(count - 1, floor(log2(1 / screen_pixels))))
+
+
+def level_rect(rect: Rect, buffer: ScrawlBuffer, level: int) -> Rect:
+    """
+    Return the rect to draw the level with the index `level` of a buffer in,
+    if the full size buffer is drawn in `rect`. Levels can be larger than the
+    buffer because of the padding.
+    """
+    x, y, w, h = rect
+    factor = 2 ** level
+    return (
+        x,
+        y,
+        w * ceil(buffer.width / factor) * factor / buffer.width,
+        h * ceil(buffer.height / factor) * factor / buffer.height,
+    )
@@ -0,0 +1,679 @@
+"""
+The scrawl of a layer, shared by the tool and the reporter.
+
+Scrawls are stored in the userData of a layer. This module knows the keys and
+how to load, save and place a scrawl. It only uses the layer attributes it
+needs, so it can be used with stand-ins for Glyphs objects.
+
+The data of a scrawl may instead be stored in a sidecar folder next to the
+font, see `scrawl.blobstore`. Then the layer only has a reference to it.
+Changes since the data was saved may be stored as patches, see
+`scrawl.patches`.
+
+It also keeps a registry of the scrawls that the tool is editing, so that the
+reporter can draw the tool's canvas directly instead of decoding the data that
+was just saved from it.
+"""
+
+from __future__ import annotations
+
+from functools import partial
+from math import ceil, floor
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Tuple
+
+from scrawl.blobstore import BlobReference, BlobStore
+from scrawl.cache import blob_hash, data_digests
+from scrawl.codec import blob_format, encode
+from scrawl.geometry import Rect
+from scrawl.journal import JournalSnapshot
+from scrawl.legacy import tiles_from_data
+from scrawl.patches import PatchBase, PatchPlan, TileVersions, \
+    apply_patches, encode_patch, extend_digest, grid_offset, patched_digest, \
+    tile_versions
+from scrawl.points import LEGACY_DATA_KEY, LEGACY_KEYS, LEGACY_UNIT_KEY, \
+    points_array, rasterize_points
+from scrawl.tiles import TILE_SIZE, TiledBuffer
+
+PLUGIN_ID = "de.kutilek.scrawl"
+SCRAWL_DATA_KEY = f"{PLUGIN_ID}.data"
+SCRAWL_RECT_KEY = f"{PLUGIN_ID}.rect"
+SCRAWL_SIZE_KEY = f"{PLUGIN_ID}.size"
+SCRAWL_UNIT_KEY = f"{PLUGIN_ID}.unit"
+SCRAWL_JOURNAL_KEY = f"{PLUGIN_ID}.journal"
+# Hash of the data in the sidecar folder, instead of SCRAWL_DATA_KEY
+SCRAWL_BLOB_KEY = f"{PLUGIN_ID}.blob"
+# Tiles changed since the data was saved
+SCRAWL_PATCHES_KEY = f"{PLUGIN_ID}.patches"
+SCRAWL_KEYS = (
+    SCRAWL_DATA_KEY,
+    SCRAWL_BLOB_KEY,
+    SCRAWL_PATCHES_KEY,
+    SCRAWL_RECT_KEY,
+    SCRAWL_SIZE_KEY,
+    SCRAWL_UNIT_KEY,
+    SCRAWL_JOURNAL_KEY,
+)
+SCRAWL_SMOOTH_DEFAULTS_KEY = f"{PLUGIN_ID}.smooth"
+
+# Master custom parameter
+PEN_RATIO_PARAMETER = "ScrawlPenRatio"
+# Font custom parameter, store scrawl data in a sidecar folder
+SIDECAR_PARAMETER = "ScrawlSidecar"
+
+DEFAULT_PEN_SIZE = 2  # font units
+DEFAULT_PIXEL_SIZE = 2  # font units
+DEFAULT_PIXEL_RATIO = 1.0
+
+
+def default_rect(layer) -> Rect:
+    # The drawing rect of a new scrawl, based on master and layer dimensions
+    font = layer.font()
+    upm = font.upm
+    pad_v = round(upm * 0.2)
+    pad_h = round(upm * 0.5)
+
+    try:
+        descender = font.masters[layer.layerId].descender
+    except (AttributeError, KeyError):
+        descender = round(-upm * 0.2)
+
+    return (
+        -pad_h,
+        descender - pad_v,
+        2 * pad_h + layer.width,
+        2 * pad_v + upm,
+    )
+
+
+def scrawl_rect(layer) -> Rect:
+    rect = layer.userData[SCRAWL_RECT_KEY]
+    if rect is None:
+        return default_rect(layer)
+
+    return tuple(rect)
+
+
+def pixel_ratio(layer) -> float:
+    ratio = layer.master.customParameters[PEN_RATIO_PARAMETER]
+    if ratio is None:
+        return DEFAULT_PIXEL_RATIO
+
+    return float(ratio)
+
+
+def blob_store(font) -> BlobStore | None:
+    # The sidecar folder of a font, None if the font has not been saved
+    if font is None or font.filepath is None:
+        return None
+
+    return BlobStore.for_font_path(font.filepath)
+
+
+def uses_sidecar(font) -> bool:
+    return font.filepath is not None and bool(
+        font.customParameters[SIDECAR_PARAMETER]
+    )
+
+
+def scrawl_data(layer):
+    """
+    Return the stored data of a layer's scrawl, or None if it has none. Data
+    from the sidecar folder is memory-mapped. Raises OSError if the data is in
+    the sidecar folder but can't be read.
+    """
+    ref = layer.userData[SCRAWL_BLOB_KEY]
+    if ref is None:
+        return layer.userData[SCRAWL_DATA_KEY]
+
+    store = blob_store(layer.font())
+    if store is None:
+        raise OSError("The font has not been saved, there is no sidecar folder")
+
+    return store.get(bytes(ref))
+
+
+def scrawl_patches(layer):
+    # The stored patches of a layer, or None
+    return layer.userData[SCRAWL_PATCHES_KEY]
+
+
+def data_digest(layer) -> bytes | None:
+    # The hash of the stored data without its patches, see scrawl_digest
+    ref = layer.userData[SCRAWL_BLOB_KEY]
+    if ref is not None:
+        return bytes(ref)
+
+    data = layer.userData[SCRAWL_DATA_KEY]
+    return None if data is None else data_digests.get(data)
+
+
+def data_reader(layer) -> Callable[[], Any] | None:
+    """
+    Return a function that reads the stored data of a layer's scrawl, or None
+    if it has none. It may be called on any thread; data from the sidecar
+    folder is only read then, and should be closed after use.
+    """
+    ref = layer.userData[SCRAWL_BLOB_KEY]
+    if ref is None:
+        data = layer.userData[SCRAWL_DATA_KEY]
+        return None if data is None else lambda: data
+
+    store = blob_store(layer.font())
+    if store is None:
+        return None
+
+    return partial(store.get, bytes(ref))
+
+
+def scrawl_digest(layer) -> bytes | None:
+    """
+    Return the hash of the stored data and its patches, without reading the
+    data from the sidecar folder. Data that was hashed before is not hashed
+    again, see `scrawl.cache.DigestCache`.
+    """
+    digest = data_digest(layer)
+    if digest is None:
+        return None
+
+    patches = scrawl_patches(layer)
+    if patches is None:
+        return digest
+
+    return data_digests.get(
+        patches, lambda patches: patched_digest(digest, patches), digest
+    )
+
+
+def new_canvas(
+    rect: Rect, pixel_size: float, ratio: float = DEFAULT_PIXEL_RATIO
+) -> TiledBuffer:
+    # A new canvas has no tiles, they are allocated when drawing
+    return TiledBuffer(
+        round(rect[2] / pixel_size),
+        round(rect[3] / pixel_size / ratio),
+    )
+
+
+def canvas_rect(
+    canvas: TiledBuffer,
+    origin: tuple[float, float],
+    pixel_size: float,
+    ratio: float = DEFAULT_PIXEL_RATIO,
+) -> Rect:
+    return (
+        origin[0],
+        origin[1],
+        canvas.width * pixel_size,
+        canvas.height * pixel_size * ratio,
+    )
+
+
+def trim_canvas(
+    canvas: TiledBuffer,
+    origin: tuple[float, float],
+    pixel_size: float,
+    ratio: float = DEFAULT_PIXEL_RATIO,
+) -> Rect:
+    """
+    Crop a canvas for saving to the tiles that have ink. Returns the rect to
+    store with it; the origin moves by whole tiles, so the ink stays in place.
+    """
+    dx, dy = canvas.trim()
+    return canvas_rect(
+        canvas,
+        (origin[0] + dx * pixel_size, origin[1] + dy * pixel_size * ratio),
+        pixel_size,
+        ratio,
+    )
+
+
+def expand_canvas(
+    canvas: TiledBuffer,
+    rect: Rect,
+    target: Rect,
+    pixel_size: float,
+    ratio: float = DEFAULT_PIXEL_RATIO,
+) -> Tuple[Rect, Tuple[int, int]]:
+    """
+    Enlarge a canvas that is placed at `rect` by whole tiles, so that it also
+    covers the `target` rect. No pixels are allocated. Returns the new rect
+    and by how many pixels the origin was moved left and down.
+    """
+    x, y = rect[:2]
+    size = canvas.tile_size
+    tile_width = size * pixel_size
+    tile_height = tile_width * ratio
+    dx, dy = canvas.crop(
+        min(0, floor((target[0] - x) / tile_width)),
+        min(0, floor((target[1] - y) / tile_height)),
+        max(
+            ceil(canvas.width / size),
+            ceil((target[0] + target[2] - x) / tile_width),
+        ),
+        max(
+            ceil(canvas.height / size),
+            ceil((target[1] + target[3] - y) / tile_height),
+        ),
+    )
+    return canvas_rect(
+        canvas,
+        (x + dx * pixel_size, y + dy * pixel_size * ratio),
+        pixel_size,
+        ratio,
+    ), (-dx, -dy)
+
+
+def encode_scrawl(
+    canvas: TiledBuffer,
+    journal: JournalSnapshot | None,
+    origin: tuple[float, float],
+    pixel_size: float,
+    ratio: float = DEFAULT_PIXEL_RATIO,
+    journal_limit: int | None = None,
+) -> Tuple[bytes, bytes | None, Rect]:
+    """
+    Encode a canvas for saving, cropped to its ink, and the undo history that
+    ends in it. The history is left out if it is empty or larger than
+    `journal_limit`. The canvas is cropped in place.
+
+    Returns the data, the history and the rect to store them with.
+    """
+    rect = trim_canvas(canvas, origin, pixel_size, ratio)
+    data = encode(canvas)
+    if journal is None or not journal.strokes:
+        return data, None, rect
+
+    # The history follows the cropped canvas
+    shift_x = round((origin[0] - rect[0]) / pixel_size)
+    shift_y = round((origin[1] - rect[1]) / pixel_size / ratio)
+    journal_data = journal.moved(
+        shift_x, shift_y, canvas.width, canvas.height
+    ).tobytes(blob_hash(data))
+    if journal_limit is not None and len(journal_data) > journal_limit:
+        return data, None, rect
+
+    return data, journal_data, rect
+
+
+def encode_scrawl_patch(
+    canvas: TiledBuffer,
+    journal: JournalSnapshot | None,
+    plan: PatchPlan,
+    journal_limit: int | None = None,
+) -> Tuple[bytes, bytes | None, bytes]:
+    """
+    Encode the changed tiles of a canvas as a patch, and the undo history
+    that ends in it. The patch is appended to the stored data and patches
+    with the hash `plan.digest`.
+
+    Returns the patch, the history and the new hash.
+    """
+    patch = encode_patch(canvas, plan)
+    digest = extend_digest(plan.digest, patch)
+    if journal is None or not journal.strokes:
+        return patch, None, digest
+
+    # The history follows the stored canvas
+    size = canvas.tile_size
+    journal_data = journal.moved(
+        plan.offset[0] * size, plan.offset[1] * size, plan.width, plan.height
+    ).tobytes(digest)
+    if journal_limit is not None and len(journal_data) > journal_limit:
+        return patch, None, digest
+
+    return patch, journal_data, digest
+
+
+class ScrawlSnapshot(NamedTuple):
+    # A copy of what to save of a canvas, for encoding it on another thread
+    canvas: TiledBuffer
+    journal: JournalSnapshot | None
+    origin: Tuple[float, float]
+    pixel_size: float
+    ratio: float
+    # The tiles to save as a patch, or None to save the whole scrawl
+    plan: PatchPlan | None
+
+
+class EncodedScrawl(NamedTuple):
+    data: Any
+    journal: bytes | None
+    # The rect to store the data with, None for a patch
+    rect: Rect | None
+    # Hash of the stored data and patches once this is stored
+    digest: bytes
+
+
+def snapshot_scrawl(
+    canvas: TiledBuffer,
+    journal: JournalSnapshot | None,
+    origin: Tuple[float, float],
+    pixel_size: float,
+    ratio: float,
+    base: PatchBase | None = None,
+) -> Tuple[ScrawlSnapshot | None, TileVersions]:
+    """
+    Take a snapshot of a canvas for saving: of the tiles that changed since
+    the save `base` is of, or of the whole canvas if there is no base or the
+    whole scrawl should be saved.
+
+    Returns the snapshot, None if nothing changed, and the tile versions to
+    make the next patches relative to once it is stored.
+    """
+    plan = None
+    if base is not None:
+        plan = base.plan(canvas, origin, pixel_size, ratio)
+    if plan is None:
+        snapshot = ScrawlSnapshot(
+            canvas.copy(), journal, origin, pixel_size, ratio, None
+        )
+        return snapshot, tile_versions(canvas)
+
+    versions = tile_versions(canvas, plan.offset)
+    if not plan.keys:
+        return None, versions
+
+    snapshot = ScrawlSnapshot(
+        plan.snapshot(canvas), journal, origin, pixel_size, ratio, plan
+    )
+    return snapshot, versions
+
+
+def encode_snapshot(
+    snapshot: ScrawlSnapshot, journal_limit: int | None = None
+) -> EncodedScrawl:
+    """
+    Encode a snapshot as a patch or as the whole scrawl, see `encode_scrawl`
+    and `encode_scrawl_patch`.
+    """
+    canvas, journal, origin, pixel_size, ratio, plan = snapshot
+    if plan is not None:
+        patch, journal_data, digest = encode_scrawl_patch(
+            canvas, journal, plan, journal_limit
+        )
+        return EncodedScrawl(patch, journal_data, None, digest)
+
+    data, journal_data, rect = encode_scrawl(
+        canvas, journal, origin, pixel_size, ratio, journal_limit
+    )
+    return EncodedScrawl(data, journal_data, rect, blob_hash(data))
+
+
+class LoadedScrawl(NamedTuple):
+    canvas: TiledBuffer
+    rect: Rect
+    pen_size: float | None
+    pixel_size: float
+    pixel_ratio: float
+    # The stored data the canvas was decoded from, None for a new canvas
+    data: Any
+    # How many pixels the canvas origin was moved left and down from where
+    # the stored data is placed
+    shift: Tuple[int, int] = (0, 0)
+
+
+def legacy_scrawl(layer) -> LoadedScrawl | None:
+    """
+    Rasterize the point list that the earliest versions stored, see
+    `scrawl.points`, or return None if the layer has none.
+    """
+    points = layer.userData[LEGACY_DATA_KEY]
+    if points is None:
+        return None
+
+    unit = layer.userData[LEGACY_UNIT_KEY]
+    if unit is None:
+        unit = DEFAULT_PIXEL_SIZE
+    ratio = pixel_ratio(layer)
+    rasterized = rasterize_points(points_array(points), unit, ratio)
+    if rasterized is None:
+        return None
+
+    canvas, origin = rasterized
+    return LoadedScrawl(
+        canvas,
+        canvas_rect(canvas, origin, unit, ratio),
+        layer.userData[SCRAWL_SIZE_KEY],
+        unit,
+        ratio,
+        None,
+    )
+
+
+def load_scrawl(
+    layer, decode: Callable[[Any], TiledBuffer] = tiles_from_data
+) -> LoadedScrawl:
+    """
+    Load the scrawl of a layer for editing, or make a new canvas if the layer
+    has no scrawl or its data can't be decoded.
+
+    Scrawls are saved cropped to their ink, so the canvas is enlarged to cover
+    at least the default drawing rect of the layer.
+    """
+    pixel_size = layer.userData[SCRAWL_UNIT_KEY]
+    if pixel_size is None:
+        pixel_size = DEFAULT_PIXEL_SIZE
+    ratio = pixel_ratio(layer)
+    rect = scrawl_rect(layer)
+    canvas = data = None
+    try:
+        data = scrawl_data(layer)
+        if data is not None:
+            canvas = decode(data)
+            patches = scrawl_patches(layer)
+            if patches is not None:
+                apply_patches(canvas, patches)
+        else:
+            legacy = legacy_scrawl(layer)
+            if legacy is not None:
+                canvas, rect, _, pixel_size = legacy[:4]
+    except:  # noqa: E722
+        print(f"Error in image data of layer {layer}")
+        data = None
+    if canvas is None:
+        canvas = new_canvas(rect, pixel_size, ratio)
+    rect, shift = expand_canvas(
+        canvas, rect, default_rect(layer), pixel_size, ratio
+    )
+    return LoadedScrawl(
+        canvas,
+        rect,
+        layer.userData[SCRAWL_SIZE_KEY],
+        pixel_size,
+        ratio,
+        data,
+        shift,
+    )
+
+
+def encode_legacy(layer) -> Tuple[bytes, Rect, float] | None:
+    """
+    Encode the point list of a layer in the current format. Returns the data,
+    its rect and the pixel size, or None if the layer has no point list.
+    """
+    legacy = legacy_scrawl(layer)
+    if legacy is None:
+        return None
+
+    data, _, rect = encode_scrawl(
+        legacy.canvas,
+        None,
+        legacy.rect[:2],
+        legacy.pixel_size,
+        legacy.pixel_ratio,
+    )
+    return data, rect, legacy.pixel_size
+
+
+def migrate_legacy(layer) -> bytes | None:
+    # Replace the point list of a layer by data in the current format
+    encoded = encode_legacy(layer)
+    if encoded is None:
+        return None
+
+    data, rect, unit = encoded
+    save_scrawl(layer, rect, data)
+    layer.userData[SCRAWL_UNIT_KEY] = unit
+    return data
+
+
+def patch_base(
+    layer,
+    versions: TileVersions,
+    origin: Tuple[float, float],
+    pixel_size: float,
+    tile_size: int = TILE_SIZE,
+) -> PatchBase | None:
+    """
+    Return what patches of the layer's scrawl are relative to, after it was
+    loaded or saved, or None if its stored data can't be patched. `versions`
+    are the tile versions of the canvas at `origin` at that time.
+    """
+    try:
+        data = scrawl_data(layer)
+    except OSError:
+        return None
+
+    rect = layer.userData[SCRAWL_RECT_KEY]
+    if data is None or rect is None:
+        return None
+
+    return stored_patch_base(
+        data,
+        rect,
+        scrawl_patches(layer),
+        scrawl_digest(layer),
+        versions,
+        origin,
+        pixel_size,
+        pixel_ratio(layer),
+        tile_size,
+    )
+
+
+def stored_patch_base(
+    data,
+    rect: Rect,
+    patches,
+    digest: bytes,
+    versions: TileVersions,
+    origin: Tuple[float, float],
+    pixel_size: float,
+    ratio: float = DEFAULT_PIXEL_RATIO,
+    tile_size: int = TILE_SIZE,
+) -> PatchBase | None:
+    # Like patch_base, for data and patches that are stored with `rect`
+    if blob_format(data) != "scrawl":
+        return None
+
+    width = round(rect[2] / pixel_size)
+    height = round(rect[3] / pixel_size / ratio)
+    offset = grid_offset(origin, rect[:2], tile_size, pixel_size, ratio)
+    if width % tile_size or height % tile_size or offset is None:
+        # Only canvases saved cropped to whole tiles
+        return None
+
+    dx, dy = offset
+    return PatchBase(
+        (rect[0], rect[1]),
+        width,
+        height,
+        len(data),
+        0 if patches is None else len(patches),
+        {(tx + dx, ty + dy): saved for (tx, ty), saved in versions.items()},
+        digest,
+    )
+
+
+def save_settings(layer, pen_size: float, pixel_size: float) -> None:
+    layer.userData[SCRAWL_SIZE_KEY] = round(pen_size)
+    layer.userData[SCRAWL_UNIT_KEY] = round(pixel_size)
+
+
+def save_scrawl(layer, rect: Rect, data, journal=None) -> None:
+    """
+    Store encoded scrawl data and its rect. If `data` is a `BlobReference`,
+    the data is in the sidecar folder and only its hash is stored. The journal
+    is removed if there is none for the new data, and a legacy point list is
+    removed, too.
+    """
+    layer.userData[SCRAWL_RECT_KEY] = tuple(rect)
+    if isinstance(data, BlobReference):
+        layer.userData[SCRAWL_BLOB_KEY] = data.digest
+        if layer.userData[SCRAWL_DATA_KEY] is not None:
+            del layer.userData[SCRAWL_DATA_KEY]
+    else:
+        layer.userData[SCRAWL_DATA_KEY] = data
+        if layer.userData[SCRAWL_BLOB_KEY] is not None:
+            del layer.userData[SCRAWL_BLOB_KEY]
+    for key in LEGACY_KEYS + (SCRAWL_PATCHES_KEY,):
+        if layer.userData[key] is not None:
+            del layer.userData[key]
+    if journal is not None:
+        layer.userData[SCRAWL_JOURNAL_KEY] = journal
+    elif layer.userData[SCRAWL_JOURNAL_KEY] is not None:
+        del layer.userData[SCRAWL_JOURNAL_KEY]
+
+
+def append_patch(layer, patch: bytes, journal=None) -> None:
+    """
+    Append a patch to the stored patches. The journal is replaced like in
+    `save_scrawl`.
+    """
+    patches = scrawl_patches(layer)
+    layer.userData[SCRAWL_PATCHES_KEY] = (
+        patch if patches is None else bytes(patches) + patch
+    )
+    if journal is not None:
+        layer.userData[SCRAWL_JOURNAL_KEY] = journal
+    elif layer.userData[SCRAWL_JOURNAL_KEY] is not None:
+        del layer.userData[SCRAWL_JOURNAL_KEY]
+
+
+def delete_scrawl(layer) -> None:
+    for key in SCRAWL_KEYS + LEGACY_KEYS:
+        if layer.userData[key] is not None:
+            del layer.userData[key]
+
+
+class LiveScrawl(NamedTuple):
+    canvas: TiledBuffer
+    # Position of the canvas origin in font units
+    origin: tuple[float, float]
+    pixel_size: float
+    pixel_ratio: float
+    # Cache for whatever the plugins need to display the tiles
+    tile_cache: dict
+
+
+class LiveScrawlRegistry:
+    """
+    The scrawls that are being edited, by layer key. The tool publishes its
+    canvas when it loads a layer and whenever it replaces the canvas or moves
+    its origin, and withdraws it when it is done with the layer.
+    """
+
+    def __init__(self) -> None:
+        self._scrawls: Dict[Hashable, LiveScrawl] = {}
+
+    def __len__(self) -> int:
+        return len(self._scrawls)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._scrawls
+
+    def publish(self, key: Hashable, scrawl: LiveScrawl) -> None:
+        self._scrawls[key] = scrawl
+
+    def withdraw(self, key: Hashable | None = None) -> None:
+        # Withdraw the scrawl of `key`, or all scrawls if `key` is None
+        if key is None:
+            self._scrawls.clear()
+        else:
+            self._scrawls.pop(key, None)
+
+    def get(self, key: Hashable) -> LiveScrawl | None:
+        return self._scrawls.get(key)
+
+
+live_scrawls = LiveScrawlRegistry()
@@ -0,0 +1,194 @@
+"""
+Onion skin of the scrawls of the other masters of a glyph.
+
+When sketching along an axis, it helps to see what was drawn in the other
+masters. Their scrawls are composited into one buffer, which is cached per
+layer and only rebuilt when the stored data or the rect of one of the other
+masters changes, so drawing it costs one image per frame.
+
+The masters' scrawls may have different rects, pixel sizes and pen ratios.
+They are resampled to a common grid in font units, so they line up as they
+would in their own layers.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from hashlib import blake2b
+from math import ceil
+from typing import Any, Callable, Hashable, List, NamedTuple, Sequence, Tuple
+
+from scrawl.cache import DecodedImageCache, decoded_images, layer_key
+from scrawl.geometry import Rect, union_rect
+from scrawl.model import PLUGIN_ID, scrawl_data, scrawl_digest, \
+    scrawl_patches, scrawl_rect
+from scrawl.raster import ScrawlBuffer
+from scrawl.timing import ONION_SKIN, timings
+
+ONION_SKIN_DEFAULTS_KEY = f"{PLUGIN_ID}.onionSkin"
+# The composites are kept separately from the decoded images
+ONION_CACHE_BYTES = 32 * 1024 * 1024
+# Use coarser pixels for the composite than this would take
+MAX_COMPOSITE_PIXELS = 4096 * 4096
+# Opacity of the onion skin
+ONION_SKIN_FRACTION = 0.25
+
+
+class MasterScrawl(NamedTuple):
+    key: Hashable
+    layer: Any
+    digest: bytes
+    rect: Rect
+
+
+class OnionSkin(NamedTuple):
+    buffer: ScrawlBuffer
+    rect: Rect
+    # Whatever the plugins need to draw the buffer
+    image: Any = None
+
+
+def master_scrawls(layer) -> List[MasterScrawl]:
+    """
+    Return the scrawls of the master layers of the layer's glyph, except the
+    one of the layer's own master.
+    """
+    glyph = layer.parent
+    font = layer.font()
+    if glyph is None or font is None:
+        return []
+
+    own = layer.associatedMasterId or layer.layerId
+    scrawls = []
+    for master in font.masters:
+        if master.id == own:
+            continue
+
+        master_layer = glyph.layers[master.id]
+        if master_layer is None:
+            continue
+
+        digest = scrawl_digest(master_layer)
+        if digest is not None:
+            scrawls.append(MasterScrawl(
+                layer_key(master_layer),
+                master_layer,
+                digest,
+                scrawl_rect(master_layer),
+            ))
+    return scrawls
+
+
+def onion_digest(scrawls: Sequence[MasterScrawl]) -> bytes:
+    # Changes when any of the scrawls or their rects change
+    h = blake2b(digest_size=16)
+    for scrawl in scrawls:
+        h.update(scrawl.digest)
+        h.update(repr(tuple(scrawl.rect)).encode())
+    return h.digest()
+
+
+def composite_scrawls(
+    scrawls: Sequence[Tuple[ScrawlBuffer, Rect]],
+    max_pixels: int = MAX_COMPOSITE_PIXELS,
+) -> Tuple[ScrawlBuffer, Rect] | None:
+    """
+    Draw buffers, each of which fills its rect in font units, on top of each
+    other. Returns the composite and its rect, which contains all rects. The
+    composite has the smallest pixel width and height of the buffers, nearest
+    neighbour sampled.
+    """
+    scrawls = [(b, r) for b, r in scrawls if b.width and b.height]
+    if not scrawls:
+        return None
+
+    rect = None
+    for _, r in scrawls:
+        rect = union_rect(rect, tuple(r))
+    x, y, w, h = rect
+    pixel_width = min(r[2] / b.width for b, r in scrawls)
+    pixel_height = min(r[3] / b.height for b, r in scrawls)
+    scale = max(1.0, (w * h / pixel_width / pixel_height / max_pixels) ** 0.5)
+    pixel_width *= scale
+    pixel_height *= scale
+    width = ceil(w / pixel_width)
+    height = ceil(h / pixel_height)
+    composite = ScrawlBuffer(width, height)
+    # Pixel centers in font units, rows bottom up
+    xs = x + (np.arange(width) + 0.5) * pixel_width
+    ys = y + (np.arange(height) + 0.5) * pixel_height
+    for buffer, (bx, by, bw, bh) in scrawls:
+        columns = np.floor((xs - bx) * buffer.width / bw).astype(np.int64)
+        rows = np.floor((ys - by) * buffer.height / bh).astype(np.int64)
+        col_mask = (columns >= 0) & (columns < buffer.width)
+        row_mask = (rows >= 0) & (rows < buffer.height)
+        if not col_mask.any() or not row_mask.any():
+            continue
+
+        # Both are stored top down
+        src = buffer.pixels[
+            np.ix_(buffer.height - 1 - rows[row_mask], columns[col_mask])
+        ]
+        dst_index = np.ix_(height - 1 - np.flatnonzero(row_mask),
+                           np.flatnonzero(col_mask))
+        dst = composite.pixels[dst_index]
+        over = src[..., 1] > dst[..., 1]
+        dst[over] = src[over]
+        composite.pixels[dst_index] = dst
+    return composite, (x, y, width * pixel_width, height * pixel_height)
+
+
+def onion_skin(
+    layer,
+    decode: Callable[[Any, Any], ScrawlBuffer],
+    make_image: Callable[[ScrawlBuffer], Any] | None = None,
+    cache: DecodedImageCache | None = None,
+) -> OnionSkin | None:
+    """
+    Return the onion skin of the other masters for a layer, or None if they
+    have no scrawls. `decode` turns stored data and patches into a buffer,
+    `make_image` makes what is stored with the composite for drawing it.
+    """
+    scrawls = master_scrawls(layer)
+    if not scrawls:
+        return None
+
+    if cache is None:
+        cache = onion_skins
+    key = layer_key(layer)
+    digest = onion_digest(scrawls)
+    skin = cache.get(key, digest)
+    if skin is not None:
+        return skin
+
+    start = timings.start()
+    buffers = []
+    for scrawl in scrawls:
+        # The reporter may have decoded the scrawl already
+        cached = decoded_images.get(scrawl.key, scrawl.digest)
+        if cached is not None:
+            buffers.append((cached[1][0], scrawl.rect))
+            continue
+
+        try:
+            buffers.append((
+                decode(scrawl_data(scrawl.layer), scrawl_patches(scrawl.layer)),
+                scrawl.rect,
+            ))
+        except:  # noqa: E722
+            print(f"Error in image data of layer {scrawl.layer}")
+    composite = composite_scrawls(buffers)
+    if composite is None:
+        return None
+
+    buffer, rect = composite
+    skin = OnionSkin(
+        buffer, rect, None if make_image is None else make_image(buffer)
+    )
+    cache.put(key, digest, skin, buffer.pixels.nbytes)
+    timings.stop(ONION_SKIN, start, buffer.pixels.nbytes)
+    return skin
+
+
+onion_skins = DecodedImageCache(ONION_CACHE_BYTES)
@@ -0,0 +1,257 @@
+"""
+Incremental saves of the tiles that changed.
+
+Encoding the whole scrawl after every stroke makes saving, and writing the
+font, slower the larger the scrawl gets. Instead, the tool appends a patch of
+the tiles that changed since the last save to the key
+"de.kutilek.scrawl.patches". The patches are stored one after another:
+
+    4 bytes  length of the patch (big endian)
+    ...      the changed tiles in the tiled format (version 2), see
+             `scrawl.codec`, including tiles that no longer have ink
+
+Tile keys are relative to the canvas of the stored data, and patches stay
+inside of it; if a stroke reaches beyond the stored canvas, the whole scrawl
+is saved again. Loading decodes the stored data and applies the patches in
+order: a tile with ink replaces the stored tile, a tile without ink removes
+it.
+
+Once the patches take up more than a part of the size of the data, the tool
+saves the whole scrawl again when drawing pauses, which removes the patches.
+If drawing doesn't pause, the whole scrawl is saved once the patches have
+grown a few times larger than that.
+"""
+
+from __future__ import annotations
+
+from math import ceil
+from struct import Struct
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from scrawl.cache import blob_hash
+from scrawl.codec import ScrawlFormatError, decode_tiles, encode
+from scrawl.raster import ScrawlBuffer
+from scrawl.tiles import TileKey, TiledBuffer
+
+PATCH_HEADER = Struct(">I")
+# Save the whole scrawl again when the patches are larger than this part of
+# the data, but not before they reach COMPACT_MIN_SIZE
+COMPACT_RATIO = 0.5
+COMPACT_MIN_SIZE = 4096
+# Don't save patches once they are this many times larger than that
+MAX_COMPACT_FACTOR = 4
+# Save the whole scrawl when a save changes more than this part of the tiles
+MAX_PATCH_RATIO = 0.5
+
+# The tiles of a canvas and their versions when it was saved, by their key in
+# the stored canvas
+TileVersions = Dict[TileKey, Tuple[ScrawlBuffer, int]]
+Offset = Tuple[int, int]
+
+
+def split_patches(patches) -> Iterator[memoryview]:
+    # The patches, each with its length
+    patches = memoryview(patches)
+    offset = 0
+    while offset < len(patches):
+        if offset + PATCH_HEADER.size > len(patches):
+            raise ScrawlFormatError("Scrawl patches are truncated")
+
+        (length,) = PATCH_HEADER.unpack_from(patches, offset)
+        end = offset + PATCH_HEADER.size + length
+        if end > len(patches):
+            raise ScrawlFormatError("Scrawl patches are truncated")
+
+        yield patches[offset:end]
+        offset = end
+
+
+def apply_patches(canvas: TiledBuffer, patches) -> TiledBuffer:
+    """
+    Apply stored patches to the canvas decoded from the stored data, in place.
+    """
+    for patch in split_patches(patches):
+        tiles = decode_tiles(patch[PATCH_HEADER.size:])
+        if tiles.tile_size != canvas.tile_size:
+            raise ScrawlFormatError("Scrawl patch does not match the tile size")
+
+        for key, tile in tiles:
+            if tile.has_ink():
+                canvas.tiles[key] = tile
+            else:
+                canvas.tiles.pop(key, None)
+    canvas.version += 1
+    return canvas
+
+
+def extend_digest(digest: bytes, patch) -> bytes:
+    return blob_hash(bytes(digest) + bytes(patch))
+
+
+def patched_digest(digest: bytes, patches) -> bytes:
+    """
+    Return the hash of stored data with the hash `digest` and its patches.
+    It changes with every patch that is appended.
+    """
+    for patch in split_patches(patches):
+        digest = extend_digest(digest, patch)
+    return digest
+
+
+def tile_versions(canvas: TiledBuffer, offset: Offset = (0, 0)) -> TileVersions:
+    # Add `offset` to the keys of the canvas to get those of the stored canvas
+    dx, dy = offset
+    return {
+        (tx + dx, ty + dy): (tile, tile.version) for (tx, ty), tile in canvas
+    }
+
+
+def grid_offset(
+    origin: Tuple[float, float],
+    base_origin: Tuple[float, float],
+    tile_size: int,
+    pixel_size: float,
+    ratio: float,
+) -> Offset | None:
+    """
+    Return by how many tiles a canvas at `origin` is moved against a canvas
+    at `base_origin`, or None if their tiles don't line up.
+    """
+    dx = (origin[0] - base_origin[0]) / (tile_size * pixel_size)
+    dy = (origin[1] - base_origin[1]) / (tile_size * pixel_size * ratio)
+    offset = round(dx), round(dy)
+    if abs(dx - offset[0]) > 1e-6 or abs(dy - offset[1]) > 1e-6:
+        return None
+
+    return offset
+
+
+def changed_tiles(
+    canvas: TiledBuffer, versions: TileVersions, offset: Offset
+) -> List[TileKey]:
+    """
+    Return the keys in the stored canvas of the tiles that were added, drawn
+    on, replaced or removed since `versions` were taken.
+    """
+    dx, dy = offset
+    changed = []
+    for (tx, ty), tile in canvas:
+        key = tx + dx, ty + dy
+        saved = versions.get(key)
+        if saved is None or saved[0] is not tile or saved[1] != tile.version:
+            changed.append(key)
+    changed.extend(
+        (tx, ty) for tx, ty in versions
+        if (tx - dx, ty - dy) not in canvas.tiles
+    )
+    return changed
+
+
+class PatchPlan(NamedTuple):
+    # Keys of the changed tiles in the stored canvas
+    keys: List[TileKey]
+    # Add to the keys of the canvas to get the keys in the stored canvas
+    offset: Offset
+    # Size of the stored canvas in pixels
+    width: int
+    height: int
+    # Hash of the stored data and patches that the patch is appended to
+    digest: bytes = b""
+
+    def snapshot(self, canvas: TiledBuffer) -> TiledBuffer:
+        # A copy of the changed tiles, for encoding them on another thread
+        dx, dy = self.offset
+        copy = TiledBuffer(canvas.width, canvas.height, canvas.tile_size)
+        for tx, ty in self.keys:
+            tile = canvas.tiles.get((tx - dx, ty - dy))
+            if tile is not None:
+                copy.tiles[tx - dx, ty - dy] = tile.copy()
+        return copy
+
+
+class PatchBase(NamedTuple):
+    """
+    What the patches of the next save are relative to: the stored data, and
+    the tile versions of the canvas at the last save.
+    """
+
+    # Origin of the stored canvas in font units, and its size in pixels
+    origin: Tuple[float, float]
+    width: int
+    height: int
+    # Size of the stored data and of the patches so far in bytes
+    data_size: int
+    size: int
+    versions: TileVersions
+    # Hash of the stored data and patches, see `patched_digest`
+    digest: bytes = b""
+
+    @property
+    def compact_size(self) -> float:
+        return max(COMPACT_MIN_SIZE, self.data_size * COMPACT_RATIO)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.size > self.compact_size
+
+    def plan(
+        self,
+        canvas: TiledBuffer,
+        origin: Tuple[float, float],
+        pixel_size: float,
+        ratio: float,
+    ) -> PatchPlan | None:
+        """
+        Return which tiles of a canvas at `origin` to save in a patch, or None
+        if the whole scrawl should be saved.
+        """
+        if self.size > self.compact_size * MAX_COMPACT_FACTOR:
+            return None
+
+        size = canvas.tile_size
+        offset = grid_offset(origin, self.origin, size, pixel_size, ratio)
+        if offset is None:
+            return None
+
+        keys = changed_tiles(canvas, self.versions, offset)
+        if len(keys) > max(1, len(canvas) * MAX_PATCH_RATIO):
+            return None
+
+        cols = ceil(self.width / size)
+        rows = ceil(self.height / size)
+        inside = []
+        for tx, ty in keys:
+            if 0 <= tx < cols and 0 <= ty < rows:
+                inside.append((tx, ty))
+                continue
+
+            # Outside of the stored canvas, only tiles without ink can be
+            # left out
+            tile = canvas.tiles.get((tx - offset[0], ty - offset[1]))
+            if tile is not None and tile.has_ink():
+                return None
+
+        return PatchPlan(inside, offset, self.width, self.height, self.digest)
+
+    def patched(
+        self, patch_size: int, versions: TileVersions, digest: bytes
+    ) -> PatchBase:
+        # After a patch was stored
+        return self._replace(
+            size=self.size + patch_size, versions=versions, digest=digest
+        )
+
+
+def encode_patch(canvas: TiledBuffer, plan: PatchPlan) -> bytes:
+    """
+    Encode the tiles of a plan as a patch, with its length, to be appended to
+    the stored patches.
+    """
+    size = canvas.tile_size
+    patch = TiledBuffer(plan.width, plan.height, size)
+    dx, dy = plan.offset
+    for tx, ty in plan.keys:
+        tile = canvas.tiles.get((tx - dx, ty - dy))
+        patch.tiles[tx, ty] = ScrawlBuffer(size, size) if tile is None else tile
+    data = encode(patch, keep_empty=True)
+    return PATCH_HEADER.pack(len(data)) + data
@@ -0,0 +1,176 @@
+"""
+Minimal PNG reader and writer, so that scrawls can be converted without AppKit.
+
+Only what the plugins ever stored is supported for reading: 8-bit gray, gray
+with alpha, RGB and RGBA images without interlacing.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import zlib
+
+from struct import Struct
+
+from scrawl.codec import ScrawlFormatError
+from scrawl.raster import ScrawlBuffer
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+CHUNK_HEADER = Struct(">I4s")
+IHDR = Struct(">IIBBBBB")
+
+# Samples per pixel by color type
+CHANNELS = {
+    0: 1,  # gray
+    2: 3,  # RGB
+    4: 2,  # gray, alpha
+    6: 4,  # RGBA
+}
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        CHUNK_HEADER.pack(len(data), kind)
+        + data
+        + zlib.crc32(kind + data).to_bytes(4, "big")
+    )
+
+
+def write_png(buffer: ScrawlBuffer, level: int = 6) -> bytes:
+    """
+    Encode the buffer as an 8-bit gray+alpha PNG.
+    """
+    # Each row starts with its filter type, 0 means no filter
+    rows = np.zeros((buffer.height, buffer.bytes_per_row + 1), dtype=np.uint8)
+    rows[:, 1:] = buffer.pixels.reshape((buffer.height, -1))
+    return (
+        SIGNATURE
+        + _chunk(b"IHDR", IHDR.pack(buffer.width, buffer.height, 8, 4, 0, 0, 0))
+        + _chunk(b"IDAT", zlib.compress(rows.tobytes(), level))
+        + _chunk(b"IEND", b"")
+    )
+
+
+def read_png(data) -> ScrawlBuffer:
+    data = memoryview(data).tobytes()
+    if not data.startswith(SIGNATURE):
+        raise ScrawlFormatError("Not PNG data")
+
+    header = None
+    idat = []
+    offset = len(SIGNATURE)
+    while offset + CHUNK_HEADER.size <= len(data):
+        length, kind = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        chunk = data[offset:offset + length]
+        offset += length + 4  # skip the CRC
+        if kind == b"IHDR":
+            header = IHDR.unpack(chunk)
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise ScrawlFormatError("PNG data has no header")
+
+    width, height, depth, color_type, _, _, interlace = header
+    if depth != 8 or color_type not in CHANNELS or interlace:
+        raise ScrawlFormatError(
+            f"Unsupported PNG: depth {depth}, color type {color_type}, "
+            f"interlace {interlace}"
+        )
+
+    channels = CHANNELS[color_type]
+    try:
+        raw = zlib.decompress(b"".join(idat))
+    except zlib.error as e:
+        raise ScrawlFormatError(f"PNG data is corrupt: {e}")
+
+    stride = width * channels
+    if len(raw) < (stride + 1) * height:
+        raise ScrawlFormatError("PNG data is truncated")
+
+    rows = np.frombuffer(raw, dtype=np.uint8, count=(stride + 1) * height)
+    pixels = _unfilter(rows.reshape((height, stride + 1)), channels)
+    return ScrawlBuffer(width, height, to_gray_alpha(
+        pixels.reshape((height, width, channels))
+    ))
+
+
+def _unfilter(rows: np.ndarray, bpp: int) -> np.ndarray:
+    height, stride = rows.shape[0], rows.shape[1] - 1
+    out = np.zeros((height, stride), dtype=np.uint8)
+    prev = np.zeros(stride, dtype=np.uint8)
+    for y in range(height):
+        kind = rows[y, 0]
+        line = rows[y, 1:]
+        if kind == 0:
+            cur = line.copy()
+        elif kind == 1:
+            # Sub: running sum over pixels, per channel
+            cur = (
+                np.cumsum(line.reshape((-1, bpp)), axis=0, dtype=np.uint32)
+                .astype(np.uint8)
+                .reshape(-1)
+            )
+        elif kind == 2:
+            cur = line + prev
+        elif kind in (3, 4):
+            cur = _unfilter_sequential(kind, line, prev, bpp)
+        else:
+            raise ScrawlFormatError(f"Unknown PNG filter type {kind}")
+        out[y] = cur
+        prev = cur
+    return out
+
+
+def _unfilter_sequential(
+    kind: int, line: np.ndarray, prev: np.ndarray, bpp: int
+) -> np.ndarray:
+    # Average and Paeth depend on the already decoded left neighbour, so they
+    # can't be vectorized along the row
+    cur = line.tolist()
+    up = prev.tolist()
+    for i in range(len(cur)):
+        left = cur[i - bpp] if i >= bpp else 0
+        if kind == 3:
+            cur[i] = (cur[i] + ((left + up[i]) >> 1)) & 0xFF
+            continue
+
+        upper_left = up[i - bpp] if i >= bpp else 0
+        p = left + up[i] - upper_left
+        pa = abs(p - left)
+        pb = abs(p - up[i])
+        pc = abs(p - upper_left)
+        if pa <= pb and pa <= pc:
+            predictor = left
+        elif pb <= pc:
+            predictor = up[i]
+        else:
+            predictor = upper_left
+        cur[i] = (cur[i] + predictor) & 0xFF
+    return np.array(cur, dtype=np.uint8)
+
+
+def to_gray_alpha(pixels: np.ndarray, premultiplied: bool = False) -> np.ndarray:
+    """
+    Convert an array of shape (height, width, channels) with 1 to 4 channels
+    (gray, gray+alpha, RGB, RGBA) to gray+alpha.
+    """
+    channels = pixels.shape[2]
+    if channels in (1, 2):
+        gray = pixels[..., 0].astype(np.float32)
+    else:
+        rgb = pixels[..., :3].astype(np.float32)
+        gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    if channels in (2, 4):
+        alpha = pixels[..., -1]
+        if premultiplied:
+            opaque = alpha > 0
+            gray[opaque] *= 255 / alpha[opaque]
+    else:
+        alpha = np.full(pixels.shape[:2], 255, dtype=np.uint8)
+    out = np.empty(pixels.shape[:2] + (2,), dtype=np.uint8)
+    out[..., 0] = np.clip(np.rint(gray), 0, 255)
+    out[..., 1] = alpha
+    return out
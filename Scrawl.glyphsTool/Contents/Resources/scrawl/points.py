@@ -0,0 +1,78 @@
+"""
+The point lists stored by the earliest versions of the plugin.
+
+They stored a scrawl as a list of (x, y) pixel positions under the key
+"de.kutilek.Scrawl.data", note the capital S, in pixels of
+"de.kutilek.Scrawl.unit" font units, counted from the origin of the layer.
+`scripts/Make Random Data.py` still writes this format.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import re
+
+from itertools import chain
+from typing import Tuple
+
+from scrawl.raster import INK, ScrawlBuffer
+from scrawl.tiles import TiledBuffer
+
+LEGACY_PREFIX = "de.kutilek.Scrawl."
+LEGACY_DATA_KEY = f"{LEGACY_PREFIX}data"
+LEGACY_UNIT_KEY = f"{LEGACY_PREFIX}unit"
+LEGACY_KEYS = (LEGACY_DATA_KEY, LEGACY_UNIT_KEY)
+
+# What `blob_format` would call it
+POINTS_FORMAT = "points"
+
+NUMBER = re.compile(r"-?\d+(?:\.\d*)?")
+
+
+def points_array(points) -> np.ndarray:
+    """
+    Return the points as an array of shape (n, 2). `points` may be a sequence
+    of pairs, like the userData of a layer holds, or the text of the list in
+    a .glyphs file.
+    """
+    if isinstance(points, str):
+        values = np.array(NUMBER.findall(points), dtype=np.float64)
+    else:
+        values = np.fromiter(
+            chain.from_iterable(points), dtype=np.float64
+        )
+    return values.reshape(-1, 2)
+
+
+def rasterize_points(
+    points: np.ndarray, unit: float, ratio: float = 1.0
+) -> Tuple[TiledBuffer, Tuple[float, float]] | None:
+    """
+    Draw each point as a pixel of a canvas with pixels of `unit` font units,
+    `ratio` times as high as wide. Returns the canvas, just large enough for
+    the points, and the position of its origin in font units, or None if
+    there are no points.
+    """
+    if not len(points):
+        return None
+
+    xs = np.floor(points[:, 0]).astype(np.int64)
+    # Points are square; with taller pixels, points may share a row
+    rows = np.floor(points[:, 1] / ratio).astype(np.int64)
+    x0 = int(xs.min())
+    y0 = int(rows.min())
+    width = int(xs.max()) - x0 + 1
+    height = int(rows.max()) - y0 + 1
+    buffer = ScrawlBuffer(width, height)
+    # Rows are stored top down
+    buffer.pixels[height - 1 - (rows - y0), xs - x0] = INK
+    return TiledBuffer.from_buffer(buffer), (x0 * unit, y0 * unit * ratio)
+
+
+def plist_size(points: np.ndarray) -> int:
+    # About the size of the list in a .glyphs file: "(x,y),\n" per point
+    if not len(points):
+        return 0
+
+    digits = np.char.str_len(points.astype(np.int64).astype(str)).sum()
+    return int(digits) + 5 * len(points)
@@ -0,0 +1,107 @@
+"""
+Decode the scrawls of layers before they are needed.
+
+When the tool moves to another layer, it has to decode that layer's scrawl
+before it can draw. The tool asks the prefetcher to decode the layers next to
+the current one on a worker thread, so that the decoded canvas is usually
+ready when the user moves on.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from typing import Any, Callable, Hashable, List, NamedTuple
+
+from scrawl.cache import DecodedImageCache
+from scrawl.legacy import tiles_from_data
+
+# Memory for canvases that were decoded ahead of time
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class PrefetchJob(NamedTuple):
+    key: Hashable
+    digest: bytes
+    # Returns the data, on the worker thread; see `scrawl.model.data_reader`
+    read: Callable[[], Any]
+
+
+class Prefetcher:
+    """
+    Decode data with `decode` on a worker thread into a cache of at most
+    `max_bytes`. `size` returns the memory used by a decoded value.
+
+    `decode` must not use AppKit, the default only reads the formats that
+    `scrawl.legacy` understands. Data it can't decode is just not prefetched.
+    """
+
+    def __init__(
+        self,
+        decode: Callable[[bytes], Any] = tiles_from_data,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        size: Callable[[Any], int] = lambda canvas: canvas.nbytes,
+    ) -> None:
+        self.decode = decode
+        self.size = size
+        self.cache = DecodedImageCache(max_bytes)
+        self._queue: List[PrefetchJob] = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def prefetch(self, jobs: List[PrefetchJob]) -> None:
+        """
+        Decode the data of these jobs, in order, replacing the jobs that have
+        not been started yet.
+        """
+        with self._condition:
+            self._queue = [
+                job for job in jobs if not self.cache.has(job.key, job.digest)
+            ]
+            if self._queue:
+                self._start()
+                self._condition.notify_all()
+
+    def take(self, key: Hashable, digest: bytes) -> Any | None:
+        """
+        Return the value decoded for `key` from data with the hash `digest`,
+        or None if it has not been decoded. The value is removed from the
+        cache, so the caller may change it.
+        """
+        with self._condition:
+            value = self.cache.get(key, digest)
+            if value is not None:
+                self.cache.invalidate(key)
+            return value
+
+    def cancel(self) -> None:
+        with self._condition:
+            self._queue = []
+
+    def _start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._work, name="Scrawl prefetch", daemon=True
+            )
+            self._thread.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                job = self._queue.pop(0)
+
+            try:
+                data = job.read()
+                try:
+                    value = self.decode(data)
+                finally:
+                    # A memory map of a file in the sidecar folder
+                    if hasattr(data, "close"):
+                        data.close()
+            except Exception:
+                continue
+
+            with self._condition:
+                self.cache.put(job.key, job.digest, value, self.size(value))
@@ -0,0 +1,210 @@
+"""
+Gray+alpha scrawl bitmap backed by a NumPy array.
+
+Pen strokes are stamped straight into the array as round-capped capsules, so
+drawing does not need a graphics context. AppKit only sees the finished buffer
+when it is displayed or encoded.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from math import ceil, floor, sqrt
+from typing import Sequence, Tuple
+
+# Pixel values as (gray, alpha)
+INK = (0, 255)
+PAPER = (255, 255)
+CLEAR = (0, 0)
+
+# A pixel counts as ink if it is at least half opaque and at most half bright
+INK_THRESHOLD = 128
+
+# A stamp must always cover at least one pixel centre, otherwise thin pens
+# leave gaps when the mouse position falls between pixel centres.
+MIN_RADIUS = sqrt(0.5) + 1e-6
+
+Bounds = Tuple[int, int, int, int]
+
+
+def pen_radii(
+    pen_size: float,
+    pixel_size: float,
+    pen_ratio: float = 1,
+    pixel_ratio: float = 1,
+) -> tuple[float, float]:
+    """
+    Return the horizontal and vertical pen radius in scrawl pixels.
+
+    The pen is `pen_size` font units wide and `pen_size * pen_ratio` font units
+    high. Scrawl pixels are `pixel_size` font units wide and
+    `pixel_size * pixel_ratio` font units high. The tool uses the master's
+    "ScrawlPenRatio" for both, so its pen is round in pixel space.
+    """
+    rx = pen_size / pixel_size / 2
+    ry = pen_size * pen_ratio / (pixel_size * pixel_ratio) / 2
+    return rx, ry
+
+
+def pen_value(erase: bool = False) -> tuple[int, int]:
+    # The eraser makes pixels transparent
+    return CLEAR if erase else INK
+
+
+def union_bounds(a: Bounds, b: Bounds) -> Bounds:
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def is_ink(value: tuple[int, int]) -> bool:
+    gray, alpha = value
+    return alpha >= INK_THRESHOLD and gray < INK_THRESHOLD
+
+
+class ScrawlBuffer:
+    """
+    A scrawl bitmap of `width` x `height` pixels with two 8-bit samples (gray
+    and alpha) per pixel.
+
+    Drawing coordinates are in pixels with the origin in the lower left corner,
+    like AppKit drawing coordinates. The array in `pixels` is stored top row
+    first, like the rows of a PNG or an `NSBitmapImageRep`, so it can be handed
+    to either without conversion.
+    """
+
+    def __init__(
+        self, width: int, height: int, pixels: np.ndarray | None = None
+    ) -> None:
+        if pixels is None:
+            pixels = np.zeros((height, width, 2), dtype=np.uint8)
+        elif pixels.shape != (height, width, 2):
+            raise ValueError(
+                f"Pixel array of shape {pixels.shape} does not match buffer "
+                f"size {width} x {height}"
+            )
+        self.pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        # Incremented on every change, so views can tell if they are stale
+        self.version = 0
+
+    @classmethod
+    def frombytes(cls, width: int, height: int, data: bytes) -> ScrawlBuffer:
+        pixels = np.frombuffer(data, dtype=np.uint8).reshape((height, width, 2))
+        return cls(width, height, pixels.copy())
+
+    def tobytes(self) -> bytes:
+        return self.pixels.tobytes()
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def bytes_per_row(self) -> int:
+        return self.width * 2
+
+    def copy(self) -> ScrawlBuffer:
+        return ScrawlBuffer(self.width, self.height, self.pixels.copy())
+
+    def clear(self) -> None:
+        self.pixels[...] = CLEAR
+        self.version += 1
+
+    def ink_mask(self) -> np.ndarray:
+        """
+        Return a boolean array of the buffer's size, True where there is ink.
+        """
+        gray = self.pixels[..., 0]
+        alpha = self.pixels[..., 1]
+        return (alpha >= INK_THRESHOLD) & (gray < INK_THRESHOLD)
+
+    def has_ink(self) -> bool:
+        return bool(self.ink_mask().any())
+
+    def stamp(
+        self,
+        x: float,
+        y: float,
+        rx: float,
+        ry: float | None = None,
+        value: tuple[int, int] = INK,
+    ) -> Bounds | None:
+        """
+        Stamp an elliptical pen at (x, y). Returns the dirty bounds as
+        (xmin, ymin, xmax, ymax) in pixels, or None if nothing was drawn.
+        """
+        return self.stroke(x, y, x, y, rx, ry, value)
+
+    def polyline(
+        self,
+        points: Sequence[tuple[float, float]],
+        rx: float,
+        ry: float | None = None,
+        value: tuple[int, int] = INK,
+    ) -> Bounds | None:
+        """
+        Stroke all segments of a polyline, or stamp its only point. Returns the
+        union of the dirty bounds.
+        """
+        if len(points) == 1:
+            return self.stamp(*points[0], rx, ry, value)
+
+        dirty = None
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            bounds = self.stroke(x0, y0, x1, y1, rx, ry, value)
+            if bounds is not None:
+                dirty = bounds if dirty is None else union_bounds(dirty, bounds)
+        return dirty
+
+    def stroke(
+        self,
+        x0: float,
+        y0: float,
+        x1: float,
+        y1: float,
+        rx: float,
+        ry: float | None = None,
+        value: tuple[int, int] = INK,
+    ) -> Bounds | None:
+        """
+        Stamp a round-capped capsule from (x0, y0) to (x1, y1), i.e. the area
+        swept by an elliptical pen with the radii `rx` and `ry` moving along
+        the segment. Returns the dirty bounds as (xmin, ymin, xmax, ymax) in
+        pixels, or None if nothing was drawn.
+        """
+        if ry is None:
+            ry = rx
+        rx = max(rx, MIN_RADIUS)
+        ry = max(ry, MIN_RADIUS)
+
+        # Clip the bounding box of the capsule to the buffer
+        xmin = max(floor(min(x0, x1) - rx), 0)
+        xmax = min(ceil(max(x0, x1) + rx), self.width)
+        ymin = max(floor(min(y0, y1) - ry), 0)
+        ymax = min(ceil(max(y0, y1) + ry), self.height)
+        if xmin >= xmax or ymin >= ymax:
+            return None
+
+        # Pixel centres relative to the segment start, scaled so that the pen
+        # becomes a unit circle
+        u = ((np.arange(xmin, xmax) + 0.5 - x0) / rx)[np.newaxis, :]
+        v = ((np.arange(ymin, ymax) + 0.5 - y0) / ry)[:, np.newaxis]
+        dx = (x1 - x0) / rx
+        dy = (y1 - y0) / ry
+        length_sq = dx * dx + dy * dy
+        if length_sq > 0:
+            t = np.clip((u * dx + v * dy) / length_sq, 0, 1)
+            u = u - t * dx
+            v = v - t * dy
+        mask = u * u + v * v <= 1
+        if not mask.any():
+            return None
+
+        # Rows are stored top down, flip the mask to match
+        rows = slice(self.height - ymax, self.height - ymin)
+        self.pixels[rows, xmin:xmax][mask[::-1]] = value
+        self.version += 1
+        return xmin, ymin, xmax, ymax
@@ -0,0 +1,340 @@
+"""
+Replay recorded drawing sessions without Glyphs and measure their latency.
+
+    python3 -m scrawl.replay data/sessions/*.json
+
+The replay handles each event like the tool does: it collects the pointer
+samples of a stroke and draws them at most once per display frame, adds the
+finished stroke to the undo history and takes a snapshot for saving. The time
+this takes is the latency of the event. Drawing that the tool defers to the
+next frame is measured as "frame" events.
+
+Snapshots are taken and encoded like the tool does it, after the same delay
+for more strokes: as patches of the tiles that changed, and the whole scrawl
+when the patches have grown too large and drawing pauses. The encoding time is
+reported separately, as it doesn't hold up drawing in the tool.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from os.path import basename
+from time import perf_counter
+from typing import Dict, List, Sequence
+
+from scrawl.journal import Stroke, StrokeJournal
+from scrawl.model import encode_snapshot, snapshot_scrawl, stored_patch_base
+from scrawl.raster import pen_radii, pen_value
+from scrawl.report import USERDATA_LIMIT
+from scrawl.saver import DEFAULT_DELAY, DEFAULT_MAX_DELAY
+from scrawl.session import DOWN, DRAG, FILL, UP, SessionCanvas, SessionEvent, \
+    load_session
+from scrawl.stroke import StrokeInput
+from scrawl.throttle import DEFAULT_FPS, FrameThrottle
+from scrawl.tiles import TiledBuffer
+from scrawl.timing import percentile
+
+# Drawing that was deferred to the next display frame
+FRAME = "frame"
+# Like the tool
+JOURNAL_LIMIT = USERDATA_LIMIT // 4
+COMPACT_DELAY = 3.0
+
+
+class ReplayStats:
+    def __init__(self) -> None:
+        # Seconds per event, by event kind
+        self.latencies: Dict[str, List[float]] = {
+            kind: [] for kind in (DOWN, DRAG, FRAME, UP, FILL)
+        }
+        self.saves = 0
+        # Saves that were patches
+        self.patches = 0
+        self.encode_time = 0.0
+        self.saved_bytes = 0
+
+
+class SessionReplay:
+    """
+    Replays the events of one canvas of a session into `stats`.
+    """
+
+    def __init__(
+        self, canvas: SessionCanvas, stats: ReplayStats, fps: float = DEFAULT_FPS
+    ) -> None:
+        self.session = canvas
+        self.stats = stats
+        self.pixel_size = canvas.pixel_size
+        self.pixel_ratio = canvas.pixel_ratio
+        self.data = TiledBuffer(canvas.width, canvas.height)
+        self.journal = StrokeJournal(self.data, self.pixel_size)
+        self.stroke_input = StrokeInput()
+        # Time runs as recorded
+        self.now = 0.0
+        self.stroke_throttle = FrameThrottle(fps, clock=lambda: self.now)
+        self.stroke_pending = False
+        # The event whose pen draws deferred samples
+        self.last_event = None
+        self.filling = False
+        self.needs_save = False
+        # Position of the canvas, it moves when the canvas grows
+        self.origin = (0.0, 0.0)
+        # Snapshot waiting for the encoder, and when it was first and last
+        # submitted
+        self.pending_save = None
+        # What the next save can be a patch of, see scrawl.patches
+        self.patch_base = None
+        # The tile versions of the whole scrawl waiting to be encoded
+        self.full_save_pending = None
+        # When to save the whole scrawl to remove the patches
+        self.compact_time = None
+
+    def run(self) -> None:
+        for event in self.session.events:
+            self.now = event.time
+            self.catch_up()
+            start = perf_counter()
+            self.handle(event)
+            self.stats.latencies[event.kind].append(perf_counter() - start)
+        if self.stroke_pending:
+            self.flush_stroke()
+        self.encode_pending()
+
+    def catch_up(self) -> None:
+        # Do what the tool would have done by now between events
+        throttle = self.stroke_throttle
+        if self.stroke_pending and (
+            self.now >= throttle.last_update + throttle.interval
+        ):
+            self.flush_stroke()
+        if self.pending_save is not None:
+            _, first, last = self.pending_save
+            if self.now >= min(last + DEFAULT_DELAY, first + DEFAULT_MAX_DELAY):
+                self.encode_pending()
+        if self.compact_time is not None and self.now >= self.compact_time:
+            self.compact_time = None
+            if self.needs_compaction():
+                self.save_scrawl(compact=True)
+
+    def flush_stroke(self) -> None:
+        start = perf_counter()
+        self.stroke_pending = False
+        self.stroke_throttle.trigger()
+        self.draw_pending_stroke()
+        self.stats.latencies[FRAME].append(perf_counter() - start)
+
+    def handle(self, event: SessionEvent) -> None:
+        location = None if event.x is None else (event.x, event.y)
+        self.stroke_input.smooth = event.smooth
+        if event.kind == FILL:
+            self.filling = True
+            self.fill_area(location, event)
+        elif event.kind == DOWN:
+            self.stroke_input.begin(*location, event.time)
+            self.set_pixel([location], event)
+        elif event.kind == DRAG:
+            if self.filling or location is None:
+                return
+
+            self.stroke_input.add(*location, event.time)
+            if self.stroke_throttle.poll() == 0:
+                self.draw_pending_stroke(event)
+            else:
+                self.stroke_pending = True
+        elif event.kind == UP:
+            if self.filling:
+                self.filling = False
+                return
+
+            if location is not None:
+                self.stroke_input.add(*location, event.time)
+            self.stroke_pending = False
+            self.draw_pending_stroke(event, final=True)
+            if self.needs_save:
+                self.journal.append(Stroke(
+                    tuple(self.stroke_input.path),
+                    event.pen_size,
+                    self.pixel_ratio,
+                    event.erase,
+                    self.stroke_input.smooth,
+                ), self.data)
+            self.stroke_input.reset()
+            if self.needs_save:
+                self.save_scrawl()
+
+    def set_pixel(self, points, event: SessionEvent) -> None:
+        rx, ry = pen_radii(
+            event.pen_size, self.pixel_size, self.pixel_ratio, self.pixel_ratio
+        )
+        self.data.polyline(points, rx, ry, pen_value(event.erase))
+        self.needs_save = True
+        self.last_event = event
+
+    def draw_pending_stroke(
+        self, event: SessionEvent | None = None, final: bool = False
+    ) -> None:
+        points = self.stroke_input.take(final)
+        if points:
+            self.set_pixel(points, event or self.last_event)
+
+    def fill_area(self, location, event: SessionEvent) -> None:
+        box = (0, 0, self.data.width, self.data.height)
+        if self.data.fill(*location, pen_value(event.erase), box) is None:
+            return
+
+        self.journal.append(Stroke(
+            (location, box[:2], box[2:]),
+            event.pen_size,
+            self.pixel_ratio,
+            event.erase,
+            fill=True,
+        ), self.data)
+        self.save_scrawl()
+
+    def save_scrawl(self, compact: bool = False) -> None:
+        size = self.data.width, self.data.height
+        shift_x, shift_y = self.data.grow_to_fit()
+        if shift_x or shift_y or size != (self.data.width, self.data.height):
+            self.stroke_input.reset()
+            self.journal.move(
+                shift_x, shift_y, self.data.width, self.data.height
+            )
+            x, y = self.origin
+            self.origin = (
+                x - shift_x * self.pixel_size,
+                y - shift_y * self.pixel_size * self.pixel_ratio,
+            )
+        self.needs_save = False
+        snapshot, versions = snapshot_scrawl(
+            self.data,
+            self.journal.snapshot(),
+            self.origin,
+            self.pixel_size,
+            self.pixel_ratio,
+            None if compact or self.full_save_pending is not None
+            else self.patch_base,
+        )
+        if snapshot is None:
+            return
+
+        if snapshot.plan is None:
+            self.full_save_pending = versions
+        first = self.now if self.pending_save is None else self.pending_save[1]
+        self.pending_save = ((snapshot, versions), first, self.now)
+
+    def needs_compaction(self) -> bool:
+        return self.patch_base is not None and \
+            self.patch_base.needs_compaction and \
+            self.full_save_pending is None
+
+    def encode_pending(self) -> None:
+        if self.pending_save is None:
+            return
+
+        (snapshot, versions), _, _ = self.pending_save
+        self.pending_save = None
+        start = perf_counter()
+        result = encode_snapshot(snapshot, JOURNAL_LIMIT)
+        self.stats.encode_time += perf_counter() - start
+        self.stats.saves += 1
+        self.stats.saved_bytes += len(result.data) + len(result.journal or b"")
+        # What the tool does when it writes the result
+        if result.rect is None:
+            self.stats.patches += 1
+            self.patch_base = self.patch_base.patched(
+                len(result.data), versions, result.digest
+            )
+        elif versions is self.full_save_pending:
+            self.full_save_pending = None
+            self.patch_base = stored_patch_base(
+                result.data,
+                result.rect,
+                None,
+                result.digest,
+                versions,
+                snapshot.origin,
+                self.pixel_size,
+                self.pixel_ratio,
+            )
+        if self.needs_compaction():
+            self.compact_time = self.now + COMPACT_DELAY
+
+
+def replay_session(
+    canvases: Sequence[SessionCanvas], fps: float = DEFAULT_FPS, repeat: int = 1
+) -> ReplayStats:
+    stats = ReplayStats()
+    for _ in range(repeat):
+        for canvas in canvases:
+            SessionReplay(canvas, stats, fps).run()
+    return stats
+
+
+def format_replay_report(stats: ReplayStats, repeat: int = 1) -> str:
+    lines = [
+        f"{'Event':<8} {'Count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+        f"{'max ms':>8}"
+    ]
+    for kind, latencies in stats.latencies.items():
+        if not latencies:
+            continue
+
+        lines.append(
+            f"{kind:<8} {len(latencies) // repeat:>7}"
+            + "".join(
+                f" {percentile(latencies, fraction) * 1000:>8.3f}"
+                for fraction in (0.5, 0.9, 0.99, 1.0)
+            )
+        )
+    saves = stats.saves // repeat
+    encode_time = stats.encode_time / repeat
+    per_save = encode_time / saves * 1000 if saves else 0
+    patches = stats.patches // repeat
+    lines.append(
+        f"Encode: {saves} saves ({patches} patches), "
+        f"{encode_time * 1000:.1f} ms total "
+        f"({per_save:.2f} ms per save), {stats.saved_bytes // repeat} bytes"
+    )
+    return "\n".join(lines)
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded Scrawl drawing sessions and report their "
+        "latency."
+    )
+    parser.add_argument("sessions", nargs="+", help="Session files (.json)")
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=DEFAULT_FPS,
+        help=f"Display frame rate (default: {DEFAULT_FPS:g})",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1,
+        help="Replay each session this many times (default: 1)",
+    )
+    options = parser.parse_args(args)
+    errors = 0
+    for path in options.sessions:
+        try:
+            canvases = load_session(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: {path}: {e}", file=sys.stderr)
+            errors += 1
+            continue
+
+        stats = replay_session(canvases, options.fps, options.repeat)
+        print(f"{basename(path)}:")
+        print(format_replay_report(stats, options.repeat))
+        print()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
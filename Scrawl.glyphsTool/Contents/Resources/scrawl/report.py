@@ -0,0 +1,55 @@
+"""
+Plain text reports about stored scrawl data.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Tuple
+
+# Older Glyphs versions could not save more than this in a layer's userData
+USERDATA_LIMIT = 2 ** 16
+
+SizeRow = Tuple[str, str, int, int]
+LimitRow = Tuple[str, int]
+
+
+def format_size_report(rows: Iterable[SizeRow]) -> str:
+    """
+    Format a table of (layer name, stored format, stored size, size in the
+    current format) rows, with a total line at the end.
+    """
+    lines = [
+        f"{'Layer':<32} {'Format':<7} {'Stored':>9} {'New':>9} {'Saved':>7}"
+    ]
+    total_old = total_new = 0
+    for name, fmt, old_size, new_size in rows:
+        total_old += old_size
+        total_new += new_size
+        lines.append(_format_row(name, fmt, old_size, new_size))
+    lines.append(_format_row("Total", "", total_old, total_new, check=False))
+    return "\n".join(lines)
+
+
+def format_limit_report(
+    rows: Iterable[LimitRow], limit: int = USERDATA_LIMIT
+) -> str:
+    """
+    Format a table of (layer name, size) rows, with the size as a part of the
+    userData limit.
+    """
+    lines = [f"{'Layer':<32} {'Size':>9} {'Limit':>7}"]
+    for name, size in rows:
+        lines.append(f"{name[:32]:<32} {size:>9} {size / limit:>7.0%}")
+    return "\n".join(lines)
+
+
+def _format_row(
+    name: str, fmt: str, old_size: int, new_size: int, check: bool = True
+) -> str:
+    saved = 1 - new_size / old_size if old_size else 0
+    # Mark layers that exceed the userData limit
+    flag = " !" if check and old_size > USERDATA_LIMIT else ""
+    return (
+        f"{name[:32]:<32} {fmt:<7} {old_size:>9} {new_size:>9} {saved:>7.1%}"
+        f"{flag}"
+    )
@@ -0,0 +1,173 @@
+"""
+Encode scrawls on a background thread.
+
+The tool submits a snapshot of the canvas at the end of each stroke. A worker
+thread waits a moment for more strokes on the same layer, so that several
+strokes in quick succession are encoded and written only once, then encodes
+the latest snapshot. Results are handed back through `drain`, which the tool
+calls on the main thread to write the data into the layer. A snapshot that
+can't be encoded is delivered as an `EncodeError`.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Tuple
+
+# Wait this long after a stroke for the next one before encoding
+DEFAULT_DELAY = 0.5
+# But don't put off the encoding longer than this while strokes keep coming
+DEFAULT_MAX_DELAY = 2.0
+
+
+class EncodeError(NamedTuple):
+    # Delivered instead of the data when encoding a snapshot failed
+    error: Exception
+
+
+class SaveJob:
+    def __init__(self, key: Hashable, snapshot: Any, context: Any) -> None:
+        self.key = key
+        self.snapshot = snapshot
+        # Anything the caller needs to write the result, e.g. layer and rect
+        self.context = context
+        self.first_submit = self.last_submit = monotonic()
+        self.cancelled = False
+
+
+class BackgroundSaver:
+    """
+    Encode snapshots with `encode` on a worker thread, at most one job per key
+    at a time. `notify` is called on the worker thread whenever a result is
+    ready; it should arrange for `drain` to be called on the main thread,
+    which passes each result to `deliver(key, context, data)`.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[Any], Any],
+        deliver: Callable[[Hashable, Any, Any], None],
+        notify: Callable[[], None] | None = None,
+        delay: float = DEFAULT_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ) -> None:
+        self.encode = encode
+        self.deliver = deliver
+        self.notify = notify
+        self.delay = delay
+        self.max_delay = max_delay
+        self._pending: Dict[Hashable, SaveJob] = {}
+        self._running: SaveJob | None = None
+        self._results: List[Tuple[SaveJob, Any]] = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, key: Hashable, snapshot: Any, context: Any = None) -> None:
+        """
+        Queue a snapshot for encoding, replacing a queued snapshot of the same
+        key that has not been started yet.
+        """
+        with self._condition:
+            job = self._pending.get(key)
+            if job is None:
+                self._pending[key] = SaveJob(key, snapshot, context)
+            else:
+                job.snapshot = snapshot
+                job.context = context
+                job.last_submit = monotonic()
+            self._start()
+            self._condition.notify_all()
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Forget queued and running jobs for a key, e.g. when its scrawl was
+        deleted. Results that are already waiting are dropped, too.
+        """
+        with self._condition:
+            self._pending.pop(key, None)
+            if self._running is not None and self._running.key == key:
+                self._running.cancelled = True
+            for job, _ in self._results:
+                if job.key == key:
+                    job.cancelled = True
+
+    def has_pending(self) -> bool:
+        with self._condition:
+            return bool(self._pending or self._running or self._results)
+
+    def flush(self) -> None:
+        """
+        Encode all queued snapshots right away on the calling thread and
+        deliver all results, including those of snapshots that are submitted
+        while delivering. Call this on the main thread.
+        """
+        while True:
+            with self._condition:
+                while self._running is not None:
+                    self._condition.wait()
+                jobs = list(self._pending.values())
+                self._pending.clear()
+                if not jobs and not self._results:
+                    return
+
+            results = [(job, self._encode(job)) for job in jobs]
+            with self._condition:
+                self._results.extend(results)
+            self.drain()
+
+    def drain(self) -> None:
+        """
+        Deliver the results that are ready. Call this on the main thread.
+        """
+        with self._condition:
+            results = self._results
+            self._results = []
+        for job, data in results:
+            if not job.cancelled:
+                self.deliver(job.key, job.context, data)
+
+    def _encode(self, job: SaveJob) -> Any:
+        try:
+            return self.encode(job.snapshot)
+        except Exception as e:
+            return EncodeError(e)
+
+    def _start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._work, name="Scrawl encoder", daemon=True
+            )
+            self._thread.start()
+
+    def _next_job(self) -> SaveJob | None:
+        # Called with the lock held. Returns a job that is due, or None after
+        # waiting until the earliest one will be.
+        now = monotonic()
+        wait = None
+        for job in self._pending.values():
+            due = min(
+                job.last_submit + self.delay, job.first_submit + self.max_delay
+            )
+            if due <= now:
+                return self._pending.pop(job.key)
+            wait = due - now if wait is None else min(wait, due - now)
+        self._condition.wait(wait)
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                job = self._next_job()
+                if job is None:
+                    continue
+                self._running = job
+
+            data = self._encode(job)
+            with self._condition:
+                self._running = None
+                self._results.append((job, data))
+                self._condition.notify_all()
+            if self.notify is not None:
+                self.notify()
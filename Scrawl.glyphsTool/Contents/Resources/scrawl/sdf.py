@@ -0,0 +1,270 @@
+"""
+Smooth edges for scrawls drawn at high zoom.
+
+Scrawl pixels are drawn without interpolation, so when zoomed in, a scrawl
+with a coarse pixel size turns into large squares. In smooth mode, a signed
+distance field of the scrawl is built once per stored data: for each pixel,
+the distance from its center to the nearest edge of the ink, negative inside.
+Interpolating the field between pixel centers and cutting it at zero gives
+round, anti-aliased edges instead of steps, at any scale.
+
+The field is rendered in tiles a few times larger than the scrawl pixels they
+cover, one factor per zoom step, which are then drawn with interpolation.
+Only the tiles in view are rendered, so the factor doesn't depend on the size
+of the scrawl. Fields and tiles are cached like decoded images, by layer and
+by a hash of the data.
+"""
+
+
+from __future__ import annotations
+
+import numpy as np
+
+from math import ceil, floor, hypot
+from struct import Struct
+from typing import Any, Callable, Hashable, List, NamedTuple, Tuple
+
+from scrawl.cache import DecodedImageCache
+from scrawl.geometry import Rect
+from scrawl.model import PLUGIN_ID
+from scrawl.raster import ScrawlBuffer
+from scrawl.tiles import TiledBuffer
+from scrawl.timing import SMOOTH, timings
+
+SMOOTH_DEFAULTS_KEY = f"{PLUGIN_ID}.smoothEdges"
+# Distances are only needed near the edges, in scrawl pixels
+SDF_SPREAD = 2.0
+# Smooth edges once a scrawl pixel covers this many screen pixels
+MIN_SMOOTH_SCALE = 2.0
+MAX_SMOOTH_FACTOR = 16
+# Scrawl pixels per side of a rendered tile
+SMOOTH_TILE_SIZE = 64
+SDF_CACHE_BYTES = 32 * 1024 * 1024
+SMOOTH_CACHE_BYTES = 64 * 1024 * 1024
+CANVAS_DIGEST = Struct(">QQ")
+
+
+class SmoothTile(NamedTuple):
+    buffer: ScrawlBuffer
+    # Pixels of the buffer per scrawl pixel, in each direction
+    factor: int
+    # The scrawl pixels it covers, from the lower left corner of the scrawl
+    rect: Rect
+    # Whatever the plugins need to draw the buffer
+    image: Any = None
+
+
+def distance_field(
+    buffer: ScrawlBuffer, spread: float = SDF_SPREAD
+) -> np.ndarray:
+    """
+    Return the signed distance of each pixel center of a buffer to the edge
+    of its ink, in pixels, clamped to `spread`. Rows are top down, like the
+    pixels. Outside of the buffer counts as clear.
+    """
+    height, width = buffer.height, buffer.width
+    radius = ceil(spread + 0.5)
+    # Paper that erased ink in old scrawls is not ink
+    ink = buffer.ink_mask()
+    padded = np.zeros((height + 2 * radius, width + 2 * radius), dtype=bool)
+    padded[radius:radius + height, radius:radius + width] = ink
+    far = np.float32(spread + 0.5)
+    to_ink = np.full((height, width), far, dtype=np.float32)
+    to_clear = np.full((height, width), far, dtype=np.float32)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            distance = np.float32(hypot(dx, dy))
+            if distance > radius:
+                continue
+
+            shifted = padded[
+                radius + dy:radius + dy + height,
+                radius + dx:radius + dx + width,
+            ]
+            np.minimum(to_ink, np.where(shifted, distance, far), out=to_ink)
+            np.minimum(to_clear, np.where(shifted, far, distance), out=to_clear)
+    # Half a pixel from the nearest center of the other kind is the edge
+    field = np.where(ink, 0.5 - to_clear, to_ink - 0.5)
+    return np.clip(field, -spread, spread).astype(np.float32)
+
+
+def _resample(field: np.ndarray, factor: int, axis: int) -> np.ndarray:
+    # Linear interpolation of `factor` samples per pixel along an axis; the
+    # field is padded with one clear pixel on each side
+    n = field.shape[axis] - 2
+    centers = (np.arange(n * factor) + 0.5) / factor - 0.5 + 1
+    low = np.floor(centers).astype(np.int64)
+    weight = (centers - low).astype(np.float32)
+    shape = [1, 1]
+    shape[axis] = len(weight)
+    weight = weight.reshape(shape)
+    return (
+        np.take(field, low, axis=axis) * (1 - weight)
+        + np.take(field, low + 1, axis=axis) * weight
+    )
+
+
+def render_field(
+    field: np.ndarray,
+    factor: int,
+    spread: float = SDF_SPREAD,
+    box: Tuple[int, int, int, int] | None = None,
+) -> ScrawlBuffer:
+    """
+    Render a distance field at `factor` times its size, with edges that are
+    anti-aliased over one pixel of the result. If `box` is given, only the
+    part of the field from (left, top) to (right, bottom) is rendered.
+    """
+    full_height, full_width = field.shape
+    left, top, right, bottom = box or (0, 0, full_width, full_height)
+    # One more pixel on each side to interpolate with, clear outside
+    part = field[max(top - 1, 0):bottom + 1, max(left - 1, 0):right + 1]
+    padded = np.pad(part, (
+        (1 if top == 0 else 0, 1 if bottom == full_height else 0),
+        (1 if left == 0 else 0, 1 if right == full_width else 0),
+    ), constant_values=np.float32(spread))
+    height, width = bottom - top, right - left
+    distance = _resample(_resample(padded, factor, 0), factor, 1)
+    pixels = np.zeros((height * factor, width * factor, 2), dtype=np.uint8)
+    alpha = np.clip(0.5 - distance * factor, 0, 1)
+    pixels[..., 1] = np.rint(alpha * 255)
+    return ScrawlBuffer(width * factor, height * factor, pixels)
+
+
+def smooth_factor(
+    screen_pixels: float, max_factor: int = MAX_SMOOTH_FACTOR
+) -> int:
+    """
+    Return by how much to enlarge a scrawl when one of its pixels covers
+    `screen_pixels` screen pixels, or 1 to draw it as it is.
+    """
+    if screen_pixels < MIN_SMOOTH_SCALE:
+        return 1
+
+    factor = 2
+    while factor < screen_pixels and factor < max_factor:
+        factor *= 2
+    return factor
+
+
+def visible_tiles(
+    rect: Rect,
+    width: int,
+    height: int,
+    visible: Rect | None = None,
+    tile_size: int = SMOOTH_TILE_SIZE,
+) -> List[Tuple[int, int]]:
+    """
+    Return the keys of the tiles of a scrawl of `width` by `height` pixels,
+    drawn in `rect`, that intersect the `visible` rect, both in font units.
+    Keys count tiles from the lower left corner.
+    """
+    columns = ceil(width / tile_size)
+    rows = ceil(height / tile_size)
+    if visible is None:
+        return [(tx, ty) for ty in range(rows) for tx in range(columns)]
+
+    x, y, w, h = rect
+    tile_width = w / width * tile_size
+    tile_height = h / height * tile_size
+    vx, vy, vw, vh = visible
+    return [
+        (tx, ty)
+        for ty in range(
+            max(floor((vy - y) / tile_height), 0),
+            min(ceil((vy + vh - y) / tile_height), rows),
+        )
+        for tx in range(
+            max(floor((vx - x) / tile_width), 0),
+            min(ceil((vx + vw - x) / tile_width), columns),
+        )
+    ]
+
+
+def render_tile(
+    field: np.ndarray,
+    factor: int,
+    tile: Tuple[int, int],
+    tile_size: int = SMOOTH_TILE_SIZE,
+) -> SmoothTile:
+    # Rows of the field are top down, tiles count from the bottom
+    height, width = field.shape
+    tx, ty = tile
+    left = tx * tile_size
+    right = min(left + tile_size, width)
+    bottom = height - ty * tile_size
+    top = max(bottom - tile_size, 0)
+    buffer = render_field(field, factor, box=(left, top, right, bottom))
+    return SmoothTile(
+        buffer, factor, (left, height - bottom, right - left, bottom - top)
+    )
+
+
+def smooth_scrawl(
+    key: Hashable,
+    digest: bytes,
+    factor: int,
+    tiles: List[Tuple[int, int]],
+    source: Callable[[], ScrawlBuffer],
+    make_image: Callable[[ScrawlBuffer], Any] | None = None,
+    build: bool = True,
+) -> List[SmoothTile] | None:
+    """
+    Return the smooth rendering of the given tiles of the scrawl of `key`,
+    whose data has the hash `digest`, at `factor`. `source` returns the
+    scrawl's buffer if its distance field is not cached. If `build` is not
+    set, None is returned unless all tiles are cached.
+    """
+    render_digest = digest + bytes([factor])
+    smooth = []
+    missing = []
+    for tile in tiles:
+        rendered = smooth_images.get((key, tile), render_digest)
+        if rendered is None:
+            missing.append(tile)
+        else:
+            smooth.append(rendered)
+    if not missing:
+        return smooth
+    if not build:
+        return None
+
+    start = timings.start()
+    field = distance_fields.get(key, digest)
+    if field is None:
+        field = distance_field(source())
+        distance_fields.put(key, digest, field, field.nbytes)
+    size = 0
+    for tile in missing:
+        rendered = render_tile(field, factor, tile)
+        if make_image is not None:
+            rendered = rendered._replace(image=make_image(rendered.buffer))
+        smooth_images.put(
+            (key, tile), render_digest, rendered, rendered.buffer.pixels.nbytes
+        )
+        smooth.append(rendered)
+        size += rendered.buffer.pixels.nbytes
+    timings.stop(SMOOTH, start, size)
+    return smooth
+
+
+def canvas_digest(canvas: TiledBuffer) -> bytes:
+    # Stands in for the hash of the data of a canvas that is being edited. It
+    # changes whenever the canvas is drawn on.
+    return CANVAS_DIGEST.pack(id(canvas), canvas.version)
+
+
+def invalidate_smooth(key: Hashable | None = None) -> None:
+    distance_fields.invalidate(key)
+    if key is None:
+        smooth_images.invalidate()
+        return
+
+    # The tiles are cached by layer and tile key
+    for tile_key in smooth_images.keys():
+        if tile_key[0] == key:
+            smooth_images.invalidate(tile_key)
+
+
+distance_fields = DecodedImageCache(SDF_CACHE_BYTES)
+smooth_images = DecodedImageCache(SMOOTH_CACHE_BYTES)
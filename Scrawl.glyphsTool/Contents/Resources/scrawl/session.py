@@ -0,0 +1,152 @@
+"""
+Record the pointer events of drawing sessions.
+
+The tool can record what the user does while drawing: each mouse down, drag,
+up and fill with its time, its position in scrawl pixels and the pen
+settings. `scrawl.replay` feeds a recorded session through the drawing and
+saving code without Glyphs, to measure how fast it is and to compare versions.
+
+Sessions are saved as JSON. A session has a part for each canvas that was
+drawn on, with the events in the order they happened.
+"""
+
+from __future__ import annotations
+
+import json
+
+from typing import Any, Dict, List, NamedTuple
+
+from scrawl.stroke import Point
+
+SESSION_VERSION = 1
+
+# Event kinds
+DOWN = "down"
+DRAG = "drag"
+UP = "up"
+FILL = "fill"
+EVENT_KINDS = (DOWN, DRAG, UP, FILL)
+
+
+class SessionEvent(NamedTuple):
+    kind: str
+    # Seconds since the first event of the session
+    time: float
+    # Position in scrawl pixels, None for a mouse up outside of the canvas
+    x: float | None
+    y: float | None
+    # Font units
+    pen_size: float
+    erase: bool
+    smooth: bool
+
+
+class SessionCanvas(NamedTuple):
+    width: int
+    height: int
+    pixel_size: float
+    pixel_ratio: float
+    events: List[SessionEvent]
+
+
+class SessionRecorder:
+    """
+    Collects the events of a session. Call `canvas` whenever the tool starts
+    drawing on another canvas; events before the first canvas are ignored.
+    """
+
+    def __init__(self) -> None:
+        self.canvases: List[SessionCanvas] = []
+        self.start_time: float | None = None
+
+    def __len__(self) -> int:
+        return sum(len(canvas.events) for canvas in self.canvases)
+
+    def canvas(
+        self, width: int, height: int, pixel_size: float, pixel_ratio: float
+    ) -> None:
+        if self.canvases and not self.canvases[-1].events:
+            # Nothing was drawn on the previous canvas
+            self.canvases.pop()
+        self.canvases.append(
+            SessionCanvas(width, height, pixel_size, pixel_ratio, [])
+        )
+
+    def record(
+        self,
+        kind: str,
+        time: float,
+        location: Point | None,
+        pen_size: float,
+        erase: bool = False,
+        smooth: bool = False,
+    ) -> None:
+        if not self.canvases:
+            return
+
+        if self.start_time is None:
+            self.start_time = time
+        x, y = (None, None) if location is None else location
+        self.canvases[-1].events.append(SessionEvent(
+            kind, time - self.start_time, x, y, pen_size, erase, smooth
+        ))
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(session_to_json(self.canvases), f, separators=(",", ":"))
+
+
+def session_to_json(canvases: List[SessionCanvas]) -> Dict[str, Any]:
+    return {
+        "version": SESSION_VERSION,
+        "canvases": [
+            {
+                "width": canvas.width,
+                "height": canvas.height,
+                "pixelSize": canvas.pixel_size,
+                "pixelRatio": canvas.pixel_ratio,
+                # One array per event, to keep the files small
+                "events": [
+                    [
+                        event.kind,
+                        round(event.time, 6),
+                        event.x,
+                        event.y,
+                        event.pen_size,
+                        int(event.erase),
+                        int(event.smooth),
+                    ]
+                    for event in canvas.events
+                ],
+            }
+            for canvas in canvases
+        ],
+    }
+
+
+def load_session(path: str) -> List[SessionCanvas]:
+    with open(path, encoding="utf-8") as f:
+        session = json.load(f)
+    if session.get("version") != SESSION_VERSION:
+        raise ValueError(
+            f"Unsupported session version: {session.get('version')}"
+        )
+
+    canvases = []
+    for canvas in session["canvases"]:
+        events = []
+        for kind, time, x, y, pen_size, erase, smooth in canvas["events"]:
+            if kind not in EVENT_KINDS:
+                raise ValueError(f"Unknown session event: {kind}")
+
+            events.append(SessionEvent(
+                kind, time, x, y, pen_size, bool(erase), bool(smooth)
+            ))
+        canvases.append(SessionCanvas(
+            canvas["width"],
+            canvas["height"],
+            canvas["pixelSize"],
+            canvas["pixelRatio"],
+            events,
+        ))
+    return canvases
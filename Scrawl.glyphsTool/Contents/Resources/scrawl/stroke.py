@@ -0,0 +1,133 @@
+"""
+Collect the pointer samples of a stroke and turn them into polylines.
+
+Tablets deliver drag events much faster than the display refreshes. Instead of
+drawing a segment for each event, the tool buffers the samples and draws all
+of them once per frame as one polyline, optionally smoothed with a Catmull-Rom
+spline through the samples.
+"""
+
+from __future__ import annotations
+
+from math import ceil, hypot
+from typing import List, NamedTuple, Tuple
+
+Point = Tuple[float, float]
+
+# Distance between the points of a smoothed segment in pixels
+DEFAULT_SPACING = 2.0
+
+
+class Sample(NamedTuple):
+    x: float
+    y: float
+    t: float
+
+
+def catmull_rom(
+    p0: Point, p1: Point, p2: Point, p3: Point, steps: int
+) -> List[Point]:
+    """
+    Return `steps` points on the uniform Catmull-Rom segment from p1 to p2,
+    excluding p1 and ending with p2.
+    """
+    points = []
+    for i in range(1, steps + 1):
+        t = i / steps
+        t2 = t * t
+        t3 = t2 * t
+        points.append(tuple(
+            0.5 * (
+                2 * b
+                + (c - a) * t
+                + (2 * a - 5 * b + 4 * c - d) * t2
+                + (3 * b - a - 3 * c + d) * t3
+            )
+            for a, b, c, d in zip(p0, p1, p2, p3)
+        ))
+    return points
+
+
+class StrokeInput:
+    """
+    Buffer for the samples of one stroke.
+
+    Every sample that is added ends up in a polyline returned by `take`, so
+    no segment is lost however far apart the samples are. With smoothing,
+    the segment to the newest sample can only be computed when the next
+    sample is known, so it is held back until then or until the stroke ends.
+    """
+
+    def __init__(
+        self, smooth: bool = False, spacing: float = DEFAULT_SPACING
+    ) -> None:
+        self.smooth = smooth
+        self.spacing = spacing
+        self.reset()
+
+    def reset(self) -> None:
+        self.samples: List[Sample] = []
+        # All sample positions of the stroke, for the journal
+        self.path: List[Point] = []
+        # Index of the sample up to which the stroke has been handed out
+        self.done = 0
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.samples)
+
+    def begin(self, x: float, y: float, t: float) -> None:
+        self.reset()
+        self.samples.append(Sample(x, y, t))
+        self.path.append((x, y))
+
+    def add(self, x: float, y: float, t: float) -> None:
+        if not self.samples:
+            self.begin(x, y, t)
+            return
+
+        last = self.samples[-1]
+        if (x, y) != (last.x, last.y):
+            self.samples.append(Sample(x, y, t))
+            self.path.append((x, y))
+
+    @property
+    def pending(self) -> bool:
+        return self.done < len(self.samples) - 1
+
+    def take(self, final: bool = False) -> List[Point]:
+        """
+        Return the polyline from the last point handed out to the newest
+        sample, or an empty list if there is nothing new to draw. Pass
+        `final=True` when the stroke ends to get the held back segment, too.
+        """
+        end = len(self.samples) - 1
+        if self.smooth and not final:
+            end -= 1
+        if end <= self.done:
+            return []
+
+        points = [self.samples[self.done][:2]]
+        for i in range(self.done, end):
+            points.extend(self._segment(i))
+        self.done = end
+        # Only the samples around the next segment are needed any more
+        drop = max(0, self.done - 1)
+        del self.samples[:drop]
+        self.done -= drop
+        return points
+
+    def _segment(self, i: int) -> List[Point]:
+        # The points after sample i up to sample i + 1
+        p1 = self.samples[i][:2]
+        p2 = self.samples[i + 1][:2]
+        if not self.smooth:
+            return [p2]
+
+        p0 = self.samples[i - 1][:2] if i > 0 else p1
+        p3 = self.samples[i + 2][:2] if i + 2 < len(self.samples) else p2
+        steps = max(1, ceil(hypot(p2[0] - p1[0], p2[1] - p1[1]) / self.spacing))
+        return catmull_rom(p0, p1, p2, p3, steps)
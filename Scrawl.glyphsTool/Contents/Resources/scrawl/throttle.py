@@ -0,0 +1,73 @@
+"""
+Limit how often an update is done to the display's frame rate.
+"""
+
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Callable
+
+DEFAULT_FPS = 60.0
+
+
+class FrameThrottle:
+    """
+    Let at most one update per frame interval through.
+
+    Call `poll` for each event. It returns 0 if an update is due now, or the
+    time in seconds until the next update may be done. The caller should then
+    schedule a deferred update and call `trigger` when doing it, so that the
+    last event is never lost.
+
+    The throttle also counts events and updates, and accumulates the time the
+    caller reports through `record`, to measure what the events cost.
+    """
+
+    def __init__(
+        self,
+        fps: float = DEFAULT_FPS,
+        clock: Callable[[], float] = perf_counter,
+    ) -> None:
+        self.clock = clock
+        self.interval = 1 / fps
+        self.last_update = None
+        self.reset_stats()
+
+    def set_fps(self, fps: float) -> None:
+        if fps > 0:
+            self.interval = 1 / fps
+
+    def reset_stats(self) -> None:
+        self.events = 0
+        self.updates = 0
+        self.busy_time = 0.0
+
+    def poll(self) -> float:
+        self.events += 1
+        now = self.clock()
+        if self.last_update is not None:
+            wait = self.last_update + self.interval - now
+            if wait > 0:
+                return wait
+
+        self.trigger(now)
+        return 0
+
+    def trigger(self, now: float | None = None) -> None:
+        self.updates += 1
+        self.last_update = self.clock() if now is None else now
+
+    def record(self, seconds: float) -> None:
+        self.busy_time += seconds
+
+    @property
+    def coalesced(self) -> int:
+        return self.events - self.updates
+
+    def summary(self) -> str:
+        per_event = self.busy_time / self.events * 1e6 if self.events else 0
+        return (
+            f"{self.events} events, {self.updates} updates "
+            f"({self.coalesced} coalesced), {self.busy_time * 1000:.1f} ms "
+            f"in handler ({per_event:.0f} µs per event)"
+        )
@@ -0,0 +1,356 @@
+"""
+Sparse scrawl canvas made of fixed-size tiles.
+
+Only tiles that have received ink are allocated, so a wide canvas with a few
+strokes needs little memory. Tiles are addressed by integer tile coordinates
+relative to the canvas origin, which may be negative: drawing outside of the
+canvas just allocates more tiles instead of reallocating the whole canvas.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from math import ceil, floor
+from typing import Dict, Iterator, Sequence, Tuple
+
+from scrawl.fill import flood_fill
+from scrawl.raster import INK, MIN_RADIUS, Bounds, ScrawlBuffer, is_ink, \
+    union_bounds
+
+TILE_SIZE = 64
+
+TileKey = Tuple[int, int]
+
+
+class TiledBuffer:
+    """
+    A scrawl canvas of nominally `width` x `height` pixels, stored as square
+    tiles of `tile_size` pixels.
+
+    Pixel coordinates have their origin in the lower left corner of the
+    canvas, like in `ScrawlBuffer`. The tile with the key (tx, ty) covers the
+    pixels from (tx * tile_size, ty * tile_size) up to, but not including,
+    ((tx + 1) * tile_size, (ty + 1) * tile_size).
+    """
+
+    def __init__(
+        self, width: int, height: int, tile_size: int = TILE_SIZE
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.tiles: Dict[TileKey, ScrawlBuffer] = {}
+        self.version = 0
+
+    @classmethod
+    def from_buffer(
+        cls, buffer: ScrawlBuffer, tile_size: int = TILE_SIZE
+    ) -> TiledBuffer:
+        """
+        Split a dense buffer into tiles, leaving out tiles that are empty.
+        """
+        tiled = cls(buffer.width, buffer.height, tile_size)
+        cols = ceil(buffer.width / tile_size)
+        rows = ceil(buffer.height / tile_size)
+        padded = tiled._padded(cols, rows)
+        # Rows are stored top down, so the padding goes on top
+        padded[rows * tile_size - buffer.height:, :buffer.width] = buffer.pixels
+        for ty in range(rows):
+            top = (rows - ty - 1) * tile_size
+            for tx in range(cols):
+                left = tx * tile_size
+                pixels = padded[top:top + tile_size, left:left + tile_size]
+                if pixels[..., 1].any():
+                    tiled.tiles[tx, ty] = ScrawlBuffer(
+                        tile_size, tile_size, pixels.copy()
+                    )
+        return tiled
+
+    def to_buffer(self) -> ScrawlBuffer:
+        """
+        Return a dense copy of the nominal canvas. Tiles outside of the canvas
+        are left out, call `grow_to_fit` first to include them.
+        """
+        size = self.tile_size
+        cols = ceil(self.width / size)
+        rows = ceil(self.height / size)
+        padded = self._padded(cols, rows)
+        for (tx, ty), tile in self.tiles.items():
+            if 0 <= tx < cols and 0 <= ty < rows:
+                top = (rows - ty - 1) * size
+                padded[top:top + size, tx * size:(tx + 1) * size] = tile.pixels
+        return ScrawlBuffer(
+            self.width,
+            self.height,
+            padded[rows * size - self.height:, :self.width],
+        )
+
+    def _padded(self, cols: int, rows: int) -> np.ndarray:
+        return np.zeros(
+            (rows * self.tile_size, cols * self.tile_size, 2), dtype=np.uint8
+        )
+
+    def __iter__(self) -> Iterator[tuple[TileKey, ScrawlBuffer]]:
+        return iter(self.tiles.items())
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(tile.pixels.nbytes for tile in self.tiles.values())
+
+    def copy(self) -> TiledBuffer:
+        other = TiledBuffer(self.width, self.height, self.tile_size)
+        other.tiles = {key: tile.copy() for key, tile in self.tiles.items()}
+        return other
+
+    def clear(self) -> None:
+        self.tiles.clear()
+        self.version += 1
+
+    def prune(self) -> None:
+        """
+        Release tiles that no longer contain ink.
+        """
+        empty = [
+            key for key, tile in self.tiles.items() if not tile.has_ink()
+        ]
+        for key in empty:
+            del self.tiles[key]
+
+    def move_tiles(self, dx: int, dy: int) -> None:
+        """
+        Move the drawing relative to the canvas origin by whole tiles.
+        """
+        if dx or dy:
+            self.tiles = {
+                (tx + dx, ty + dy): tile for (tx, ty), tile in self.tiles.items()
+            }
+            self.version += 1
+
+    def crop(
+        self, txmin: int, tymin: int, txmax: int, tymax: int
+    ) -> tuple[int, int]:
+        """
+        Make the nominal canvas cover the tiles from (txmin, tymin) up to, but
+        not including, (txmax, tymax). The canvas origin moves by whole tiles
+        to (txmin, tymin); the tile keys are adjusted, but no pixels are copied.
+        Tiles outside of the new canvas are kept.
+
+        Returns by how many pixels the origin was moved right and up.
+        """
+        size = self.tile_size
+        self.move_tiles(-txmin, -tymin)
+        self.width = (txmax - txmin) * size
+        self.height = (tymax - tymin) * size
+        return txmin * size, tymin * size
+
+    def trim(self) -> tuple[int, int]:
+        """
+        Release the tiles without ink and crop the canvas to the remaining
+        tiles. A canvas without ink is left at its size.
+
+        Returns by how many pixels the origin was moved right and up.
+        """
+        self.prune()
+        if not self.tiles:
+            return 0, 0
+
+        return self.crop(
+            min(tx for tx, _ in self.tiles),
+            min(ty for _, ty in self.tiles),
+            max(tx for tx, _ in self.tiles) + 1,
+            max(ty for _, ty in self.tiles) + 1,
+        )
+
+    def grow_to_fit(self) -> tuple[int, int]:
+        """
+        Enlarge the nominal canvas so that it contains all tiles. If tiles
+        were drawn left of or below the canvas, the canvas origin moves by
+        whole tiles; the tile keys are adjusted, but no pixels are copied.
+
+        Returns by how many pixels the origin was moved left and down.
+        """
+        if not self.tiles:
+            return 0, 0
+
+        size = self.tile_size
+        shift_x = max(0, -min(tx for tx, _ in self.tiles))
+        shift_y = max(0, -min(ty for _, ty in self.tiles))
+        self.move_tiles(shift_x, shift_y)
+        self.width = max(
+            self.width + shift_x * size,
+            (max(tx for tx, _ in self.tiles) + 1) * size,
+        )
+        self.height = max(
+            self.height + shift_y * size,
+            (max(ty for _, ty in self.tiles) + 1) * size,
+        )
+        return shift_x * size, shift_y * size
+
+    def stamp(
+        self,
+        x: float,
+        y: float,
+        rx: float,
+        ry: float | None = None,
+        value: tuple[int, int] = INK,
+    ) -> Bounds | None:
+        return self.stroke(x, y, x, y, rx, ry, value)
+
+    def polyline(
+        self,
+        points: Sequence[tuple[float, float]],
+        rx: float,
+        ry: float | None = None,
+        value: tuple[int, int] = INK,
+    ) -> Bounds | None:
+        """
+        Stroke all segments of a polyline, or stamp its only point. Returns the
+        union of the dirty bounds.
+        """
+        if len(points) == 1:
+            return self.stamp(*points[0], rx, ry, value)
+
+        dirty = None
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            bounds = self.stroke(x0, y0, x1, y1, rx, ry, value)
+            if bounds is not None:
+                dirty = bounds if dirty is None else union_bounds(dirty, bounds)
+        return dirty
+
+    def stroke(
+        self,
+        x0: float,
+        y0: float,
+        x1: float,
+        y1: float,
+        rx: float,
+        ry: float | None = None,
+        value: tuple[int, int] = INK,
+    ) -> Bounds | None:
+        """
+        Like `ScrawlBuffer.stroke`, but not limited to the canvas size. Tiles
+        are allocated as needed when drawing ink; drawing anything else only
+        touches tiles that already exist.
+        """
+        if ry is None:
+            ry = rx
+        size = self.tile_size
+        allocate = is_ink(value)
+        # The same bounding box that ScrawlBuffer.stroke uses, in tiles
+        txmin = floor((min(x0, x1) - max(rx, MIN_RADIUS)) / size)
+        txmax = floor((max(x0, x1) + max(rx, MIN_RADIUS)) / size)
+        tymin = floor((min(y0, y1) - max(ry, MIN_RADIUS)) / size)
+        tymax = floor((max(y0, y1) + max(ry, MIN_RADIUS)) / size)
+        dirty = None
+        for ty in range(tymin, tymax + 1):
+            for tx in range(txmin, txmax + 1):
+                tile = self.tiles.get((tx, ty))
+                if tile is None:
+                    if not allocate:
+                        continue
+                    tile = ScrawlBuffer(size, size)
+                ox = tx * size
+                oy = ty * size
+                bounds = tile.stroke(
+                    x0 - ox, y0 - oy, x1 - ox, y1 - oy, rx, ry, value
+                )
+                if bounds is None:
+                    continue
+
+                self.tiles[tx, ty] = tile
+                bounds = (
+                    bounds[0] + ox, bounds[1] + oy,
+                    bounds[2] + ox, bounds[3] + oy
+                )
+                dirty = bounds if dirty is None else union_bounds(dirty, bounds)
+        if dirty is not None:
+            self.version += 1
+        return dirty
+
+    def fill(
+        self,
+        x: float,
+        y: float,
+        value: tuple[int, int] = INK,
+        box: Bounds | None = None,
+    ) -> Bounds | None:
+        """
+        Fill the area around the pixel at (x, y) that is either all ink or all
+        not ink with `value`, e.g. fill a counter with ink or clear a blob of
+        ink. The fill stays inside `box` (xmin, ymin, xmax, ymax), which is the
+        nominal canvas by default. Returns the dirty bounds.
+        """
+        if box is None:
+            box = (0, 0, self.width, self.height)
+        xmin, ymin, xmax, ymax = box
+        if xmin >= xmax or ymin >= ymax:
+            return None
+
+        ink = np.zeros((ymax - ymin, xmax - xmin), dtype=bool)
+        for key, (x0, y0, x1, y1), rows, cols in self._overlaps(box):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                ink[y0 - ymin:y1 - ymin, x0 - xmin:x1 - xmin] = tile.ink_mask(
+                )[rows, cols][::-1]
+
+        sx = floor(x) - xmin
+        sy = floor(y) - ymin
+        if not (0 <= sx < xmax - xmin and 0 <= sy < ymax - ymin):
+            return None
+
+        seed_ink = bool(ink[sy, sx])
+        if seed_ink == is_ink(value):
+            # Filling ink with ink or paper with paper changes nothing
+            return None
+
+        filled = flood_fill(ink if seed_ink else ~ink, sx, sy)
+        allocate = is_ink(value)
+        for key, (x0, y0, x1, y1), rows, cols in self._overlaps(box):
+            mask = filled[y0 - ymin:y1 - ymin, x0 - xmin:x1 - xmin]
+            if not mask.any():
+                continue
+
+            tile = self.tiles.get(key)
+            if tile is None:
+                if not allocate:
+                    continue
+                tile = self.tiles[key] = ScrawlBuffer(
+                    self.tile_size, self.tile_size
+                )
+            if mask.all():
+                tile.pixels[rows, cols] = value
+            else:
+                tile.pixels[rows, cols][mask[::-1]] = value
+            tile.version += 1
+        self.version += 1
+
+        ys = np.flatnonzero(filled.any(axis=1))
+        xs = np.flatnonzero(filled.any(axis=0))
+        return (
+            xmin + int(xs[0]),
+            ymin + int(ys[0]),
+            xmin + int(xs[-1]) + 1,
+            ymin + int(ys[-1]) + 1,
+        )
+
+    def _overlaps(
+        self, box: Bounds
+    ) -> Iterator[tuple[TileKey, Bounds, slice, slice]]:
+        # For each tile position that intersects the box, the intersection in
+        # canvas pixels and the rows and columns of the tile it covers
+        size = self.tile_size
+        xmin, ymin, xmax, ymax = box
+        for ty in range(floor(ymin / size), ceil(ymax / size)):
+            y0 = max(ymin, ty * size)
+            y1 = min(ymax, (ty + 1) * size)
+            # Rows are stored top down
+            rows = slice(size - (y1 - ty * size), size - (y0 - ty * size))
+            for tx in range(floor(xmin / size), ceil(xmax / size)):
+                x0 = max(xmin, tx * size)
+                x1 = min(xmax, (tx + 1) * size)
+                cols = slice(x0 - tx * size, x1 - tx * size)
+                yield (tx, ty), (x0, y0, x1, y1), rows, cols
@@ -0,0 +1,188 @@
+"""
+Timing of the hot paths of the tool and the reporter.
+
+Drawing, loading, encoding, writing and drawing scrawls in the reporter are
+timed with `timings`, shared by both plugins:
+
+    start = timings.start()
+    ...
+    timings.stop(DRAW, start, size)
+
+While timing is off, `start` returns None and `stop` returns right away, so
+the calls can stay in the code. The samples are kept in a ring buffer of
+fixed size; when it's full, the oldest samples are overwritten.
+
+From the Macro panel:
+
+    from scrawl.timing import timings
+    timings.enabled = True
+    ...
+    print(timings.report())
+    timings.save("/path/to/timings.json")
+"""
+
+from __future__ import annotations
+
+import json
+import numpy as np
+
+from math import ceil
+from threading import Lock
+from time import perf_counter
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+TIMINGS_VERSION = 1
+DEFAULT_CAPACITY = 16384
+
+# Operations
+# Drawing a stroke segment or a dot on the canvas
+DRAW = "draw"
+FLOOD_FILL = "fill"
+# Loading the scrawl of a layer into the tool, bytes decoded
+LOAD = "load"
+# Encoding a snapshot on the encoder thread, bytes encoded
+ENCODE = "encode"
+# Storing the encoded data in the layer
+WRITE = "write"
+# Drawing a layer in the reporter, and decoding its data if it's not cached
+REPORTER_DRAW = "reporter-draw"
+REPORTER_DECODE = "reporter-decode"
+# Compositing the scrawls of the other masters, bytes of the composite
+ONION_SKIN = "onion-skin"
+# Building the smooth rendering of a scrawl, bytes of the rendering
+SMOOTH = "smooth"
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    # Nearest rank
+    if not len(values):
+        return 0.0
+
+    ordered = sorted(values)
+    return float(ordered[max(0, ceil(fraction * len(ordered)) - 1)])
+
+
+class OperationStats(NamedTuple):
+    count: int
+    # Seconds
+    p50: float
+    p95: float
+    p99: float
+    max: float
+    total: float
+    # Bytes encoded or decoded
+    size: int
+
+
+class Timings:
+    """
+    Ring buffer of (operation, seconds, bytes) samples.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.enabled = False
+        self.capacity = capacity
+        self._lock = Lock()
+        # Operation names, the buffer holds their index
+        self._operations: List[str] = []
+        self._operation = np.zeros(capacity, dtype=np.int16)
+        self._seconds = np.zeros(capacity, dtype=np.float64)
+        self._size = np.zeros(capacity, dtype=np.int64)
+        # Samples taken since the last reset, including overwritten ones
+        self.count = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.count = 0
+
+    def start(self) -> float | None:
+        return perf_counter() if self.enabled else None
+
+    def stop(self, operation: str, start: float | None, size: int = 0) -> None:
+        if start is None:
+            return
+
+        self.record(operation, perf_counter() - start, size)
+
+    def record(self, operation: str, seconds: float, size: int = 0) -> None:
+        # Also called from the encoder thread
+        with self._lock:
+            try:
+                code = self._operations.index(operation)
+            except ValueError:
+                code = len(self._operations)
+                self._operations.append(operation)
+            i = self.count % self.capacity
+            self._operation[i] = code
+            self._seconds[i] = seconds
+            self._size[i] = size
+            self.count += 1
+
+    def stats(self) -> Dict[str, OperationStats]:
+        with self._lock:
+            n = len(self)
+            operation = self._operation[:n].copy()
+            seconds = self._seconds[:n].copy()
+            size = self._size[:n].copy()
+            operations = list(self._operations)
+        stats = {}
+        for code, name in enumerate(operations):
+            mask = operation == code
+            if not mask.any():
+                continue
+
+            times = np.sort(seconds[mask])
+            stats[name] = OperationStats(
+                len(times),
+                percentile(times, 0.5),
+                percentile(times, 0.95),
+                percentile(times, 0.99),
+                float(times[-1]),
+                float(times.sum()),
+                int(size[mask].sum()),
+            )
+        return stats
+
+    def report(self) -> str:
+        return format_timing_report(self.stats(), self.count - len(self))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "version": TIMINGS_VERSION,
+            "samples": len(self),
+            "dropped": self.count - len(self),
+            "operations": {
+                name: stats._asdict() for name, stats in self.stats().items()
+            },
+        }
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+
+def format_timing_report(
+    stats: Dict[str, OperationStats], dropped: int = 0
+) -> str:
+    lines = [
+        f"{'Operation':<16} {'Count':>7} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'max ms':>8} {'Bytes':>10}"
+    ]
+    for name, op in stats.items():
+        lines.append(
+            f"{name:<16} {op.count:>7}"
+            + "".join(
+                f" {seconds * 1000:>8.3f}"
+                for seconds in (op.p50, op.p95, op.p99, op.max)
+            )
+            + f" {op.size:>10}"
+        )
+    if dropped:
+        lines.append(f"{dropped} older samples were overwritten.")
+    return "\n".join(lines)
+
+
+timings = Timings()
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# Convert the point lists of the earliest Scrawl versions in .glyphs files.
+# Run with --help for options.
+
+import sys
+
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, join(
+    dirname(abspath(__file__)), "..", "Scrawl.glyphsTool", "Contents", "Resources"
+))
+
+from scrawl.migrate import main  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+import sys
+
+from os.path import dirname, join
+
+# The scrawl package lives in the tool's bundle
+sys.path.insert(
+    0, join(dirname(dirname(__file__)), "Scrawl.glyphsTool", "Contents", "Resources")
+)
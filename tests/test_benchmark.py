@@ -0,0 +1,24 @@
+from scrawl import blobstore
+from scrawl.benchmark import BenchmarkCase, run_benchmark
+
+
+def test_sidecar_writes_are_measured(monkeypatch):
+    writes = []
+    replace = blobstore.os.replace
+
+    def counting_replace(src, dst):
+        writes.append(dst)
+        replace(src, dst)
+
+    monkeypatch.setattr(blobstore.os, "replace", counting_replace)
+    results = run_benchmark(
+        [BenchmarkCase("dots", 600, 10, 1.0)],
+        repeat=3,
+        formats=["scrawl-tiled", "scrawl-sidecar"],
+    )
+    assert [result["format"] for result in results] == [
+        "scrawl-tiled", "scrawl-sidecar"
+    ]
+    assert results[0]["size"] == results[1]["size"]
+    # Each timed call and the memory pass write the data
+    assert len(writes) == 3 + 1
@@ -0,0 +1,66 @@
+from scrawl.cache import DigestCache, blob_hash, is_immutable
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        return blob_hash(data)
+
+
+def test_data_is_hashed_once():
+    cache = DigestCache()
+    count = Counter()
+    data = b"x" * 1000
+    assert cache.get(data, count) == blob_hash(data)
+    assert cache.get(data, count) == blob_hash(data)
+    assert count.calls == 1
+    # Equal data in another object is hashed again
+    other = bytes(bytearray(data))
+    cache.get(other, count)
+    assert count.calls == 2
+
+
+def test_data_changed_in_place():
+    cache = DigestCache()
+    data = bytearray(b"abc")
+    cache.get(data)
+    data[:] = b"xyz"
+    assert cache.get(data) == blob_hash(b"xyz")
+    data.extend(b"def")
+    assert cache.get(data) == blob_hash(b"xyzdef")
+    # Mutable data is not kept
+    assert len(cache) == 0
+
+
+class FakeData(bytes):
+    # Stands in for NSData, which copies itself unless it is mutable
+    mutable = False
+
+    def isKindOfClass_(self, cls):
+        return True
+
+    def copy(self):
+        return FakeData(self) if self.mutable else self
+
+
+def test_immutable():
+    assert is_immutable(b"abc")
+    assert not is_immutable(bytearray(b"abc"))
+    assert not is_immutable(memoryview(b"abc"))
+    data = FakeData(b"abc")
+    assert is_immutable(data)
+    data.mutable = True
+    assert not is_immutable(data)
+
+
+def test_salt_and_size_limit():
+    cache = DigestCache(max_bytes=2500)
+    data = b"x" * 1000
+    assert cache.get(data, salt=b"1") == cache.get(data, salt=b"2")
+    assert len(cache) == 2
+    cache.get(b"y" * 1000)
+    assert len(cache) == 2
+    assert cache.size <= 2500
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from scrawl.codec import ENCODING_RAW, ScrawlFormatError, blob_format, \
+    decode, decode_tiles, encode
+from scrawl.raster import ScrawlBuffer
+from scrawl.tiles import TiledBuffer
+
+
+def drawing(width=150, height=90):
+    buffer = ScrawlBuffer(width, height)
+    buffer.stroke(5, 5, width - 5, height - 5, 3)
+    buffer.stamp(20, height - 20, 6)
+    return buffer
+
+
+@pytest.mark.parametrize("encoding", [None, ENCODING_RAW])
+def test_dense_round_trip(encoding):
+    buffer = drawing()
+    data = encode(buffer) if encoding is None else encode(buffer, encoding)
+    assert blob_format(data) == "scrawl"
+    assert np.array_equal(decode(data).pixels, buffer.pixels)
+    assert np.array_equal(decode_tiles(data).to_buffer().pixels, buffer.pixels)
+
+
+def test_tiled_round_trip():
+    buffer = drawing()
+    canvas = TiledBuffer.from_buffer(buffer)
+    data = encode(canvas)
+    tiles = decode_tiles(data)
+    assert (tiles.width, tiles.height) == (150, 90)
+    assert set(tiles.tiles) == set(canvas.tiles)
+    assert np.array_equal(decode(data).pixels, buffer.pixels)
+
+
+def test_empty_tiles_are_left_out():
+    canvas = TiledBuffer(128, 64, 64)
+    canvas.tiles[1, 0] = ScrawlBuffer(64, 64)
+    canvas.stamp(10, 10, 2)
+    assert set(decode_tiles(encode(canvas)).tiles) == {(0, 0)}
+    assert set(decode_tiles(encode(canvas, keep_empty=True)).tiles) == {
+        (0, 0), (1, 0)
+    }
+
+
+def test_only_ink_is_stored():
+    buffer = ScrawlBuffer(8, 8)
+    buffer.pixels[2:4, 2:4] = (255, 255)
+    buffer.pixels[5, 5] = (0, 255)
+    decoded = decode(encode(buffer))
+    assert np.array_equal(decoded.ink_mask(), buffer.ink_mask())
+
+
+def test_corrupt_data():
+    data = encode(drawing())
+    with pytest.raises(ScrawlFormatError):
+        decode(data[:10])
+    with pytest.raises(ScrawlFormatError):
+        decode(b"XXXX" + data[4:])
+    with pytest.raises(ScrawlFormatError):
+        decode(data[:-5])
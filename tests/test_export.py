@@ -0,0 +1,77 @@
+import json
+import os
+
+from scrawl.codec import encode
+from scrawl.export import MANIFEST, export_scrawls
+from scrawl.glyphsfile import format_value
+from scrawl.model import PLUGIN_ID
+from scrawl.raster import ScrawlBuffer
+
+
+def scrawl_data(radius):
+    buffer = ScrawlBuffer(32, 32)
+    buffer.stamp(16, 16, radius)
+    return encode(buffer)
+
+
+def write_font(path, scrawls):
+    lines = ["{", "glyphs = ("]
+    for glyph, radius in scrawls.items():
+        lines += [
+            "{",
+            f"glyphname = {glyph};",
+            "layers = (",
+            "{",
+            "layerId = m01;",
+            "userData = {",
+            f"{PLUGIN_ID}.data = {format_value(scrawl_data(radius))};",
+            f"{PLUGIN_ID}.rect = (0,0,320,320);",
+            f"{PLUGIN_ID}.unit = 10;",
+            "};",
+            "}",
+            ");",
+            "},",
+        ]
+    lines += [");", "}"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def images(output_dir):
+    return sorted(name for name in os.listdir(output_dir) if name != MANIFEST)
+
+
+def test_export_writes_only_changed_images(tmp_path):
+    font = tmp_path / "A.glyphs"
+    output = tmp_path / "out"
+    write_font(font, {"a": 3, "b": 5})
+    assert export_scrawls(str(font), str(output), jobs=1) == (2, 0, [])
+    assert len(images(output)) == 2
+    write_font(font, {"a": 4, "b": 5})
+    assert export_scrawls(str(font), str(output), jobs=1) == (1, 1, [])
+    # The old image of "a" is removed
+    assert len(images(output)) == 2
+
+
+def test_export_leaves_other_files_alone(tmp_path):
+    font_a = tmp_path / "A.glyphs"
+    font_b = tmp_path / "B.glyphs"
+    output = tmp_path / "out"
+    write_font(font_a, {"a": 3})
+    write_font(font_b, {"b": 5})
+    (output / "nested").mkdir(parents=True)
+    (output / "holiday.png").write_bytes(b"not a scrawl")
+    export_scrawls(str(font_a), str(output), jobs=1)
+    export_scrawls(str(font_b), str(output), jobs=1)
+    assert "holiday.png" in images(output)
+    assert len(images(output)) == 4
+    # Deleting the scrawls of one font keeps the other font's images
+    write_font(font_a, {})
+    export_scrawls(str(font_a), str(output), jobs=1)
+    names = images(output)
+    assert "holiday.png" in names
+    assert [name for name in names if name.startswith("b-")]
+    assert not [name for name in names if name.startswith("a-")]
+    with open(output / MANIFEST, encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert [entry["font"] for entry in manifest] == ["B.glyphs"]
@@ -0,0 +1,49 @@
+from scrawl.codec import encode
+from scrawl.index import ScrawlIndex
+from scrawl.model import SCRAWL_DATA_KEY, SCRAWL_RECT_KEY, SCRAWL_UNIT_KEY
+from scrawl.raster import ScrawlBuffer
+
+
+class UserData(dict):
+    # Like the userData of a layer, missing keys are None
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __delitem__(self, key):
+        self.pop(key, None)
+
+
+class Layer:
+    def __init__(self, name):
+        self.name = name
+        self.layerId = name
+        self.parent = None
+        self.userData = UserData()
+
+
+def scrawl(layer):
+    buffer = ScrawlBuffer(16, 16)
+    buffer.stamp(8, 8, 3)
+    layer.userData[SCRAWL_DATA_KEY] = encode(buffer)
+    layer.userData[SCRAWL_RECT_KEY] = (0, 0, 160, 160)
+    layer.userData[SCRAWL_UNIT_KEY] = 10
+
+
+def test_refresh_finds_scrawls_the_index_missed():
+    layers = [Layer("a"), Layer("b")]
+    scrawl(layers[0])
+    index = ScrawlIndex(layers)
+    assert [entry.name for entry in index.select(layers)] == ["a"]
+    # A scrawl pasted into a layer after the index was built
+    scrawl(layers[1])
+    assert [entry.name for entry in index.refresh(layers)] == ["a", "b"]
+    assert len(index) == 2
+
+
+def test_refresh_forgets_removed_scrawls():
+    layer = Layer("a")
+    scrawl(layer)
+    index = ScrawlIndex([layer])
+    layer.userData.clear()
+    assert index.refresh([layer]) == []
+    assert len(index) == 0
@@ -0,0 +1,83 @@
+import numpy as np
+
+from scrawl.journal import CHECKPOINT_INTERVAL, Stroke, StrokeJournal, \
+    draw_stroke
+from scrawl.tiles import TiledBuffer
+
+PIXEL_SIZE = 2
+
+
+def stroke(i, erase=False):
+    y = 4.0 + i * 3
+    return Stroke(((4.0, y), (60.0, y + 1)), 2 * PIXEL_SIZE, 1.0, erase)
+
+
+def draw(journal, canvas, strokes):
+    for s in strokes:
+        draw_stroke(canvas, s, PIXEL_SIZE)
+        journal.append(s, canvas)
+
+
+def pixels(canvas):
+    return canvas.to_buffer().pixels
+
+
+def test_undo_and_redo():
+    canvas = TiledBuffer(128, 128)
+    journal = StrokeJournal(canvas.copy(), PIXEL_SIZE)
+    draw(journal, canvas, [stroke(0), stroke(1)])
+    after_one = TiledBuffer(128, 128)
+    draw_stroke(after_one, stroke(0), PIXEL_SIZE)
+    undone = journal.undo()
+    assert np.array_equal(pixels(undone), pixels(after_one))
+    redone = journal.redo()
+    assert np.array_equal(pixels(redone), pixels(canvas))
+    assert journal.redo() is None
+
+
+def test_new_stroke_forgets_undone_strokes():
+    canvas = TiledBuffer(128, 128)
+    journal = StrokeJournal(canvas.copy(), PIXEL_SIZE)
+    draw(journal, canvas, [stroke(0), stroke(1)])
+    canvas = journal.undo()
+    draw(journal, canvas, [stroke(5)])
+    assert not journal.can_redo
+    assert len(journal.strokes) == 2
+
+
+def test_checkpoints_give_the_same_canvas():
+    canvas = TiledBuffer(128, 256)
+    journal = StrokeJournal(canvas.copy(), PIXEL_SIZE)
+    strokes = [stroke(i, erase=i % 5 == 4) for i in range(CHECKPOINT_INTERVAL + 5)]
+    draw(journal, canvas, strokes)
+    assert CHECKPOINT_INTERVAL in journal.checkpoints
+    expected = TiledBuffer(128, 256)
+    for s in strokes[:CHECKPOINT_INTERVAL + 2]:
+        draw_stroke(expected, s, PIXEL_SIZE)
+    assert np.array_equal(
+        pixels(journal.canvas_at(CHECKPOINT_INTERVAL + 2)), pixels(expected)
+    )
+    # Undo across the checkpoint
+    for _ in range(6):
+        undone = journal.undo()
+    expected = TiledBuffer(128, 256)
+    for s in strokes[:CHECKPOINT_INTERVAL - 1]:
+        draw_stroke(expected, s, PIXEL_SIZE)
+    assert np.array_equal(pixels(undone), pixels(expected))
+
+
+def test_bytes_round_trip():
+    canvas = TiledBuffer(128, 128)
+    journal = StrokeJournal(canvas.copy(), PIXEL_SIZE)
+    draw(journal, canvas, [stroke(0), stroke(1), stroke(2)])
+    journal.undo()
+    digest = bytes(range(16))
+    loaded, loaded_digest = StrokeJournal.frombytes(
+        journal.snapshot().tobytes(digest)
+    )
+    assert loaded_digest == digest
+    # Undone strokes are not stored
+    assert len(loaded.strokes) == 2
+    assert np.array_equal(
+        pixels(loaded.canvas_at(2)), pixels(journal.canvas_at(2))
+    )
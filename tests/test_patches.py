@@ -0,0 +1,137 @@
+from glob import glob
+from os.path import dirname, join
+
+import numpy as np
+import pytest
+
+from scrawl.cache import blob_hash
+from scrawl.codec import decode_tiles
+from scrawl.journal import Stroke, StrokeJournal, draw_stroke
+from scrawl.model import encode_snapshot, snapshot_scrawl, stored_patch_base
+from scrawl.patches import ScrawlFormatError, apply_patches, patched_digest, \
+    split_patches
+from scrawl.replay import replay_session
+from scrawl.session import load_session
+from scrawl.tiles import TiledBuffer
+
+PIXEL_SIZE = 10
+SESSIONS = join(dirname(dirname(__file__)), "data", "sessions")
+
+
+class Scrawl:
+    # Saves a canvas like the tool does, into "stored" data and patches
+    def __init__(self, width=256, height=256):
+        self.canvas = TiledBuffer(width, height)
+        self.journal = StrokeJournal(self.canvas.copy(), PIXEL_SIZE)
+        self.base = None
+        self.data = self.rect = None
+        self.patches = b""
+
+    def draw(self, points, erase=False):
+        stroke = Stroke(points, 8 * PIXEL_SIZE, 1.0, erase)
+        draw_stroke(self.canvas, stroke, PIXEL_SIZE)
+        self.journal.append(stroke, self.canvas)
+
+    def save(self):
+        snapshot, versions = snapshot_scrawl(
+            self.canvas,
+            self.journal.snapshot(),
+            (0.0, 0.0),
+            PIXEL_SIZE,
+            1.0,
+            self.base,
+        )
+        if snapshot is None:
+            return None
+
+        result = encode_snapshot(snapshot)
+        if result.rect is None:
+            self.patches += result.data
+            self.base = self.base.patched(
+                len(result.data), versions, result.digest
+            )
+        else:
+            self.data, self.rect = result.data, result.rect
+            self.patches = b""
+            self.base = stored_patch_base(
+                result.data, result.rect, None, result.digest, versions,
+                (0.0, 0.0), PIXEL_SIZE,
+            )
+        return result
+
+    def stored(self):
+        canvas = decode_tiles(self.data)
+        apply_patches(canvas, self.patches)
+        return canvas
+
+    def expected(self):
+        # The canvas cropped to the stored rect
+        x, y, w, h = (round(v / PIXEL_SIZE) for v in self.rect)
+        pixels = self.canvas.to_buffer().pixels
+        height = self.canvas.height
+        return pixels[height - y - h:height - y, x:x + w]
+
+
+def test_later_saves_are_patches():
+    scrawl = Scrawl()
+    scrawl.draw(((20.0, 20.0), (200.0, 200.0)))
+    assert scrawl.save().rect is not None
+    scrawl.draw(((30.0, 150.0), (90.0, 150.0)))
+    result = scrawl.save()
+    assert result.rect is None
+    assert len(list(split_patches(scrawl.patches))) == 1
+    assert np.array_equal(scrawl.stored().to_buffer().pixels, scrawl.expected())
+    # Nothing changed, nothing to save
+    assert scrawl.save() is None
+
+
+def test_erased_tiles_are_removed():
+    scrawl = Scrawl()
+    scrawl.draw(((20.0, 20.0), (200.0, 200.0)))
+    scrawl.save()
+    scrawl.draw(((10.0, 10.0), (75.0, 75.0)), erase=True)
+    assert scrawl.save().rect is None
+    stored = scrawl.stored()
+    assert np.array_equal(stored.to_buffer().pixels, scrawl.expected())
+    assert (0, 0) not in stored.tiles
+
+
+def test_the_digest_follows_the_patches():
+    scrawl = Scrawl()
+    scrawl.draw(((20.0, 20.0), (200.0, 200.0)))
+    scrawl.save()
+    for y in (50.0, 100.0):
+        scrawl.draw(((30.0, y), (90.0, y)))
+        result = scrawl.save()
+        assert result.digest == patched_digest(
+            blob_hash(scrawl.data), scrawl.patches
+        )
+    # The history names the data it ends in
+    _, digest = StrokeJournal.frombytes(result.journal)
+    assert digest == result.digest
+
+
+def test_drawing_outside_saves_the_whole_scrawl():
+    scrawl = Scrawl()
+    scrawl.draw(((20.0, 20.0), (60.0, 60.0)))
+    scrawl.save()
+    scrawl.draw(((200.0, 200.0), (240.0, 240.0)))
+    assert scrawl.save().rect is not None
+    assert scrawl.patches == b""
+
+
+def test_truncated_patches():
+    scrawl = Scrawl()
+    scrawl.draw(((20.0, 20.0), (200.0, 200.0)))
+    scrawl.save()
+    scrawl.draw(((30.0, 150.0), (90.0, 150.0)))
+    scrawl.save()
+    with pytest.raises(ScrawlFormatError):
+        apply_patches(decode_tiles(scrawl.data), scrawl.patches[:-3])
+
+
+@pytest.mark.parametrize("path", sorted(glob(join(SESSIONS, "*.json"))))
+def test_replay_saves_patches(path):
+    stats = replay_session(load_session(path))
+    assert stats.saves > 0
+    assert 0 < stats.patches < stats.saves
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from scrawl.blobstore import BlobStore
+from scrawl.codec import encode
+from scrawl.prefetch import PrefetchJob, Prefetcher
+from scrawl.raster import ScrawlBuffer
+
+
+def wait_for(prefetcher, key, digest, timeout=5):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        value = prefetcher.take(key, digest)
+        if value is not None:
+            return value
+        time.sleep(0.01)
+    return None
+
+
+def scrawl_data():
+    buffer = ScrawlBuffer(64, 64)
+    buffer.stamp(30, 30, 10)
+    return encode(buffer), buffer
+
+
+def test_data_is_read_on_the_worker(tmp_path):
+    data, buffer = scrawl_data()
+    store = BlobStore(str(tmp_path))
+    digest = store.put(data)
+    threads = []
+    maps = []
+
+    def read():
+        threads.append(threading.current_thread())
+        maps.append(store.get(digest))
+        return maps[-1]
+
+    prefetcher = Prefetcher()
+    prefetcher.prefetch([PrefetchJob("a", digest, read)])
+    canvas = wait_for(prefetcher, "a", digest)
+    assert canvas is not None
+    assert (canvas.to_buffer().pixels == buffer.pixels).all()
+    assert threads[0] is not threading.current_thread()
+    # The memory map is closed after decoding
+    assert maps[0].closed
+
+
+def test_failed_reads_are_skipped():
+    data, _ = scrawl_data()
+
+    def missing():
+        raise OSError("no such file")
+
+    prefetcher = Prefetcher()
+    prefetcher.prefetch([
+        PrefetchJob("a", b"1", missing), PrefetchJob("b", b"2", lambda: data)
+    ])
+    assert wait_for(prefetcher, "b", b"2") is not None
+    assert prefetcher.take("a", b"1") is None
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from scrawl.raster import CLEAR, INK, PAPER, ScrawlBuffer, is_ink, pen_radii
+
+
+def ink_at(buffer, x, y):
+    # Pixel coordinates with the origin in the lower left corner
+    return bool(buffer.ink_mask()[buffer.height - 1 - y, x])
+
+
+def test_new_buffer_is_clear():
+    buffer = ScrawlBuffer(5, 3)
+    assert buffer.pixels.shape == (3, 5, 2)
+    assert not buffer.has_ink()
+
+
+def test_pixel_array_must_match_size():
+    with pytest.raises(ValueError):
+        ScrawlBuffer(4, 4, np.zeros((3, 4, 2), dtype=np.uint8))
+
+
+def test_stamp_is_round():
+    buffer = ScrawlBuffer(20, 20)
+    buffer.stamp(10, 10, 4)
+    assert ink_at(buffer, 10, 10)
+    assert ink_at(buffer, 13, 10)
+    assert ink_at(buffer, 10, 6)
+    # The corners of the bounding box are outside of the circle
+    assert not ink_at(buffer, 6, 6)
+    assert not ink_at(buffer, 13, 13)
+
+
+def test_stamp_returns_dirty_bounds():
+    buffer = ScrawlBuffer(20, 20)
+    assert buffer.stamp(10, 10, 2) == (8, 8, 12, 12)
+    assert buffer.stamp(100, 100, 2) is None
+
+
+def test_stroke_is_a_capsule():
+    buffer = ScrawlBuffer(40, 20)
+    buffer.stroke(5, 10, 30, 10, 3)
+    ink = buffer.ink_mask()
+    # Straight sides along the segment
+    for x in range(5, 30):
+        assert ink_at(buffer, x, 12)
+        assert ink_at(buffer, x, 7)
+        assert not ink_at(buffer, x, 14)
+    # Round caps extend beyond the end points
+    assert ink_at(buffer, 3, 10)
+    assert ink_at(buffer, 32, 10)
+    assert not ink_at(buffer, 2, 12)
+    assert not ink.all()
+
+
+def test_stroke_equals_stamps_along_the_segment():
+    stroked = ScrawlBuffer(40, 40)
+    stroked.stroke(5, 5, 35, 30, 2.5)
+    stamped = ScrawlBuffer(40, 40)
+    for t in np.linspace(0, 1, 200):
+        stamped.stamp(5 + 30 * t, 5 + 25 * t, 2.5)
+    # Stamps at discrete steps can only miss pixels of the capsule
+    assert not (stamped.ink_mask() & ~stroked.ink_mask()).any()
+    assert (stroked.ink_mask() & ~stamped.ink_mask()).sum() <= 4
+
+
+def test_elliptical_pen():
+    buffer = ScrawlBuffer(30, 30)
+    buffer.stamp(15, 15, 8, 3)
+    assert ink_at(buffer, 22, 15)
+    assert not ink_at(buffer, 15, 19)
+    assert ink_at(buffer, 15, 17)
+
+
+def test_pen_radii_follow_the_pen_ratio():
+    assert pen_radii(10, 2) == (2.5, 2.5)
+    assert pen_radii(10, 2, pen_ratio=2) == (2.5, 5)
+    # With the same ratio for pixels, the pen is round in pixel space
+    assert pen_radii(10, 2, pen_ratio=2, pixel_ratio=2) == (2.5, 2.5)
+
+
+def test_thin_pen_leaves_no_gaps():
+    buffer = ScrawlBuffer(20, 3)
+    buffer.stroke(0.5, 1.5, 19.5, 1.5, 0.1)
+    assert buffer.ink_mask()[1].all()
+
+
+def test_erase_and_paper():
+    buffer = ScrawlBuffer(10, 10)
+    buffer.stamp(5, 5, 3)
+    buffer.stamp(5, 5, 1, value=CLEAR)
+    assert not ink_at(buffer, 5, 5)
+    assert ink_at(buffer, 7, 5)
+    buffer.stamp(7, 5, 1, value=PAPER)
+    assert not ink_at(buffer, 7, 5)
+    assert not is_ink(PAPER)
+    assert is_ink(INK)
+
+
+def test_version_changes_when_drawn_on():
+    buffer = ScrawlBuffer(10, 10)
+    buffer.stamp(50, 50, 1)
+    assert buffer.version == 0
+    buffer.stamp(5, 5, 1)
+    assert buffer.version == 1
+    buffer.clear()
+    assert buffer.version == 2
+    assert not buffer.has_ink()
+
+
+def test_bytes_round_trip():
+    buffer = ScrawlBuffer(7, 3)
+    buffer.stamp(3, 1, 2)
+    copy = ScrawlBuffer.frombytes(7, 3, buffer.tobytes())
+    assert np.array_equal(copy.pixels, buffer.pixels)
@@ -0,0 +1,69 @@
+import threading
+
+from scrawl.saver import BackgroundSaver, EncodeError
+
+
+def encode(snapshot):
+    if snapshot == "bad":
+        raise ValueError("bad snapshot")
+    return snapshot.upper()
+
+
+def test_results_are_delivered():
+    delivered = []
+    done = threading.Event()
+    saver = BackgroundSaver(
+        encode,
+        lambda key, context, data: delivered.append((key, context, data)),
+        done.set,
+        delay=0,
+    )
+    saver.submit("a", "one", 1)
+    assert done.wait(5)
+    saver.drain()
+    assert delivered == [("a", 1, "ONE")]
+
+
+def test_failures_are_delivered():
+    delivered = {}
+    done = threading.Event()
+    saver = BackgroundSaver(
+        encode,
+        lambda key, context, data: delivered.__setitem__(key, data),
+        done.set,
+        delay=0,
+    )
+    saver.submit("a", "bad")
+    assert done.wait(5)
+    saver.drain()
+    assert isinstance(delivered["a"], EncodeError)
+    assert not saver.has_pending()
+
+
+def test_flush_keeps_the_other_jobs_after_a_failure():
+    delivered = {}
+    saver = BackgroundSaver(
+        encode,
+        lambda key, context, data: delivered.__setitem__(key, data),
+        delay=60,
+    )
+    saver.submit("a", "bad")
+    saver.submit("b", "two")
+    saver.flush()
+    assert isinstance(delivered["a"], EncodeError)
+    assert delivered["b"] == "TWO"
+
+
+def test_flush_delivers_jobs_submitted_while_delivering():
+    delivered = []
+
+    def deliver(key, context, data):
+        delivered.append(data)
+        if data == "ONE":
+            saver.submit("a", "again")
+
+    saver = BackgroundSaver(encode, deliver, delay=60)
+    saver.submit("a", "one")
+    saver.flush()
+    assert delivered == ["ONE", "AGAIN"]
+    assert not saver.has_pending()
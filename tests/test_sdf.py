@@ -0,0 +1,90 @@
+import numpy as np
+
+from scrawl.raster import PAPER, ScrawlBuffer
+from scrawl.sdf import MAX_SMOOTH_FACTOR, distance_field, invalidate_smooth, \
+    render_field, smooth_factor, smooth_images, smooth_scrawl, visible_tiles
+
+
+def disc(width=150, height=100):
+    buffer = ScrawlBuffer(width, height)
+    buffer.stamp(60, 40, 30)
+    return buffer
+
+
+def test_field_is_negative_inside():
+    field = distance_field(disc())
+    # Rows are top down
+    assert field[100 - 1 - 40, 60] < 0
+    assert field[0, 0] > 0
+    assert field.min() >= -2 and field.max() <= 2
+
+
+def test_paper_is_not_ink():
+    buffer = disc()
+    # Erased with paper in an old scrawl
+    buffer.stamp(60, 40, 10, value=PAPER)
+    field = distance_field(buffer)
+    assert field[100 - 1 - 40, 60] > 0
+    rendered = render_field(field, 2)
+    assert rendered.pixels[2 * (100 - 1 - 40), 2 * 60, 1] == 0
+
+
+def test_render_is_smooth_and_clear_outside():
+    rendered = render_field(distance_field(disc()), 4)
+    assert (rendered.width, rendered.height) == (600, 400)
+    alpha = rendered.pixels[..., 1]
+    assert alpha[0, 0] == 0
+    assert alpha[4 * 60, 4 * 60] == 255
+    # Anti-aliased edge pixels
+    assert ((alpha > 0) & (alpha < 255)).any()
+
+
+def test_tiles_add_up_to_the_whole_render():
+    field = distance_field(disc())
+    whole = render_field(field, 2).pixels
+    tiles = smooth_scrawl("disc", b"1", 2, visible_tiles(
+        (0, 0, 150, 100), 150, 100
+    ), disc)
+    assert len(tiles) == 3 * 2
+    stitched = np.zeros_like(whole)
+    for tile in tiles:
+        x, y, w, h = tile.rect
+        top = 2 * (100 - y - h)
+        stitched[top:top + 2 * h, 2 * x:2 * (x + w)] = tile.buffer.pixels
+    assert np.array_equal(stitched, whole)
+
+
+def test_visible_tiles():
+    # 200 by 130 pixels of 10 units
+    rect = (100, -50, 2000, 1300)
+    assert len(visible_tiles(rect, 200, 130)) == 4 * 3
+    assert visible_tiles(rect, 200, 130, (150, -40, 10, 10)) == [(0, 0)]
+    # Tiles are 640 units wide
+    assert visible_tiles(rect, 200, 130, (800, 700, 1000, 100)) == [
+        (1, 1), (2, 1)
+    ]
+    assert visible_tiles(rect, 200, 130, (-1000, 0, 100, 100)) == []
+
+
+def test_factor_does_not_depend_on_the_size():
+    assert smooth_factor(1.5) == 1
+    assert smooth_factor(3) == 4
+    assert smooth_factor(16) == 16
+    assert smooth_factor(100) == MAX_SMOOTH_FACTOR
+
+
+def test_only_cached_tiles_without_build():
+    invalidate_smooth()
+    tiles = [(0, 0), (1, 0)]
+    assert smooth_scrawl("a", b"1", 2, tiles, disc, build=False) is None
+    smooth_scrawl("a", b"1", 2, tiles[:1], disc)
+    assert smooth_scrawl("a", b"1", 2, tiles, disc, build=False) is None
+    smooth_scrawl("a", b"1", 2, tiles, disc)
+    assert len(smooth_scrawl("a", b"1", 2, tiles, disc, build=False)) == 2
+    # Another digest or factor needs new tiles
+    assert smooth_scrawl("a", b"2", 2, tiles, disc, build=False) is None
+    assert smooth_scrawl("a", b"1", 4, tiles, disc, build=False) is None
+    smooth_scrawl("b", b"1", 2, tiles, disc)
+    invalidate_smooth("a")
+    assert smooth_scrawl("a", b"1", 2, tiles, disc, build=False) is None
+    assert len(smooth_images) == 2
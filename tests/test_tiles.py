@@ -0,0 +1,76 @@
+import numpy as np
+
+from scrawl.raster import CLEAR, INK, ScrawlBuffer
+from scrawl.tiles import TiledBuffer
+
+
+def test_stroke_matches_a_dense_buffer():
+    dense = ScrawlBuffer(200, 150)
+    tiled = TiledBuffer(200, 150, 64)
+    for canvas in (dense, tiled):
+        canvas.stroke(10, 20, 180, 130, 5)
+        canvas.stroke(150, 10, 60, 140, 3, 6)
+    assert np.array_equal(tiled.to_buffer().pixels, dense.pixels)
+
+
+def test_only_tiles_with_ink_are_allocated():
+    canvas = TiledBuffer(640, 640, 64)
+    canvas.stamp(100, 100, 3)
+    assert set(key for key, _ in canvas) == {(1, 1)}
+    # Erasing doesn't allocate tiles
+    canvas.stamp(400, 400, 3, value=CLEAR)
+    assert len(canvas) == 1
+
+
+def test_drawing_outside_the_canvas_grows_it():
+    canvas = TiledBuffer(128, 128, 64)
+    canvas.stamp(-10, 200, 3)
+    assert (-1, 3) in canvas.tiles
+    shift = canvas.grow_to_fit()
+    assert shift == (64, 0)
+    assert (0, 3) in canvas.tiles
+    assert (canvas.width, canvas.height) == (192, 256)
+
+
+def test_buffer_round_trip():
+    dense = ScrawlBuffer(100, 70)
+    dense.stroke(5, 5, 95, 65, 4)
+    tiled = TiledBuffer.from_buffer(dense, 32)
+    assert np.array_equal(tiled.to_buffer().pixels, dense.pixels)
+    # Empty tiles are left out
+    assert len(tiled) < 4 * 3
+
+
+def test_trim_crops_to_tiles_with_ink():
+    canvas = TiledBuffer(320, 320, 64)
+    canvas.stamp(150, 200, 2)
+    canvas.stamp(10, 10, 2, value=INK)
+    canvas.stamp(10, 10, 4, value=CLEAR)
+    assert canvas.trim() == (128, 192)
+    assert (canvas.width, canvas.height) == (64, 64)
+    assert list(canvas.tiles) == [(0, 0)]
+
+
+def test_fill_a_counter():
+    canvas = TiledBuffer(100, 100, 32)
+    # A ring crossing tile borders
+    for (x0, y0), (x1, y1) in [
+        ((20, 20), (80, 20)), ((80, 20), (80, 80)),
+        ((80, 80), (20, 80)), ((20, 80), (20, 20)),
+    ]:
+        canvas.stroke(x0, y0, x1, y1, 2)
+    bounds = canvas.fill(50, 50)
+    assert bounds is not None
+    mask = canvas.to_buffer().ink_mask()
+    assert mask[50, 50] and mask[30, 70]
+    # Outside of the ring stays clear
+    assert not mask[5, 5]
+
+
+def test_copy_is_independent():
+    canvas = TiledBuffer(64, 64, 32)
+    canvas.stamp(10, 10, 2)
+    copy = canvas.copy()
+    canvas.stamp(40, 40, 2)
+    assert len(copy) == 1
+    assert len(canvas) == 2